@@ -0,0 +1,377 @@
+"""
+Bulk import of an existing on-disk photo/video library into a user's vault.
+
+    python -m app.commands.import_library /mnt/photos --email mom@family.home
+
+The source tree is walked with `os.scandir`, files are hashed in a process pool and
+placed in FILE_STORAGE_PATH with a reflink when the source lives on a filesystem that
+supports it (falling back to a copy). Rows are inserted with `bulk_create` in large
+batches and every committed batch is appended to a checkpoint file, so an interrupted
+import can simply be re-run with the same arguments; files of a batch that committed
+just before the checkpoint was written are recognised by their source path and
+checksum and not imported twice.
+
+`--hardlink` links the files instead of copying them when reflinks are not supported.
+The stored blobs then share their inode with the library: the library must not be
+edited in place afterwards, or the vault's copies change (and fail the integrity
+scrub) with it.
+"""
+
+import os
+import time
+import errno
+import fcntl
+import shutil
+import asyncio
+import hashlib
+import argparse
+import mimetypes
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from app.settings import TORTOISE_ORM
+from app.models import FileModel, FolderModel, UserModel
+from app.constants import AccessType, ChangeActionEnum
+from app.managers import FileManager, FolderManager, SyncManager
+from app.utils import FileTypeSniffer, Util, file_types
+from app.utils.schema import upgrade_schema
+
+
+load_dotenv()
+
+# ioctl(2) request to share the extents of one file with another (btrfs, xfs, ...)
+FICLONE = 0x40049409
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _walk(root: str) -> Iterator[os.DirEntry]:
+    """Depth-first walk yielding regular files; hidden entries and symlinks are skipped."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                subdirs = []
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+                # Reverse so directories are visited in name order
+                stack.extend(sorted(subdirs, reverse=True))
+        except PermissionError as e:
+            print(f"⚠️  Skipping {directory}: {str(e)}")
+
+
+def _hash_file(path: str) -> Tuple[str, bytes]:
+    """Runs in a worker process. Returns the checksum and the head used for type sniffing."""
+    digest = hashlib.sha256()
+    sniffer = FileTypeSniffer()
+    with open(path, "rb") as source:
+        while chunk := source.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+            sniffer.update(chunk)
+    return digest.hexdigest(), sniffer.head
+
+
+def _reflink(source: str, destination: str):
+    with open(source, "rb") as src, open(destination, "wb") as dest:
+        fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+
+
+def _place_file(source: str, destination: str, same_device: bool, hardlink: bool = False) -> str:
+    """
+        Put `source` at `destination` without duplicating data where possible.
+        Returns the method that was used.
+    """
+    Path(destination).parent.mkdir(parents=True, exist_ok=True)
+    if same_device:
+        try:
+            _reflink(source, destination)
+            return "reflink"
+        except OSError as e:
+            if os.path.exists(destination):
+                os.unlink(destination)
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EXDEV):
+                raise
+    if same_device and hardlink:
+        try:
+            os.link(source, destination)
+            return "hardlink"
+        except OSError as e:
+            if e.errno not in (errno.EPERM, errno.EXDEV, errno.EMLINK):
+                raise
+    shutil.copyfile(source, destination)
+    return "copy"
+
+
+class Checkpoint():
+    """Append-only list of source paths (relative to the import root) already committed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as checkpoint:
+                self.done = {line.rstrip("\n") for line in checkpoint if line.strip()}
+
+    def __contains__(self, relative_path: str) -> bool:
+        return relative_path in self.done
+
+    def commit(self, relative_paths: List[str]):
+        with open(self.path, "a", encoding="utf-8") as checkpoint:
+            checkpoint.writelines(f"{path}\n" for path in relative_paths)
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        self.done.update(relative_paths)
+
+
+class Progress():
+
+    def __init__(self, every: float = 5.0):
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.every = every
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+
+    def add(self, files: int, size: int):
+        self.files += files
+        self.bytes += size
+        if time.monotonic() - self.last_report >= self.every:
+            self.report()
+
+    def report(self, final: bool = False):
+        self.last_report = time.monotonic()
+        elapsed = max(self.last_report - self.started, 1e-6)
+        prefix = "✅ Done" if final else "⏳"
+        print(
+            f"{prefix} {self.files} files ({self.bytes / 1e6:.1f} MB) in {elapsed:.0f}s | "
+            f"{self.files / elapsed:.1f} files/s | {self.bytes / 1e6 / elapsed:.1f} MB/s | "
+            f"{self.skipped} already imported"
+        )
+
+
+class LibraryImporter():
+
+    def __init__(
+            self,
+            user: UserModel,
+            source: str,
+            storage_path: str,
+            checkpoint_path: str,
+            batch_size: int = 1000,
+            workers: Optional[int] = None,
+            copy: bool = False,
+            hardlink: bool = False
+        ):
+        self.user = user
+        self.source = os.path.abspath(source)
+        self.storage_path = storage_path
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count()
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.progress = Progress()
+        self.file_manager = FileManager(user_id=user.id)
+        self.folder_manager = FolderManager(user_id=user.id)
+        self.folders: Dict[str, Optional[FolderModel]] = {"": None}
+
+        user_dir = os.path.join(storage_path, user.email)
+        Path(user_dir).mkdir(parents=True, exist_ok=True)
+        self.same_device = not copy and os.stat(self.source).st_dev == os.stat(user_dir).st_dev
+        self.hardlink = hardlink
+
+
+    async def _ensure_folder(self, relative_dir: str) -> Optional[FolderModel]:
+        """Mirror the source directory as a folder, reusing folders from a previous run."""
+        if relative_dir in self.folders:
+            return self.folders[relative_dir]
+
+        parent = await self._ensure_folder(os.path.dirname(relative_dir))
+        name = os.path.basename(relative_dir)
+        folder = await FolderModel.filter(
+            owner_id=self.user.id,
+            parent_id=parent.id if parent else None,
+            name=name,
+        ).first()
+        if folder is None:
+            folder = await self.folder_manager.create_folder(name, parent.id if parent else None)
+        self.folders[relative_dir] = folder
+        return folder
+
+
+    async def _import_batch(self, pool: ProcessPoolExecutor, entries: List[os.DirEntry]):
+        loop = asyncio.get_running_loop()
+        paths = [entry.path for entry in entries]
+        hashed = await asyncio.gather(
+            *(loop.run_in_executor(pool, _hash_file, path) for path in paths)
+        )
+
+        # A previous run may have committed this batch and crashed before its checkpoint
+        already_imported = {
+            (row["checksum"], (row["metadata"] or {}).get("source_path"))
+            for row in await FileModel.filter(
+                owner_id=self.user.id,
+                checksum__in=list({checksum for checksum, _ in hashed}),
+            ).values("checksum", "metadata")
+        }
+
+        records = []
+        relative_paths = []
+        skipped_paths = []
+        placed = []
+        batch_bytes = 0
+        try:
+            for entry, (checksum, head) in zip(entries, hashed):
+                relative_path = os.path.relpath(entry.path, self.source)
+                if (checksum, relative_path) in already_imported:
+                    skipped_paths.append(relative_path)
+                    continue
+                folder = await self._ensure_folder(os.path.dirname(relative_path))
+                stored_name = self.file_manager.generate_file_name(entry.name)
+                destination = os.path.join(self.storage_path, self.user.email, stored_name)
+                await loop.run_in_executor(
+                    None, _place_file, entry.path, destination, self.same_device, self.hardlink
+                )
+                placed.append(destination)
+
+                size = entry.stat(follow_symlinks=False).st_size
+                file_type, file_extension = Util.get_file_type_and_extension(entry.name, head)
+                info = file_types.from_extension(file_extension)
+                records.append(FileModel(
+                    name=entry.name,
+                    original_filename=stored_name,
+                    mime_type=info.mime_type if info else mimetypes.guess_type(entry.name)[0],
+                    type=file_type,
+                    extension=file_extension,
+                    file_path=os.path.abspath(destination),
+                    owner_id=self.user.id,
+                    size=float(size),
+                    folder=folder,
+                    folder_path=folder.path if folder else "",
+                    access_type=AccessType.PRIVATE,
+                    metadata={"source_path": relative_path},
+                    checksum=checksum,
+                    shared_with=[],
+                ))
+                relative_paths.append(relative_path)
+                batch_bytes += size
+
+            if records:
+                async with in_transaction() as conn:
+                    await FileModel.bulk_create(records, using_db=conn)
+                    # bulk_create does not hand back primary keys, read them back for the journal
+                    created = await FileModel.filter(
+                        owner_id=self.user.id,
+                        original_filename__in=[record.original_filename for record in records],
+                    ).using_db(conn)
+                    await SyncManager.record_changes(
+                        self.user.id,
+                        [
+                            {
+                                "file_id": record.id,
+                                "action": ChangeActionEnum.CREATE,
+                                "payload": SyncManager.file_snapshot(record),
+                            }
+                            for record in created
+                        ],
+                        using_db=conn,
+                    )
+        except BaseException:
+            # Nothing of the batch was committed, do not leave its blobs behind
+            for destination in placed:
+                try:
+                    os.unlink(destination)
+                except FileNotFoundError:
+                    pass
+            raise
+
+        self.checkpoint.commit(relative_paths + skipped_paths)
+        self.progress.skipped += len(skipped_paths)
+        if not records:
+            return
+        SyncManager.notify(self.user.id)
+        self.progress.add(len(records), batch_bytes)
+
+
+    async def run(self):
+        if not self.same_device:
+            method = "copy"
+        else:
+            method = "reflink/hardlink" if self.hardlink else "reflink/copy"
+        print(f"📥 Importing {self.source} for {self.user.email} ({method}, {self.workers} hash workers)")
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            batch: List[os.DirEntry] = []
+            for entry in _walk(self.source):
+                if os.path.relpath(entry.path, self.source) in self.checkpoint:
+                    self.progress.skipped += 1
+                    continue
+                batch.append(entry)
+                if len(batch) >= self.batch_size:
+                    await self._import_batch(pool, batch)
+                    batch = []
+            if batch:
+                await self._import_batch(pool, batch)
+        self.progress.report(final=True)
+
+
+async def main(args: argparse.Namespace):
+    storage_path = Util.validate_storage_path(os.getenv("FILE_STORAGE_PATH"), default_path="./uploads")
+    os.environ["FILE_STORAGE_PATH"] = storage_path
+
+    await Tortoise.init(
+        db_url=TORTOISE_ORM.get("connections").get("default"),
+        modules={"models": TORTOISE_ORM.get("apps").get("models")},
+    )
+    try:
+        await Tortoise.generate_schemas()
+        await upgrade_schema()
+        user = await UserModel.filter(email=args.email).first()
+        if user is None:
+            raise SystemExit(f"❌ No user with email {args.email}")
+
+        source_key = hashlib.sha1(os.path.abspath(args.source).encode()).hexdigest()[:12]
+        checkpoint = args.checkpoint or os.path.join(
+            storage_path, f".import-{user.id}-{source_key}.checkpoint"
+        )
+        importer = LibraryImporter(
+            user=user,
+            source=args.source,
+            storage_path=storage_path,
+            checkpoint_path=checkpoint,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            copy=args.copy,
+            hardlink=args.hardlink,
+        )
+        await importer.run()
+    finally:
+        await Tortoise.close_connections()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Import an existing directory tree into Drivault.")
+    parser.add_argument("source", help="Directory to import")
+    parser.add_argument("--email", required=True, help="Owner of the imported files")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per bulk insert")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing processes (default: CPU count)")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file used to resume an import")
+    parser.add_argument("--copy", action="store_true", help="Always copy, never reflink or hardlink")
+    parser.add_argument(
+        "--hardlink",
+        action="store_true",
+        help="Hardlink files when reflinks are not supported (the library must then never be edited in place)",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
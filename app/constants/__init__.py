@@ -1,9 +1,24 @@
-from .constants import FileExtensionEnum, FileTypeEnum, UserRoleType, AccessType
+from .constants import (
+    AccessEventType,
+    FileExtensionEnum,
+    FileTypeEnum,
+    UserRoleType,
+    AccessType,
+    ChangeActionEnum,
+    DocumentTextStatus,
+    IntegrityIssueKind,
+    PerceptualHashKind,
+)
 
 
 __all__ = [
+    "AccessEventType",
     "AccessType",
+    "ChangeActionEnum",
+    "DocumentTextStatus",
     "FileTypeEnum",
     "FileExtensionEnum",
+    "IntegrityIssueKind",
+    "PerceptualHashKind",
     "UserRoleType",
 ]
\ No newline at end of file
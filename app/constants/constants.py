@@ -10,14 +10,50 @@ class FileTypeEnum(str, Enum):
     
 
 class FileExtensionEnum(str, Enum):
+    # Images
     JPG = "jpg"
     JPEG = "jpeg"
+    PNG = "png"
+    GIF = "gif"
+    WEBP = "webp"
+    HEIC = "heic"
+    HEIF = "heif"
+    AVIF = "avif"
+    BMP = "bmp"
+    TIFF = "tiff"
+    TIF = "tif"
+    # Videos
     MKV = "mkv"
     MP4 = "mp4"
+    MOV = "mov"
+    M4V = "m4v"
+    AVI = "avi"
+    WEBM = "webm"
+    THREE_GP = "3gp"
+    # Audio
     MP3 = "mp3"
+    M4A = "m4a"
+    AAC = "aac"
+    WAV = "wav"
+    FLAC = "flac"
+    OGG = "ogg"
+    # Documents
     PDF = "pdf"
     DOC = "doc"
+    DOCX = "docx"
     PPT = "ppt"
+    PPTX = "pptx"
+    XLS = "xls"
+    XLSX = "xlsx"
+    ODT = "odt"
+    RTF = "rtf"
+    # Text and others
+    TXT = "txt"
+    CSV = "csv"
+    MD = "md"
+    JSON = "json"
+    LOG = "log"
+    ZIP = "zip"
 
 
 class UserRoleType(str, Enum):
@@ -28,4 +64,35 @@ class UserRoleType(str, Enum):
 class AccessType(str, Enum):
     PUBLIC = "public"
     PRIVATE = "private"
-    
\ No newline at end of file
+
+
+class ChangeActionEnum(str, Enum):
+    CREATE = "create"
+    RENAME = "rename"
+    MOVE = "move"
+    DELETE = "delete"
+    SHARE = "share"
+
+
+class PerceptualHashKind(str, Enum):
+    IMAGE = "image"
+    VIDEO_FRAME = "video_frame"
+    # Marker row of a file that was processed but yields no hash (undecodable, blank)
+    NONE = "none"
+
+
+class AccessEventType(str, Enum):
+    VIEW = "view"  # Image served through the resizing endpoint
+    DOWNLOAD = "download"
+
+
+class IntegrityIssueKind(str, Enum):
+    MISSING = "missing"  # The row's blob is gone from storage
+    CORRUPTED = "corrupted"  # The blob no longer matches its checksum
+    ORPHAN = "orphan"  # A blob in storage that no row points to
+
+
+class DocumentTextStatus(str, Enum):
+    INDEXED = "indexed"
+    UNSUPPORTED = "unsupported"  # No extractor for the format in this installation
+    FAILED = "failed"  # The extractor could not read the file (corrupt, encrypted, ...)
@@ -3,6 +3,14 @@ from .custom_exceptions import (
     UserAlreadyExistsException,
     UserNotFoundException,
     InvalidCredentialsException,
+    FileNotFoundException,
+    FolderNotFoundException,
+    InvalidFolderMoveException,
+    RangeNotSatisfiableException,
+    UnsupportedFileTypeException,
+    FeatureUnavailableException,
+    PermissionDeniedException,
+    RateLimitExceededException,
     StorageConfigurationException,
 )
 
@@ -11,5 +19,13 @@ __all__ = [
     "UserAlreadyExistsException",
     "UserNotFoundException",
     "InvalidCredentialsException",
+    "FileNotFoundException",
+    "FolderNotFoundException",
+    "InvalidFolderMoveException",
+    "RangeNotSatisfiableException",
+    "UnsupportedFileTypeException",
+    "FeatureUnavailableException",
+    "PermissionDeniedException",
+    "RateLimitExceededException",
     "StorageConfigurationException"
 ]
\ No newline at end of file
@@ -5,9 +5,10 @@ These exceptions are used to handle domain-specific errors.
 
 class DrivaultException(Exception):
     """Base exception for all Drivault custom exceptions"""
-    def __init__(self, message: str, status_code: int = 500):
+    def __init__(self, message: str, status_code: int = 500, headers: dict = None):
         self.message = message
         self.status_code = status_code
+        self.headers = headers
         super().__init__(self.message)
 
 
@@ -35,6 +36,52 @@ class FileNotFoundException(DrivaultException):
         super().__init__(message, status_code=404)
 
 
+class FolderNotFoundException(DrivaultException):
+    """Raised when a folder is not found"""
+    def __init__(self, message: str = "Folder not found"):
+        super().__init__(message, status_code=404)
+
+
+class InvalidFolderMoveException(DrivaultException):
+    """Raised when a folder would be moved into itself or one of its descendants"""
+    def __init__(self, message: str = "A folder cannot be moved into its own subtree"):
+        super().__init__(message, status_code=400)
+
+
+class RangeNotSatisfiableException(DrivaultException):
+    """Raised when the requested byte range lies outside of the file"""
+    def __init__(self, message: str = "Requested range not satisfiable"):
+        super().__init__(message, status_code=416)
+
+
+class UnsupportedFileTypeException(DrivaultException):
+    """Raised when an operation is not available for the type of the file"""
+    def __init__(self, message: str = "Operation not supported for this file type"):
+        super().__init__(message, status_code=415)
+
+
+class FeatureUnavailableException(DrivaultException):
+    """Raised when a feature needs an optional dependency that is not installed"""
+    def __init__(self, message: str = "This feature is not available on this server"):
+        super().__init__(message, status_code=503)
+
+
+class PermissionDeniedException(DrivaultException):
+    """Raised when the user's role does not allow the operation"""
+    def __init__(self, message: str = "You are not allowed to perform this operation"):
+        super().__init__(message, status_code=403)
+
+
+class RateLimitExceededException(DrivaultException):
+    """Raised when a user sends more requests than their role allows"""
+    def __init__(self, retry_after: float, message: str = "Too many requests, please slow down"):
+        super().__init__(
+            message,
+            status_code=429,
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+
+
 class StorageConfigurationException(DrivaultException):
     """Raised when storage path configuration is invalid"""
     def __init__(self, message: str = "Invalid storage configuration"):
@@ -24,7 +24,8 @@ async def drivault_exception_handler(request: Request, exc: DrivaultException):
             "success": False,
             "error": exc.message,
             "path": str(request.url.path)
-        }
+        },
+        headers=exc.headers
     )
 
 
@@ -1,5 +1,6 @@
 
 import os
+import asyncio
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
@@ -8,10 +9,20 @@ from fastapi.exceptions import RequestValidationError
 from tortoise import Tortoise
 from app.settings import TORTOISE_ORM
 
-from app.routes import file_router, user_router
+from app.routes import admin_router, events_router, file_router, folder_router, sync_router, user_router
 from app.exceptions import DrivaultException, StorageConfigurationException
 from app.handlers import drivault_exception_handler, validation_exception_handler
 from app.utils import Util
+from app.utils.workers import shutdown_process_pool
+from app.utils.pipeline import pipeline
+from app.utils.rate_limit import UploadShapingMiddleware
+from app.utils.denylist import denylist
+from app.utils.access_log import access_log
+from app.utils.events import events
+from app.utils.schema import upgrade_schema
+from app.managers.duplicate_manager import backfill_perceptual_hashes
+from app.managers.integrity_manager import scrubber
+from app.managers.search_manager import SearchManager, backfill_document_text
 
 load_dotenv()
 
@@ -51,9 +62,33 @@ async def lifespan(app: FastAPI):
         modules=model,
     )
     await Tortoise.generate_schemas()
+    await upgrade_schema()
     print("✅ Database connected and schemas generated successfully!")
+    await SearchManager.setup()
+
+    await denylist.start()
+
+    await events.start()
+    pipeline.start()
+    access_log.start()
+    backfills = [
+        asyncio.create_task(backfill_perceptual_hashes()),
+        asyncio.create_task(backfill_document_text()),
+    ]
+    print(f"✅ Background pipeline started with {pipeline.workers} workers")
+    scrubber.start()
+    if scrubber.running:
+        print("✅ Integrity scrubber started")
     yield
     # Clean up and release the resources
+    for backfill in backfills:
+        backfill.cancel()
+    await denylist.stop()
+    await scrubber.stop()
+    await pipeline.stop()
+    await access_log.stop()
+    await events.stop()
+    shutdown_process_pool()
     print("Closing database connections...")
     await Tortoise.close_connections()
     print("Database connection is closed.")
@@ -67,6 +102,8 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+app.add_middleware(UploadShapingMiddleware)
+
 # Register exception handlers
 app.add_exception_handler(DrivaultException, drivault_exception_handler)
 app.add_exception_handler(RequestValidationError, validation_exception_handler)
@@ -85,11 +122,31 @@ app.include_router(
     prefix="/v1",
     tags=["Files"]
 )
+app.include_router(
+    router=folder_router,
+    prefix="/v1",
+    tags=["Folders"]
+)
 app.include_router(
     router=user_router,
     prefix="/v1",
     tags=["Auth"]
 )
+app.include_router(
+    router=sync_router,
+    prefix="/v1",
+    tags=["Sync"]
+)
+app.include_router(
+    router=events_router,
+    prefix="/v1",
+    tags=["Events"]
+)
+app.include_router(
+    router=admin_router,
+    prefix="/v1",
+    tags=["Admin"]
+)
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,8 +1,22 @@
 from .file_manager import FileManager
 from .user_manager import UserManager
+from .sync_manager import SyncManager
+from .folder_manager import FolderManager
+from .image_manager import ImageManager
+from .duplicate_manager import DuplicateManager
+from .integrity_manager import IntegrityManager
+from .access_log_manager import AccessLogManager
+from .search_manager import SearchManager
 
 
 __all__ = [
+    "AccessLogManager",
+    "DuplicateManager",
     "FileManager",
+    "FolderManager",
+    "ImageManager",
+    "IntegrityManager",
+    "SearchManager",
+    "SyncManager",
     "UserManager",
-]
\ No newline at end of file
+]
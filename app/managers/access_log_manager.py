@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.managers.file_manager import FileManager
+from app.models import AccessDailyStatModel, AccessEventModel, FileModel
+
+
+class AccessLogManager(FileManager):
+    """Access history of files and users, read from the access log pipeline's tables."""
+
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+    # Events scanned to find the distinct recently viewed files
+    RECENT_SCAN_FACTOR = 10
+
+    @staticmethod
+    async def _page(query, before: Optional[int], limit: int) -> dict:
+        """Newest first; pass the returned `cursor` as `before` for the next page."""
+        if before:
+            query = query.filter(id__lt=before)
+        events = await query.order_by("-id").limit(limit + 1)
+        has_more = len(events) > limit
+        events = events[:limit]
+        return {
+            "events": events,
+            "cursor": events[-1].id if events else before,
+            "has_more": has_more,
+        }
+
+
+    async def file_history(self, file_id: int, before: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+        """Who accessed one of the user's files; only its owner may see it."""
+        file = await self._get_owned_file(file_id)
+        return await self._page(AccessEventModel.filter(file_id=file.id), before, limit)
+
+
+    async def user_history(self, before: Optional[int] = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+        """Files the user accessed, theirs or shared with them."""
+        return await self._page(AccessEventModel.filter(user_id=self.user_id), before, limit)
+
+
+    async def recently_viewed(self, limit: int = 20) -> list:
+        """Distinct files the user accessed last, most recent first."""
+        file_ids = await (
+            AccessEventModel
+            .filter(user_id=self.user_id)
+            .order_by("-id")
+            .limit(limit * self.RECENT_SCAN_FACTOR)
+            .values_list("file_id", flat=True)
+        )
+        ordered = list(dict.fromkeys(file_ids))
+        files = {
+            file.id: file
+            for file in await FileModel.filter(id__in=ordered, is_deleted=False)
+            if file.owner_id == self.user_id or self.user_id in (file.shared_with or [])
+        }
+        return [files[file_id] for file_id in ordered if file_id in files][:limit]
+
+
+    async def file_stats(self, file_id: int, days: int = 30) -> dict:
+        """Daily views, downloads and bytes served of one of the user's files."""
+        file = await self._get_owned_file(file_id)
+        rows = await (
+            AccessDailyStatModel
+            .filter(file_id=file.id, day__gte=datetime.now(timezone.utc).date() - timedelta(days=days))
+            .order_by("day")
+            .values("day", "views", "downloads", "bytes", "last_accessed_at")
+        )
+        return {
+            "file_id": file.id,
+            "days": rows,
+            "views": sum(row["views"] for row in rows),
+            "downloads": sum(row["downloads"] for row in rows),
+            "last_accessed_at": rows[-1]["last_accessed_at"] if rows else None,
+        }
@@ -0,0 +1,281 @@
+import os
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from app.constants import FileTypeEnum, PerceptualHashKind
+from app.managers.file_manager import FileManager
+from app.managers.sync_manager import SyncManager
+from app.models import FileModel, PerceptualHashModel, UserModel
+from app.utils.bktree import BKTree
+from app.utils.images import PILLOW_AVAILABLE, dhash_image
+from app.utils.pipeline import pipeline
+from app.utils.videos import FFMPEG_AVAILABLE, keyframe_hashes
+from app.utils.workers import run_in_process
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Users whose hash index is kept in memory, least recently used are dropped
+DUPLICATE_INDEX_MAX_USERS = int(os.getenv("DUPLICATE_INDEX_MAX_USERS", 64))
+
+IMAGE_TYPES = (FileTypeEnum.IMAGE, FileTypeEnum.GIF)
+SIGN_BIT = 1 << 63
+
+
+def to_signed(value: int) -> int:
+    """Unsigned 64-bit hash -> signed BIGINT."""
+    return value - (1 << 64) if value >= SIGN_BIT else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class HashIndex():
+    """
+        BK-trees over the hashes of one user's live (not deleted) images and video
+        keyframes.
+
+        The user's `library_version` is the change marker: it is bumped by every
+        journaled change (upload, delete, restore, ...) and when a file's hashes are
+        replaced. While it stays the same, a refresh is a primary-key lookup plus an
+        indexed query for rows inserted since, which usually returns nothing. When it
+        moved, rows may have disappeared or files been deleted, and since BK-trees
+        cannot remove entries the trees are rebuilt.
+    """
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.version: Optional[int] = None
+        self._reset()
+
+    def _reset(self):
+        self.images = BKTree()
+        self.frames = BKTree()
+        self.last_id = 0
+
+    async def _load_new(self, owner_id: int):
+        rows = await (
+            PerceptualHashModel
+            .filter(owner_id=owner_id, id__gt=self.last_id, file__is_deleted=False)
+            .order_by("id")
+            .values_list("id", "file_id", "kind", "hash", "position")
+        )
+        for row_id, file_id, kind, value, position in rows:
+            if kind == PerceptualHashKind.IMAGE:
+                self.images.add(to_unsigned(value), file_id)
+            elif kind == PerceptualHashKind.VIDEO_FRAME:
+                self.frames.add(to_unsigned(value), (file_id, position))
+            self.last_id = row_id
+
+    async def refresh(self, owner_id: int):
+        async with self.lock:
+            # Read before the rows: a change committed in between shows up next time
+            version = await UserModel.filter(id=owner_id).first().values_list("library_version", flat=True)
+            if version != self.version:
+                self._reset()
+                self.version = version
+            await self._load_new(owner_id)
+
+
+_indexes: "OrderedDict[int, HashIndex]" = OrderedDict()
+
+
+class DuplicateManager(FileManager):
+    """Exact and near-duplicate detection over perceptual hashes."""
+
+    DEFAULT_IMAGE_DISTANCE = 6
+    DEFAULT_FRAME_DISTANCE = 8
+    # Share of a video's keyframes that must match for it to count as a duplicate
+    VIDEO_MATCH_RATIO = 0.5
+
+    async def _index(self) -> HashIndex:
+        index = _indexes.get(self.user_id)
+        if index is None:
+            index = _indexes[self.user_id] = HashIndex()
+            while len(_indexes) > DUPLICATE_INDEX_MAX_USERS:
+                _indexes.popitem(last=False)
+        _indexes.move_to_end(self.user_id)
+        await index.refresh(self.user_id)
+        return index
+
+
+    def _similar_videos(self, index: HashIndex, file_id: int, frames: List[int], distance: int) -> Dict[int, int]:
+        """Other videos sharing enough keyframes with `frames`, with their best frame distance."""
+        matched_frames: Dict[int, set] = defaultdict(set)
+        best: Dict[int, int] = {}
+        for position, value in enumerate(frames):
+            for frame_distance, (other_id, _) in index.frames.search(value, distance):
+                if other_id == file_id:
+                    continue
+                matched_frames[other_id].add(position)
+                best[other_id] = min(best.get(other_id, frame_distance), frame_distance)
+        return {
+            other_id: best[other_id]
+            for other_id, positions in matched_frames.items()
+            if len(positions) >= self.VIDEO_MATCH_RATIO * len(frames)
+        }
+
+
+    async def find_duplicates(self, file_id: int, distance: Optional[int] = None) -> List[dict]:
+        """
+        Files of the user that look like `file_id`, closest first.
+
+        :param distance: maximum Hamming distance between hashes (out of 64 bits).
+        """
+        file = await self._get_owned_file(file_id)
+        index = await self._index()
+        rows = await (
+            PerceptualHashModel
+            .filter(file_id=file.id)
+            .order_by("position")
+            .values_list("kind", "hash")
+        )
+        if not rows or rows[0][0] == PerceptualHashKind.NONE:
+            return []
+
+        if rows[0][0] == PerceptualHashKind.IMAGE:
+            distance = self.DEFAULT_IMAGE_DISTANCE if distance is None else distance
+            matches: Dict[int, int] = {}
+            for match_distance, other_id in index.images.search(to_unsigned(rows[0][1]), distance):
+                if other_id != file.id:
+                    matches[other_id] = min(matches.get(other_id, match_distance), match_distance)
+        else:
+            distance = self.DEFAULT_FRAME_DISTANCE if distance is None else distance
+            frames = [to_unsigned(value) for _, value in rows]
+            matches = self._similar_videos(index, file.id, frames, distance)
+
+        files = await FileModel.filter(
+            id__in=list(matches), owner_id=self.user_id, is_deleted=False
+        )
+        return sorted(
+            ({"file": other, "distance": matches[other.id]} for other in files),
+            key=lambda match: match["distance"],
+        )
+
+
+    async def duplicate_report(self, distance: Optional[int] = None) -> List[List[FileModel]]:
+        """
+            Groups of near-duplicate files across the user's whole library. Files are
+            taken oldest first; each one not grouped yet becomes the representative of
+            a new group, made of the ungrouped files within `distance` of it (one
+            BK-tree lookup per representative rather than a comparison of every pair).
+            Every member is close to its representative, so a chain of small
+            differences (A~B~C with A and C far apart) does not merge into one group.
+        """
+        image_distance = self.DEFAULT_IMAGE_DISTANCE if distance is None else distance
+        frame_distance = self.DEFAULT_FRAME_DISTANCE if distance is None else distance
+        index = await self._index()
+        groups: List[List[int]] = []
+        grouped = set()
+
+        image_hashes = {file_id: value for value, file_id in index.images}
+        for file_id in sorted(image_hashes):
+            if file_id in grouped:
+                continue
+            group = [file_id] + sorted(
+                other_id
+                for _, other_id in index.images.search(image_hashes[file_id], image_distance)
+                if other_id != file_id and other_id not in grouped
+            )
+            grouped.update(group)
+            groups.append(group)
+
+        video_frames: Dict[int, List[tuple]] = defaultdict(list)
+        for value, (file_id, position) in index.frames:
+            video_frames[file_id].append((position, value))
+        for file_id in sorted(video_frames):
+            if file_id in grouped:
+                continue
+            ordered = [value for _, value in sorted(video_frames[file_id])]
+            similar = self._similar_videos(index, file_id, ordered, frame_distance)
+            group = [file_id] + sorted(other_id for other_id in similar if other_id not in grouped)
+            grouped.update(group)
+            groups.append(group)
+
+        groups = [group for group in groups if len(group) > 1]
+        files = {
+            file.id: file
+            for file in await FileModel.filter(
+                id__in=[file_id for group in groups for file_id in group],
+                owner_id=self.user_id,
+                is_deleted=False,
+            )
+        }
+        report = []
+        for group in groups:
+            live = [files[file_id] for file_id in group if file_id in files]
+            if len(live) > 1:
+                report.append(live)
+        return report
+
+
+@pipeline.register(
+    "perceptual_hash",
+    accepts=lambda file: (
+        (file.type in IMAGE_TYPES and PILLOW_AVAILABLE)
+        or (file.type == FileTypeEnum.VIDEO and FFMPEG_AVAILABLE)
+    ),
+)
+async def compute_perceptual_hashes(file: FileModel):
+    if file.type in IMAGE_TYPES:
+        kind = PerceptualHashKind.IMAGE
+        try:
+            hashes = [await run_in_process(dhash_image, file.file_path, file.metadata)]
+        except Exception:
+            logger.warning(f"Could not decode image {file.id} for hashing", exc_info=True)
+            hashes = []
+    else:
+        kind = PerceptualHashKind.VIDEO_FRAME
+        hashes = await keyframe_hashes(file.file_path)
+    if not hashes:
+        # Marker row, so the backfill does not queue the file again on every start
+        kind, hashes = PerceptualHashKind.NONE, [0]
+
+    # Re-processing a file replaces its hashes; the indexes holding the old ones rebuild
+    if await PerceptualHashModel.filter(file_id=file.id).delete():
+        await SyncManager.bump_library_version(file.owner_id)
+    await PerceptualHashModel.bulk_create([
+        PerceptualHashModel(
+            file_id=file.id,
+            owner_id=file.owner_id,
+            kind=kind,
+            hash=to_signed(value),
+            position=position,
+        )
+        for position, value in enumerate(hashes)
+    ])
+
+
+async def backfill_perceptual_hashes(batch_size: int = 500):
+    """
+        Queue image and video files that have no hash (nor marker) yet, e.g. files added by the
+        bulk import command or uploaded while the server went down mid-pipeline.
+    """
+    types = []
+    if PILLOW_AVAILABLE:
+        types.extend(IMAGE_TYPES)
+    if FFMPEG_AVAILABLE:
+        types.append(FileTypeEnum.VIDEO)
+    if not types:
+        return
+
+    last_id = 0
+    while True:
+        file_ids = await (
+            FileModel
+            .filter(id__gt=last_id, type__in=types, is_deleted=False, perceptual_hashes__id__isnull=True)
+            .order_by("id")
+            .limit(batch_size)
+            .values_list("id", flat=True)
+        )
+        if not file_ids:
+            break
+        await pipeline.submit(file_ids)
+        last_id = file_ids[-1]
+    logger.info("Perceptual hash backfill queued")
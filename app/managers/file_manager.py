@@ -1,14 +1,33 @@
 
 import os
+import hashlib
+from email.utils import formatdate
+from urllib.parse import quote
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Union
+from typing import List, Optional, Union
 
 from dotenv import load_dotenv
-from fastapi import UploadFile
+from fastapi import UploadFile, responses
+from tortoise.transactions import in_transaction
 
 from app.models import FileModel, UserModel
-from app.constants import FileTypeEnum, FileExtensionEnum, AccessType
-from app.utils import Util
+from app.constants import (
+    AccessEventType,
+    AccessType,
+    ChangeActionEnum,
+    FileExtensionEnum,
+    FileTypeEnum,
+)
+from app.exceptions import FileNotFoundException, RangeNotSatisfiableException
+from app.managers.sync_manager import SyncManager
+from app.managers.folder_manager import FolderManager
+from app.utils import FileTypeSniffer, Util, file_types
+from app.utils.pipeline import pipeline
+from app.utils.access_log import AccessEvent, access_log
+from app.utils.events import events
+from app.utils.blob_cache import blob_cache
+from app.utils.compression import CODEC, ZstdFrameEncoder, is_compressed, iter_decompressed
 
 
 # Load environment configuration
@@ -26,71 +45,130 @@ class FileManager():
 
     async def upload_file(
             self,
-            files: Union[UploadFile, List[UploadFile]]
+            files: Union[UploadFile, List[UploadFile]],
+            folder_id: Optional[int] = None,
+            upload_id: Optional[str] = None
         ):
         """
             This method ensure files (or file) are uploaded
             Uploaded : It means files are saved to the specified locations by environment vars
                         and daved all the saved meta data to the database.
+            Files are placed in `folder_id`, or in the root when it is not given.
+            Progress is published on the user's event channel under `upload_id`.
         """
         # Convert single file to list for uniform processing
         if not isinstance(files, list):
             files = [files]
         
         uploaded_files = []
+        upload_id = upload_id or Util.get_uuid()
         user = await UserModel.get(id=self.user_id)
-        for file in files:
+        folder = await FolderManager(self.user_id).get_folder_or_root(folder_id)
+        for index, file in enumerate(files):
             try:
-                # Step 1: Copy the file to storage
-                file_path = await self._handle_file_copying(user, file)
+                # Step 1: Copy the file to storage, sniffing its first bytes and hashing
+                # it on the way, and compressing it when its type is worth it
+                sniffer = FileTypeSniffer()
+                digest = hashlib.sha256()
+                encoder = ZstdFrameEncoder(file.filename)
+                file_path = await self._handle_file_copying(
+                    user, file, observers=[sniffer, digest], encoder=encoder
+                )
                 
                 # Step 2: Extract file metadata
-                file_size = await self._get_file_size(file_path)
-                file_type, file_extension = Util.get_file_type_and_extension(file.filename)
+                file_size = float(encoder.original_size)
+                file_type, file_extension = Util.get_file_type_and_extension(file.filename, sniffer.head)
                 
                 # Step 3: Create database record
                 file_record = FileModel(
                     name=str(file.filename),
                     original_filename=self.generate_file_name(file.filename),
-                    mime_type=file.content_type,
+                    mime_type=self._get_mime_type(file, file_extension),
                     type=file_type,
                     extension=file_extension,
                     file_path=file_path,
                     owner_id=self.user_id,  # Hardcoded to user_id 1 for now
                     size=file_size,
+                    folder=folder,
+                    folder_path=folder.path if folder else "",
                     access_type=AccessType.PRIVATE,  # Default to private
-                    metadata={},
+                    metadata=encoder.metadata(),
+                    checksum=digest.hexdigest(),
                     shared_with=[]
                 )
                 
-                # Save to database
-                await file_record.save()
+                # Save to database together with its change journal entry
+                async with in_transaction() as conn:
+                    await file_record.save(using_db=conn)
+                    await SyncManager.record_change(
+                        self.user_id,
+                        file_record.id,
+                        ChangeActionEnum.CREATE,
+                        SyncManager.file_snapshot(file_record),
+                        using_db=conn,
+                    )
+                SyncManager.notify(self.user_id)
+                events.publish(
+                    self.user_id,
+                    "upload.stored",
+                    upload_id=upload_id,
+                    index=index,
+                    filename=file.filename,
+                    file_id=file_record.id,
+                    size=file_record.size,
+                )
                 uploaded_files.append(file_record)
                 
             except Exception as e:
                 # Log error and continue with other files
                 print(f"Error uploading file {file.filename}: {str(e)}")
+                events.publish(
+                    self.user_id,
+                    "upload.failed",
+                    upload_id=upload_id,
+                    index=index,
+                    filename=file.filename,
+                    error=str(e),
+                )
                 # You might want to raise an exception or collect errors
                 raise
         
+        # Step 4: Hand the files over to the background processing stages
+        await pipeline.submit([file_record.id for file_record in uploaded_files])
         return uploaded_files
 
 
     def generate_file_name(self, file_name: str):
-        pfft = file_name.split('.')
-        name = pfft[0]
-        ext = pfft[1]
-        return f"{name}-{Util.get_uuid()}.{ext}"
+        """Unique storage name, e.g. holiday.2019.jpg -> holiday.2019-<uuid>.jpg"""
+        name, ext = file_types.split_extension(file_name)
+        unique_name = f"{name.lstrip('.') or 'file'}-{Util.get_uuid()}"
+        return f"{unique_name}.{ext}" if ext else unique_name
 
 
-    async def _handle_file_copying(self, user, file: UploadFile) -> str:
+    @staticmethod
+    def _get_mime_type(file: UploadFile, extension: Optional[FileExtensionEnum]):
+        """Trust the client's content type unless it is missing or generic."""
+        if file.content_type and file.content_type != "application/octet-stream":
+            return file.content_type
+        info = file_types.from_extension(extension)
+        return info.mime_type if info else file.content_type
+
+
+    async def _handle_file_copying(
+            self, user, file: UploadFile, observers=(), encoder=None
+        ) -> str:
         """This handles the file copying operation in specified location in manager."""
         # Generate unique filename
         unique_filename = self.generate_file_name(file.filename)
         destination = os.path.join(self.storage_path, user.email, unique_filename)
 
         # Copy file to destination
-        file_path = await Util.copy_file(file.file, destination)
+        file_path = await Util.copy_file(
+            file.file,
+            destination,
+            observers=observers,
+            encoder=encoder,
+        )
         return file_path
     
     
@@ -100,17 +178,214 @@ class FileManager():
     
     
     async def list_files(self):
-        files = await FileModel.filter(owner=self.user_id)
+        files = await FileModel.filter(owner=self.user_id, is_deleted=False)
         return files
+
+
+    async def _get_owned_file(self, file_id: int) -> FileModel:
+        file = await FileModel.filter(
+            id=file_id, owner_id=self.user_id, is_deleted=False
+        ).first()
+        if file is None:
+            raise FileNotFoundException()
+        return file
+
+
+    async def _save_with_change(self, file: FileModel, action: ChangeActionEnum, update_fields: List[str]):
+        """Persist a mutation of `file` and its journal entry atomically."""
+        async with in_transaction() as conn:
+            await file.save(update_fields=update_fields + ["updated_at"], using_db=conn)
+            await SyncManager.record_change(
+                self.user_id,
+                file.id,
+                action,
+                SyncManager.file_snapshot(file),
+                using_db=conn,
+            )
+        SyncManager.notify(self.user_id)
+        return file
+
+
+    async def rename_file(self, file_id: int, name: str) -> FileModel:
+        """Rename the file for display only; the blob on disk keeps its unique name."""
+        file = await self._get_owned_file(file_id)
+        file.name = name
+        return await self._save_with_change(file, ChangeActionEnum.RENAME, ["name"])
+
+
+    async def delete_file(self, file_id: int) -> FileModel:
+        """Soft delete the file, the blob stays on disk until it is purged."""
+        file = await self._get_owned_file(file_id)
+        file.is_deleted = True
+        file.deleted_at = datetime.now(timezone.utc)
+        return await self._save_with_change(
+            file, ChangeActionEnum.DELETE, ["is_deleted", "deleted_at"]
+        )
+
+
+    async def move_file(self, file_id: int, folder_id: Optional[int]) -> FileModel:
+        """Move the file to another folder (or the root); only metadata changes."""
+        file = await self._get_owned_file(file_id)
+        folder = await FolderManager(self.user_id).get_folder_or_root(folder_id)
+        file.folder = folder
+        file.folder_path = folder.path if folder else ""
+        return await self._save_with_change(
+            file, ChangeActionEnum.MOVE, ["folder_id", "folder_path"]
+        )
+
+
+    async def share_file(self, file_id: int, user_ids: List[int]) -> FileModel:
+        """Replace the list of users the file is shared with."""
+        file = await self._get_owned_file(file_id)
+        file.shared_with = sorted(set(user_ids) - {self.user_id})
+        return await self._save_with_change(file, ChangeActionEnum.SHARE, ["shared_with"])
     
-    async def download_file(self, file_id: str):
+    async def _get_accessible_file(self, file_id: int) -> FileModel:
+        """A file the user owns or that has been shared with them."""
+        file = await FileModel.filter(id=file_id, is_deleted=False).first()
+        if file is None or (
+            file.owner_id != self.user_id and self.user_id not in (file.shared_with or [])
+        ):
+            raise FileNotFoundException()
+        return file
+
+
+    async def download_file(
+            self,
+            file_id: int,
+            range_header: Optional[str] = None,
+            accept_encoding: Optional[str] = None,
+            bandwidth = None,
+            client_ip: Optional[str] = None
+        ):
         """
         It downloads the file
+
+        Compressed files are served as stored with `Content-Encoding: zstd` when the
+        client accepts it and asks for the whole file, otherwise they are decompressed
+        on the fly, frame by frame, so Range requests only inflate the frames they span.
         
         :param file_id: primary key for the file object.
-        :type file_id: str
+        :type file_id: int
+        :param range_header: value of the request's `Range` header.
+        :param accept_encoding: value of the request's `Accept-Encoding` header.
+        :param bandwidth: `UserBandwidth` pacing the stream, None for no shaping.
+        :param client_ip: address of the client, for the access log.
         """
-        
-        file = await FileModel.filter(id=file_id).first()
+        file = await self._get_accessible_file(file_id)
+        compressed = is_compressed(file.metadata)
+
+        # Small plain files are served from memory maps, larger ones stream from disk
+        view = None
+        if not compressed and blob_cache.accepts(file.size):
+            try:
+                view = await blob_cache.get(self.blob_key(file), file.file_path)
+            except FileNotFoundError:
+                raise FileNotFoundException("File content is missing from storage")
+        try:
+            stat = os.stat(file.file_path)
+        except FileNotFoundError:
+            raise FileNotFoundException("File content is missing from storage")
+
+        headers = {
+            "Content-Disposition": f"attachment; filename*=utf-8''{quote(file.name)}",
+            "Accept-Ranges": "bytes",
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+            "ETag": self.content_etag(file, stat),
+        }
+        media_type = file.mime_type or "application/octet-stream"
+
+        accepted = [
+            encoding.split(";")[0].strip().lower()
+            for encoding in (accept_encoding or "").split(",")
+        ]
+        if compressed and not range_header and CODEC in accepted:
+            # The stored bytes are exactly what the client wants
+            headers["Content-Encoding"] = CODEC
+            headers["Vary"] = "Accept-Encoding"
+            # Another representation of the same content
+            headers["ETag"] = f'{headers["ETag"][:-1]}-{CODEC}"'
+            headers["Content-Length"] = str(os.path.getsize(file.file_path))
+            self._log_access(file, AccessEventType.DOWNLOAD, file.size, client_ip)
+            return self._stream(Util.iter_file_range(file.file_path), 200, media_type, headers, bandwidth)
+
+        if view is not None:
+            size = len(view)
+        elif compressed:
+            size = file.metadata["original_size"]
+        else:
+            size = os.path.getsize(file.file_path)
+        try:
+            byte_range = Util.parse_range_header(range_header, size)
+        except ValueError as e:
+            raise RangeNotSatisfiableException(str(e))
+
+        if byte_range is None:
+            start, end, status_code = 0, size - 1, 200
+        else:
+            (start, end), status_code = byte_range, 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(max(end - start + 1, 0))
+        if start == 0:
+            # Players fetch media in many ranges; only the first one counts as a download
+            self._log_access(file, AccessEventType.DOWNLOAD, end + 1, client_ip)
+
+        if view is not None:
+            if bandwidth is not None:
+                # Small enough to pace up front and hand to the server in one write
+                await bandwidth.throttle(end - start + 1)
+            return responses.Response(
+                view[start:end + 1], status_code=status_code, media_type=media_type, headers=headers
+            )
+        if compressed:
+            chunks = iter_decompressed(file.file_path, file.metadata, start, end)
+        else:
+            chunks = Util.iter_file_range(file.file_path, start, end)
+        return self._stream(chunks, status_code, media_type, headers, bandwidth)
+
+
+    @staticmethod
+    def content_etag(file: FileModel, stat: os.stat_result) -> str:
+        """Strong ETag from the checksum, or from mtime and size like `FileResponse` when unknown."""
+        if file.checksum:
+            return f'"{file.checksum}"'
+        return f'"{hashlib.md5(f"{stat.st_mtime}-{stat.st_size}".encode(), usedforsecurity=False).hexdigest()}"'
+
+
+    @staticmethod
+    def blob_key(file: FileModel) -> str:
+        """
+            The app never rewrites a blob in place, so the id and the content identify
+            it. Hardlinked blobs, which can change behind the app's back, are not
+            cached (see `BlobCache`).
+        """
+        return f"file:{file.id}:{file.checksum or int(file.size)}"
+
+
+    def _log_access(
+            self,
+            file: FileModel,
+            action: AccessEventType,
+            size: Optional[int] = None,
+            client_ip: Optional[str] = None
+        ):
+        access_log.emit(AccessEvent(
+            user_id=self.user_id,
+            file_id=file.id,
+            owner_id=file.owner_id,
+            action=action,
+            bytes=int(size) if size is not None else None,
+            client_ip=client_ip,
+        ))
 
 
+    @staticmethod
+    def _stream(chunks, status_code: int, media_type: str, headers: dict, bandwidth=None):
+        if bandwidth is not None:
+            chunks = bandwidth.wrap(chunks)
+        return responses.StreamingResponse(
+            chunks,
+            status_code=status_code,
+            media_type=media_type,
+            headers=headers,
+        )
@@ -0,0 +1,193 @@
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+from pypika_tortoise import functions as pypika_functions
+from tortoise.expressions import F, Value
+from tortoise.functions import Concat, Count, Function, Sum
+from tortoise.transactions import in_transaction
+
+from app.models import FileModel, FolderModel
+from app.constants import ChangeActionEnum
+from app.exceptions import FolderNotFoundException, InvalidFolderMoveException
+from app.managers.sync_manager import SyncManager
+
+
+class Substring(Function):
+    database_func = pypika_functions.Substring
+
+
+class FolderManager():
+    """
+        Folder hierarchy on top of materialized paths.
+
+        Every folder id is encoded as a fixed-width decimal segment, so the path of a
+        folder is a prefix of the path of all of its descendants and a subtree is the
+        half-open range [path, path + 1). Plain `>=`/`<` comparisons keep the btree index
+        usable regardless of the column collation, unlike LIKE 'prefix%'.
+        Files carry a copy of their folder's path, so listing, sizing, moving and
+        deleting a subtree never touch the blobs on disk.
+    """
+
+    SEGMENT_WIDTH = 12
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+
+
+    @classmethod
+    def path_segment(cls, folder_id: int) -> str:
+        return str(folder_id).zfill(cls.SEGMENT_WIDTH)
+
+
+    @staticmethod
+    def subtree_range(path: str) -> Tuple[str, str]:
+        """Lower (inclusive) and upper (exclusive) bound of every path inside `path`."""
+        upper = str(int(path) + 1).zfill(len(path))
+        return path, upper
+
+
+    async def _get_folder(self, folder_id: int) -> FolderModel:
+        folder = await FolderModel.filter(id=folder_id, owner_id=self.user_id).first()
+        if folder is None:
+            raise FolderNotFoundException()
+        return folder
+
+
+    async def get_folder_or_root(self, folder_id: Optional[int]) -> Optional[FolderModel]:
+        """`None` stands for the root of the user's vault."""
+        if folder_id is None:
+            return None
+        return await self._get_folder(folder_id)
+
+
+    def _subtree_filter(self, folder: FolderModel, field: str) -> dict:
+        lower, upper = self.subtree_range(folder.path)
+        return {
+            f"{field}__gte": lower,
+            f"{field}__lt": upper,
+        }
+
+
+    async def create_folder(self, name: str, parent_id: Optional[int] = None) -> FolderModel:
+        parent = await self.get_folder_or_root(parent_id)
+        async with in_transaction() as conn:
+            folder = await FolderModel.create(
+                name=name,
+                owner_id=self.user_id,
+                parent=parent,
+                using_db=conn,
+            )
+            # The path embeds the folder's own id, which is only known after the insert
+            folder.path = (parent.path if parent else "") + self.path_segment(folder.id)
+            await folder.save(update_fields=["path"], using_db=conn)
+            await SyncManager.record_change(
+                self.user_id, None, ChangeActionEnum.CREATE,
+                SyncManager.folder_snapshot(folder), using_db=conn,
+            )
+        SyncManager.notify(self.user_id)
+        return folder
+
+
+    async def list_folder(self, folder_id: Optional[int] = None) -> dict:
+        """Direct children (sub folders and files) of a folder or of the root."""
+        folder = await self.get_folder_or_root(folder_id)
+        folders = await FolderModel.filter(owner_id=self.user_id, parent_id=folder_id)
+        files = await FileModel.filter(
+            owner_id=self.user_id,
+            folder_path=folder.path if folder else "",
+            is_deleted=False,
+        )
+        return {
+            "folder": folder,
+            "folders": folders,
+            "files": files,
+        }
+
+
+    async def folder_size(self, folder_id: int) -> dict:
+        """Recursive file count and size of a folder."""
+        folder = await self._get_folder(folder_id)
+        result = await (
+            FileModel
+            .filter(owner_id=self.user_id, is_deleted=False, **self._subtree_filter(folder, "folder_path"))
+            .annotate(total_size=Sum("size"), file_count=Count("id"))
+            .first()
+            .values("total_size", "file_count")
+        )
+        return {
+            "folder_id": folder.id,
+            "size": result["total_size"] or 0,
+            "file_count": result["file_count"],
+        }
+
+
+    async def rename_folder(self, folder_id: int, name: str) -> FolderModel:
+        folder = await self._get_folder(folder_id)
+        folder.name = name
+        async with in_transaction() as conn:
+            await folder.save(update_fields=["name", "updated_at"], using_db=conn)
+            await SyncManager.record_change(
+                self.user_id, None, ChangeActionEnum.RENAME,
+                SyncManager.folder_snapshot(folder), using_db=conn,
+            )
+        SyncManager.notify(self.user_id)
+        return folder
+
+
+    async def move_folder(self, folder_id: int, parent_id: Optional[int]) -> FolderModel:
+        """
+            Re-parent a folder. The path prefix of the whole subtree is rewritten with one
+            UPDATE for folders and one for files.
+        """
+        folder = await self._get_folder(folder_id)
+        parent = await self.get_folder_or_root(parent_id)
+        if parent is not None and parent.path.startswith(folder.path):
+            raise InvalidFolderMoveException()
+
+        old_path = folder.path
+        new_path = (parent.path if parent else "") + self.path_segment(folder.id)
+        # Keep everything after the old prefix (SQL substrings are 1-indexed)
+        suffix_start = len(old_path) + 1
+        max_length = FolderModel._meta.fields_map["path"].max_length
+
+        async with in_transaction() as conn:
+            await FolderModel.filter(
+                owner_id=self.user_id, **self._subtree_filter(folder, "path")
+            ).using_db(conn).update(
+                path=Concat(Value(new_path), Substring(F("path"), suffix_start, max_length))
+            )
+            await FileModel.filter(
+                owner_id=self.user_id, **self._subtree_filter(folder, "folder_path")
+            ).using_db(conn).update(
+                folder_path=Concat(Value(new_path), Substring(F("folder_path"), suffix_start, max_length))
+            )
+            folder.parent = parent
+            folder.path = new_path
+            await folder.save(update_fields=["parent_id", "updated_at"], using_db=conn)
+            await SyncManager.record_change(
+                self.user_id, None, ChangeActionEnum.MOVE,
+                SyncManager.folder_snapshot(folder), using_db=conn,
+            )
+        SyncManager.notify(self.user_id)
+        return folder
+
+
+    async def delete_folder(self, folder_id: int) -> FolderModel:
+        """Soft delete every file in the subtree and drop the folders themselves."""
+        folder = await self._get_folder(folder_id)
+        async with in_transaction() as conn:
+            await FileModel.filter(
+                owner_id=self.user_id, is_deleted=False, **self._subtree_filter(folder, "folder_path")
+            ).using_db(conn).update(
+                is_deleted=True,
+                deleted_at=datetime.now(timezone.utc),
+            )
+            await SyncManager.record_change(
+                self.user_id, None, ChangeActionEnum.DELETE,
+                SyncManager.folder_snapshot(folder), using_db=conn,
+            )
+            await FolderModel.filter(
+                owner_id=self.user_id, **self._subtree_filter(folder, "path")
+            ).using_db(conn).delete()
+        SyncManager.notify(self.user_id)
+        return folder
@@ -0,0 +1,159 @@
+import os
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+
+import aiofiles
+from dotenv import load_dotenv
+from fastapi import Response
+
+from app.constants import AccessEventType, FileTypeEnum
+from app.exceptions import (
+    FeatureUnavailableException,
+    FileNotFoundException,
+    UnsupportedFileTypeException,
+)
+from app.managers.file_manager import FileManager
+from app.models import FileModel
+from app.utils.blob_cache import blob_cache
+from app.utils.derivative_cache import DerivativeCache
+from app.utils.images import IMAGE_FORMATS, PILLOW_AVAILABLE, SUPPORTED_FORMATS, resize_image
+from app.utils.workers import run_in_process
+
+
+load_dotenv()
+
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_MB", 1024)) * 1024 * 1024
+
+_cache: Optional[DerivativeCache] = None
+# In-flight resizes by cache key, so identical concurrent requests share one job
+_pending: Dict[str, asyncio.Future] = {}
+
+
+def get_derivative_cache() -> DerivativeCache:
+    global _cache
+    if _cache is None:
+        root = os.path.join(os.getenv("FILE_STORAGE_PATH"), ".cache", "images")
+        _cache = DerivativeCache(root, IMAGE_CACHE_MAX_BYTES)
+    return _cache
+
+
+class ImageManager(FileManager):
+    """Resized/transcoded variants of image files, served from a bounded disk cache."""
+
+    MAX_DIMENSION = 4096
+    DEFAULT_QUALITY = 80
+
+
+    @staticmethod
+    def content_key(file: FileModel) -> str:
+        """Identifies the content of a file; falls back to its id when no checksum is known."""
+        checksum = file.checksum or (file.metadata or {}).get("checksum")
+        return checksum or f"file-{file.id}-{file.size}"
+
+
+    async def _render(self, file: FileModel, key: str, suffix: str, width, height, fmt, quality):
+        cache = get_derivative_cache()
+        destination = str(cache.path_for(key, suffix))
+        await run_in_process(
+            resize_image, file.file_path, file.metadata, destination, width, height, fmt, quality
+        )
+        return cache.put(key, suffix)
+
+
+    async def _get_or_render(self, file: FileModel, key: str, suffix: str, *params):
+        cache = get_derivative_cache()
+        await cache.load()
+        path = cache.get(key, suffix)
+        if path is not None:
+            return path
+
+        future = _pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(file, key, suffix, *params))
+            _pending[key] = future
+            future.add_done_callback(lambda _: _pending.pop(key, None))
+        # Shield so one client disconnecting does not cancel the others' resize
+        return await asyncio.shield(future)
+
+
+    async def get_image(
+            self,
+            file_id: int,
+            width: Optional[int] = None,
+            height: Optional[int] = None,
+            fmt: str = "webp",
+            quality: int = DEFAULT_QUALITY,
+            if_none_match: Optional[str] = None,
+            client_ip: Optional[str] = None
+        ):
+        """
+        Serve the image resized to fit `width` x `height` and encoded as `fmt`.
+
+        :param if_none_match: value of the request's `If-None-Match` header.
+        :param client_ip: address of the client, for the access log.
+        """
+        if not PILLOW_AVAILABLE:
+            raise FeatureUnavailableException("Image processing requires Pillow")
+        if fmt not in SUPPORTED_FORMATS:
+            raise FeatureUnavailableException(f"This server's Pillow cannot encode {fmt} images")
+        file = await self._get_accessible_file(file_id)
+        if file.type != FileTypeEnum.IMAGE:
+            raise UnsupportedFileTypeException("Only image files can be resized")
+
+        width = min(width, self.MAX_DIMENSION) if width else None
+        height = min(height, self.MAX_DIMENSION) if height else None
+        _, suffix, media_type = IMAGE_FORMATS[fmt]
+        key = DerivativeCache.make_key(self.content_key(file), width, height, fmt, quality)
+
+        etag = f'"{key}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "private, max-age=86400",
+        }
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            self._log_access(file, AccessEventType.VIEW, client_ip=client_ip)
+            return Response(status_code=304, headers=headers)
+
+        if not os.path.exists(file.file_path):
+            raise FileNotFoundException("File content is missing from storage")
+        path = await self._get_or_render(file, key, suffix, width, height, fmt, quality)
+        try:
+            view, source = await self._open_rendered(f"image:{key}.{suffix}", path)
+        except FileNotFoundError:
+            # Evicted by another worker between the lookup and now
+            path = await self._get_or_render(file, key, suffix, width, height, fmt, quality)
+            view, source = await self._open_rendered(f"image:{key}.{suffix}", path)
+        if view is not None:
+            self._log_access(file, AccessEventType.VIEW, len(view), client_ip)
+            return Response(view, media_type=media_type, headers=headers)
+        size = os.fstat(source.fileno()).st_size
+        self._log_access(file, AccessEventType.VIEW, size, client_ip)
+        return self._stream(
+            self._iter_open_file(source),
+            200,
+            media_type,
+            {**headers, "Content-Length": str(size)},
+        )
+
+
+    @staticmethod
+    async def _open_rendered(cache_key: str, path) -> Tuple[Optional[memoryview], Any]:
+        """
+            The derivative as a view from the memory cache (thumbnails are small and
+            requested over and over), or else opened for streaming. Either way it is
+            opened right away: it stays readable when the disk cache evicts it meanwhile.
+        """
+        if blob_cache.enabled:
+            view = await blob_cache.get(cache_key, str(path))
+            if view is not None:
+                return view, None
+        return None, await aiofiles.open(path, "rb")
+
+
+    @staticmethod
+    async def _iter_open_file(source, chunk_size: int = 256 * 1024):
+        try:
+            while chunk := await source.read(chunk_size):
+                yield chunk
+        finally:
+            await source.close()
@@ -0,0 +1,350 @@
+"""
+Bit-rot scrubbing of the stored blobs.
+
+A background task re-reads every blob whose last verification is older than
+SCRUB_INTERVAL_DAYS, hashes its original content and compares it with the checksum
+recorded at upload, then walks FILE_STORAGE_PATH for blobs no `FileModel` points to.
+Reads are paced to SCRUB_MBPS on a single idle-priority thread, and files are paged
+by id, so neither memory nor the disks notice millions of files. Problems are kept
+as `IntegrityIssueModel` rows for the admin endpoints.
+
+Every server worker starts a scrubber, but on Postgres only the one holding a session
+advisory lock scrubs; the others stand by and take over when its connection goes away.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+from tortoise import Tortoise
+from tortoise.expressions import Q
+from tortoise.functions import Count
+
+from app.constants import IntegrityIssueKind
+from app.exceptions import FeatureUnavailableException
+from app.managers.sync_manager import SyncManager
+from app.models import FileModel, IntegrityIssueModel
+from app.utils.integrity import (
+    IOBudget,
+    iter_stored_files,
+    lower_thread_priority,
+    storage_root_spellings,
+    verify_blob,
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SCRUB_ENABLED = os.getenv("SCRUB", "on").lower() not in ("0", "off", "false", "no")
+SCRUB_MBPS = float(os.getenv("SCRUB_MBPS", 20))
+SCRUB_INTERVAL_DAYS = float(os.getenv("SCRUB_INTERVAL_DAYS", 30))
+# Pause between two passes
+SCRUB_IDLE_HOURS = float(os.getenv("SCRUB_IDLE_HOURS", 6))
+# Files younger than this are not reported as orphans: their upload may be in flight
+ORPHAN_GRACE_SECONDS = int(os.getenv("SCRUB_ORPHAN_GRACE_SECONDS", 3600))
+# Postgres advisory lock electing the worker that scrubs, and the channel that wakes it
+SCRUB_LOCK_KEY = 0x6472697661756c74  # "drivault"
+SCRUB_CHANNEL = "drivault_scrub"
+# How often standby workers try to take over
+SCRUB_STANDBY_SECONDS = 300
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class IntegrityScrubber():
+
+    BATCH_SIZE = 500
+
+    def __init__(
+            self,
+            rate: float = SCRUB_MBPS * 1024 * 1024,
+            interval: timedelta = timedelta(days=SCRUB_INTERVAL_DAYS),
+            idle_seconds: float = SCRUB_IDLE_HOURS * 3600
+        ):
+        self.budget = IOBudget(rate)
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+        self.status = {
+            "state": "stopped",
+            "pass_started_at": None,
+            "last_pass_finished_at": None,
+            "files_checked": 0,
+            "bytes_checked": 0,
+            "issues_found": 0,
+        }
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+
+    def start(self):
+        if not SCRUB_ENABLED:
+            return
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="integrity-scrubber",
+            initializer=lower_thread_priority,
+        )
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="integrity-scrubber")
+        self.status["state"] = "idle"
+
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self.status["state"] = "stopped"
+
+
+    async def trigger(self):
+        """Start a pass now instead of waiting for the idle period to end, in whichever worker scrubs."""
+        if self.status["state"] == "standby":
+            await Tortoise.get_connection("default").execute_script(f"NOTIFY {SCRUB_CHANNEL}")
+        elif self._wake is not None:
+            self._wake.set()
+
+
+    @asynccontextmanager
+    async def _leadership(self):
+        """
+            Yields whether this worker may scrub. On Postgres that is holding a session
+            advisory lock on a dedicated connection, kept for as long as it scrubs;
+            other databases are single process deployments.
+        """
+        connection = Tortoise.get_connection("default")
+        if connection.capabilities.dialect != "postgres":
+            yield lambda: asyncio.sleep(0)
+            return
+        async with connection.acquire_connection() as raw:
+            if not await raw.fetchval("SELECT pg_try_advisory_lock($1)", SCRUB_LOCK_KEY):
+                yield None
+                return
+            wake = lambda *_: self._wake.set()
+            await raw.add_listener(SCRUB_CHANNEL, wake)
+            try:
+                # Passed to the scrub loop to make sure the lock is still held
+                yield lambda: raw.fetchval("SELECT 1")
+            finally:
+                await raw.remove_listener(SCRUB_CHANNEL, wake)
+                await raw.execute("SELECT pg_advisory_unlock($1)", SCRUB_LOCK_KEY)
+
+
+    async def _run(self):
+        while True:
+            try:
+                async with self._leadership() as check_lock:
+                    if check_lock is not None:
+                        await self._scrub_forever(check_lock)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Integrity scrubber lost its database lock")
+            self.status["state"] = "standby"
+            await asyncio.sleep(SCRUB_STANDBY_SECONDS)
+
+
+    async def _scrub_forever(self, check_lock):
+        self.status["state"] = "idle"
+        while True:
+            await check_lock()
+            try:
+                await self.scrub()
+            except Exception:
+                logger.exception("Integrity scrub pass failed")
+                self.status["state"] = "idle"
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.idle_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+
+    async def _blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+
+    async def scrub(self):
+        started = _now()
+        self.status.update(
+            state="verifying",
+            pass_started_at=started,
+            files_checked=0,
+            bytes_checked=0,
+            issues_found=0,
+        )
+        await self.verify_files(started)
+        self.status["state"] = "scanning"
+        await self.find_orphans(started)
+        self.status.update(state="idle", last_pass_finished_at=_now())
+        logger.info(
+            f"Integrity scrub checked {self.status['files_checked']} files, "
+            f"{self.status['issues_found']} issues"
+        )
+
+
+    async def verify_files(self, started: datetime):
+        """Verify the files not verified since `started` - interval, in id order."""
+        cutoff = started - self.interval
+        last_id = 0
+        while True:
+            files = await (
+                FileModel
+                .filter(Q(verified_at__isnull=True) | Q(verified_at__lt=cutoff), id__gt=last_id)
+                .order_by("id")
+                .limit(self.BATCH_SIZE)
+                .only("id", "owner_id", "file_path", "metadata", "checksum", "size")
+            )
+            if not files:
+                return
+            for file in files:
+                await self.verify_file(file)
+            last_id = files[-1].id
+
+
+    async def verify_file(self, file: FileModel):
+        issue, checksum, detail = await self._blocking(
+            verify_blob, file.file_path, file.metadata, self.budget
+        )
+        self.status["files_checked"] += 1
+        self.status["bytes_checked"] += int(file.size)
+
+        if issue is None and file.checksum and checksum != file.checksum:
+            issue, detail = IntegrityIssueKind.CORRUPTED, "Checksum mismatch"
+        if issue is not None:
+            await self._report(
+                issue,
+                file.file_path,
+                file_id=file.id,
+                expected_checksum=file.checksum,
+                actual_checksum=checksum,
+                detail=detail,
+            )
+            return
+
+        updates = {"verified_at": _now()}
+        if not file.checksum:
+            # Stored before checksums existed: the first intact read becomes the reference
+            updates["checksum"] = checksum
+        await FileModel.filter(id=file.id).update(**updates)
+        if "checksum" in updates:
+            # The checksum is part of the listings
+            await SyncManager.bump_library_version(file.owner_id)
+        await IntegrityIssueModel.filter(
+            file_id=file.id, resolved_at__isnull=True
+        ).update(resolved_at=_now())
+
+
+    async def find_orphans(self, started: datetime):
+        storage_path = os.getenv("FILE_STORAGE_PATH")
+        if not storage_path or not os.path.isdir(storage_path):
+            return
+        # Blobs are compared by their path relative to the storage root, which the
+        # rows may spell differently (symlinks, "..", trailing slash)
+        roots = await self._blocking(storage_root_spellings, storage_path)
+        walker = iter_stored_files(storage_path, time.time() - ORPHAN_GRACE_SECONDS)
+        while (batch := await self._blocking(next, walker, None)) is not None:
+            candidates = {
+                os.path.join(root, relative_path): relative_path
+                for relative_path in batch
+                for root in roots
+            }
+            known = {
+                candidates[path]
+                for path in await FileModel.filter(
+                    file_path__in=list(candidates)
+                ).values_list("file_path", flat=True)
+            }
+            for relative_path in batch:
+                if relative_path not in known:
+                    await self._report(IntegrityIssueKind.ORPHAN, os.path.join(roots[0], relative_path))
+
+        # Orphans not seen by this complete walk have been removed or claimed
+        await IntegrityIssueModel.filter(
+            kind=IntegrityIssueKind.ORPHAN,
+            resolved_at__isnull=True,
+            last_seen_at__lt=started,
+        ).update(resolved_at=_now())
+
+
+    async def _report(self, kind: IntegrityIssueKind, path: str, **fields):
+        self.status["issues_found"] += 1
+        now = _now()
+        issue = await IntegrityIssueModel.filter(
+            kind=kind, path=path, resolved_at__isnull=True
+        ).first()
+        if issue is not None:
+            await IntegrityIssueModel.filter(id=issue.id).update(last_seen_at=now, **fields)
+            return
+        logger.warning(f"Integrity issue ({kind.value}): {path}")
+        await IntegrityIssueModel.create(kind=kind, path=path, last_seen_at=now, **fields)
+
+
+scrubber = IntegrityScrubber()
+
+
+class IntegrityManager():
+    """Admin view of the scrubber and of the issues it found."""
+
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 1000
+
+    async def summary(self) -> dict:
+        counts = await (
+            IntegrityIssueModel
+            .filter(resolved_at__isnull=True)
+            .annotate(count=Count("id"))
+            .group_by("kind")
+            .values("kind", "count")
+        )
+        open_issues = {kind.value: 0 for kind in IntegrityIssueKind}
+        for row in counts:
+            open_issues[IntegrityIssueKind(row["kind"]).value] = row["count"]
+        return {"scrubber": scrubber.status, "open_issues": open_issues}
+
+
+    async def start_scrub(self) -> dict:
+        if not scrubber.running:
+            raise FeatureUnavailableException("The integrity scrubber is disabled on this server")
+        await scrubber.trigger()
+        return await self.summary()
+
+
+    async def list_issues(
+            self,
+            kind: Optional[IntegrityIssueKind] = None,
+            resolved: bool = False,
+            after: int = 0,
+            limit: int = DEFAULT_PAGE_SIZE
+        ) -> dict:
+        """Issues ordered by id; pass the returned `cursor` as `after` for the next page."""
+        query = IntegrityIssueModel.filter(id__gt=after, resolved_at__isnull=not resolved)
+        if kind is not None:
+            query = query.filter(kind=kind)
+        issues = await query.order_by("id").limit(limit + 1)
+        has_more = len(issues) > limit
+        issues = issues[:limit]
+        return {
+            "issues": issues,
+            "cursor": issues[-1].id if issues else after,
+            "has_more": has_more,
+        }
@@ -0,0 +1,210 @@
+"""
+Full-text search over the contents of documents.
+
+The `text_index` pipeline stage extracts the text of every uploaded document (in a
+worker process) and stores it in `DocumentTextModel`, one row per file, so indexing
+never writes to the files table. On Postgres the table carries a generated tsvector
+column with a GIN index, added by `SearchManager.setup` at startup; the database keeps
+it up to date on every insert, and a search is a single indexed query. Files that
+predate the stage, or were added by the bulk import command, are picked up by
+`backfill_document_text`, which queues them in batches.
+
+Documents whose format cannot be extracted in this installation (legacy doc, ppt and
+xls without their conversion tools, PDF without pypdf) or whose extraction failed still
+get a row, with an `unsupported` or `failed` status, and searches report how many of
+the user's documents they could not look into. The backfill retries the unsupported ones
+once a tool for their format is installed.
+"""
+
+import os
+import re
+import json
+import logging
+from typing import List
+
+from dotenv import load_dotenv
+from tortoise import Tortoise
+from tortoise.expressions import Q
+
+from app.constants import DocumentTextStatus, FileTypeEnum
+from app.exceptions import FeatureUnavailableException
+from app.managers.file_manager import FileManager
+from app.models import DocumentTextModel, FileModel
+from app.utils.pipeline import pipeline
+from app.utils.text_extraction import EXTRACTORS, can_extract, extract_text
+from app.utils.workers import run_in_process
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration (stemming and stop words), e.g. "english", "french", "simple"
+SEARCH_TS_CONFIG = os.getenv("SEARCH_TS_CONFIG", "english")
+SEARCH_MAX_CHARS = int(os.getenv("SEARCH_MAX_CHARS", 200000))
+SEARCH_MAX_FILE_BYTES = int(float(os.getenv("SEARCH_MAX_FILE_MB", 50)) * 1024 * 1024)
+
+if not re.fullmatch(r"[a-z_][a-z0-9_]*", SEARCH_TS_CONFIG):
+    raise ValueError(f"Invalid SEARCH_TS_CONFIG: {SEARCH_TS_CONFIG!r}")
+
+HEADLINE_OPTIONS = "MaxFragments=2, MaxWords=30, MinWords=10, StartSel=«, StopSel=», FragmentDelimiter=\" … \""
+
+
+def _is_postgres() -> bool:
+    return Tortoise.get_connection("default").capabilities.dialect == "postgres"
+
+
+class SearchManager(FileManager):
+    """Ranked full-text search over the documents a user owns or that are shared with them."""
+
+    DEFAULT_PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 100
+
+    @staticmethod
+    async def setup():
+        """Add the tsvector column and its GIN index; a no-op when they exist or off Postgres."""
+        if not _is_postgres():
+            logger.info("Full-text search needs PostgreSQL, document search is disabled")
+            return
+        table = DocumentTextModel._meta.db_table
+        connection = Tortoise.get_connection("default")
+        await connection.execute_script(
+            f"""
+            ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS (to_tsvector('{SEARCH_TS_CONFIG}', content)) STORED;
+            CREATE INDEX IF NOT EXISTS "{table}_search_vector_idx"
+                ON "{table}" USING GIN (search_vector);
+            ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS status VARCHAR(11) NOT NULL
+                DEFAULT '{DocumentTextStatus.INDEXED.value}';
+            """
+        )
+
+
+    async def search(self, query: str, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0) -> dict:
+        """
+        Documents matching `query` (web search syntax: quoted phrases, `or`, `-word`),
+        best match first, each with a snippet in which the matched words are marked
+        «like this». `unindexed` counts the user's documents that could not be indexed
+        and therefore never match.
+        """
+        if not _is_postgres():
+            raise FeatureUnavailableException("Full-text search requires PostgreSQL")
+
+        texts = DocumentTextModel._meta.db_table
+        files = FileModel._meta.db_table
+        # Snippets are built for the returned page only, ts_headline re-parses the text
+        sql = f"""
+            WITH query AS (
+                SELECT websearch_to_tsquery('{SEARCH_TS_CONFIG}', $1) AS q
+            ),
+            matches AS (
+                SELECT d.file_id, d.content, ts_rank_cd(d.search_vector, query.q) AS rank
+                FROM "{texts}" d
+                CROSS JOIN query
+                JOIN "{files}" f ON f.id = d.file_id
+                WHERE d.search_vector @@ query.q
+                    AND NOT f.is_deleted
+                    AND (f.owner_id = $2 OR f.shared_with @> $3::jsonb)
+                ORDER BY rank DESC, d.file_id DESC
+                LIMIT $4 OFFSET $5
+            )
+            SELECT m.file_id, m.rank,
+                ts_headline('{SEARCH_TS_CONFIG}', m.content, query.q, '{HEADLINE_OPTIONS}') AS snippet
+            FROM matches m
+            CROSS JOIN query
+            ORDER BY m.rank DESC, m.file_id DESC
+        """
+        rows = await Tortoise.get_connection("default").execute_query_dict(
+            sql, [query, self.user_id, json.dumps([self.user_id]), limit + 1, offset]
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        found = {file.id: file for file in await FileModel.filter(id__in=[row["file_id"] for row in rows])}
+        results: List[dict] = [
+            {"file": found[row["file_id"]], "rank": row["rank"], "snippet": row["snippet"]}
+            for row in rows
+            if row["file_id"] in found
+        ]
+        return {
+            "query": query,
+            "results": results,
+            "offset": offset,
+            "has_more": has_more,
+            "unindexed": await self._count_unindexed(),
+        }
+
+
+    async def _count_unindexed(self) -> int:
+        texts = DocumentTextModel._meta.db_table
+        files = FileModel._meta.db_table
+        sql = f"""
+            SELECT count(*) AS unindexed
+            FROM "{texts}" d
+            JOIN "{files}" f ON f.id = d.file_id
+            WHERE d.status <> $1
+                AND NOT f.is_deleted
+                AND (f.owner_id = $2 OR f.shared_with @> $3::jsonb)
+        """
+        rows = await Tortoise.get_connection("default").execute_query_dict(
+            sql, [DocumentTextStatus.INDEXED.value, self.user_id, json.dumps([self.user_id])]
+        )
+        return rows[0]["unindexed"]
+
+
+def _is_document(file: FileModel) -> bool:
+    return file.type == FileTypeEnum.DOCUMENT or can_extract(file.extension)
+
+
+@pipeline.register("text_index", accepts=_is_document)
+async def index_document_text(file: FileModel):
+    if not can_extract(file.extension):
+        logger.info(f"No text extractor for .{file.extension.value} files, file {file.id} is not indexed")
+        await DocumentTextModel.update_or_create(
+            defaults={"content": "", "status": DocumentTextStatus.UNSUPPORTED}, file_id=file.id
+        )
+        return
+
+    status = DocumentTextStatus.INDEXED
+    try:
+        text = await run_in_process(
+            extract_text,
+            file.file_path,
+            file.metadata,
+            file.extension.value,
+            SEARCH_MAX_FILE_BYTES,
+            SEARCH_MAX_CHARS,
+        )
+    except Exception:
+        # Corrupt, encrypted or unsupported variant of the format
+        logger.warning(f"Could not extract the text of file {file.id}", exc_info=True)
+        text = ""
+        status = DocumentTextStatus.FAILED
+    await DocumentTextModel.update_or_create(defaults={"content": text, "status": status}, file_id=file.id)
+
+
+async def backfill_document_text(batch_size: int = 500):
+    """
+        Queue the documents that have not been processed yet, and the unsupported ones
+        whose format has become extractable since.
+    """
+    extractable = list(EXTRACTORS)
+    last_id = 0
+    while True:
+        file_ids = await (
+            FileModel
+            .filter(
+                Q(type=FileTypeEnum.DOCUMENT) | Q(extension__in=extractable),
+                Q(document_text__id__isnull=True)
+                | Q(document_text__status=DocumentTextStatus.UNSUPPORTED, extension__in=extractable),
+                id__gt=last_id,
+                is_deleted=False,
+            )
+            .order_by("id")
+            .limit(batch_size)
+            .values_list("id", flat=True)
+        )
+        if not file_ids:
+            break
+        await pipeline.submit(file_ids)
+        last_id = file_ids[-1]
+    logger.info("Document text backfill queued")
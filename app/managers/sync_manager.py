@@ -0,0 +1,212 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from app.models import ChangeLogModel, FileModel, FolderModel, UserModel
+from app.constants import ChangeActionEnum
+
+
+class ChangeNotifier():
+    """
+        In-process wake-up signal for long-polling sync clients.
+        Every waiter of a user shares one event which is swapped out on notify,
+        so a single mutation wakes all of the user's open connections at once.
+    """
+
+    def __init__(self):
+        self._events: Dict[int, asyncio.Event] = {}
+
+    def notify(self, user_id: int):
+        event = self._events.pop(user_id, None)
+        if event is not None:
+            event.set()
+
+    def event(self, user_id: int) -> asyncio.Event:
+        """Grab the event before reading the journal so no notify is missed in between."""
+        return self._events.setdefault(user_id, asyncio.Event())
+
+    @staticmethod
+    async def wait(event: asyncio.Event, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+notifier = ChangeNotifier()
+
+
+class SyncManager():
+
+    MAX_WAIT_SECONDS = 30
+    # Writes made by another worker never fire the local notifier, so waiters
+    # re-read the journal at least this often.
+    RECHECK_SECONDS = 5
+    DEFAULT_PAGE_SIZE = 500
+    MAX_PAGE_SIZE = 1000
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+
+
+    @staticmethod
+    def file_snapshot(file_record: FileModel) -> dict:
+        """Fields a client needs to mirror a file without re-fetching the listing."""
+        return jsonable_encoder({
+            "id": file_record.id,
+            "name": file_record.name,
+            "mime_type": file_record.mime_type,
+            "type": file_record.type,
+            "extension": file_record.extension,
+            "size": file_record.size,
+            "checksum": file_record.checksum,
+            "access_type": file_record.access_type,
+            "shared_with": file_record.shared_with,
+            "folder_id": file_record.folder_id,
+            "created_at": file_record.created_at,
+            "updated_at": file_record.updated_at,
+        })
+
+
+    @staticmethod
+    def folder_snapshot(folder: FolderModel) -> dict:
+        """
+            Folder changes are journaled with `file_id` = null and the folder under the
+            "folder" key; one entry covers the whole subtree on move and delete.
+        """
+        return jsonable_encoder({
+            "folder": {
+                "id": folder.id,
+                "name": folder.name,
+                "parent_id": folder.parent_id,
+                "created_at": folder.created_at,
+                "updated_at": folder.updated_at,
+            }
+        })
+
+
+    @staticmethod
+    async def record_changes(
+            owner_id: int,
+            changes: List[dict],
+            using_db=None
+        ):
+        """
+            Append journal entries for the given owner.
+            Must be called inside the same transaction as the file mutation so the
+            journal never disagrees with `FileModel`.
+
+            The journal ids are the clients' cursors, but an id is handed out at insert
+            while the row only becomes visible at commit. The owner's row is therefore
+            locked (by bumping its library version) before inserting: concurrent
+            writers of one user queue up on it, so their entries get ids in commit
+            order and a client never moves its cursor past an entry it has not seen.
+
+            :param changes: dicts with `file_id`, `action` and optional `payload`.
+        """
+        if not changes:
+            return
+        if using_db is None:
+            async with in_transaction() as conn:
+                await SyncManager.record_changes(owner_id, changes, using_db=conn)
+            return
+
+        await SyncManager.bump_library_version(owner_id, using_db=using_db)
+        entries = [
+            ChangeLogModel(
+                owner_id=owner_id,
+                file_id=change.get("file_id"),
+                action=change["action"],
+                payload=change.get("payload", {}),
+            )
+            for change in changes
+        ]
+        await ChangeLogModel.bulk_create(entries, using_db=using_db)
+
+
+    @staticmethod
+    async def bump_library_version(owner_id: int, using_db=None):
+        """Invalidate the owner's listing ETags and cached listings."""
+        await UserModel.filter(id=owner_id).using_db(using_db).update(
+            library_version=F("library_version") + 1
+        )
+
+
+    @staticmethod
+    async def record_change(
+            owner_id: int,
+            file_id: Optional[int],
+            action: ChangeActionEnum,
+            payload: Optional[dict] = None,
+            using_db=None
+        ):
+        await SyncManager.record_changes(
+            owner_id,
+            [{"file_id": file_id, "action": action, "payload": payload or {}}],
+            using_db=using_db,
+        )
+
+
+    @staticmethod
+    def notify(owner_id: int):
+        """Wake up long-polling clients of the owner. Call after the transaction commits."""
+        notifier.notify(owner_id)
+
+
+    async def get_changes(self, since: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+        """
+        Return the journal entries after the given cursor.
+
+        :param since: cursor returned by the previous call, 0 for a full sync.
+        :type since: int
+        :param limit: maximum number of entries in the page.
+        :type limit: int
+        """
+        limit = max(1, min(limit, self.MAX_PAGE_SIZE))
+        rows = await (
+            ChangeLogModel
+            .filter(owner_id=self.user_id, id__gt=since)
+            .order_by("id")
+            .limit(limit + 1)
+            .values("id", "file_id", "action", "payload", "created_at")
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        changes = [
+            {
+                "seq": row["id"],
+                "file_id": row["file_id"],
+                "action": row["action"],
+                "payload": row["payload"],
+                "created_at": row["created_at"],
+            }
+            for row in rows
+        ]
+        return {
+            "changes": changes,
+            "cursor": rows[-1]["id"] if rows else since,
+            "has_more": has_more,
+        }
+
+
+    async def wait_for_changes(self, since: int, limit: int, timeout: float) -> dict:
+        """
+            Long-poll variant of `get_changes`: returns as soon as there is at least one
+            entry after `since`, or an empty page once `timeout` seconds have passed.
+        """
+        timeout = max(0.0, min(timeout, self.MAX_WAIT_SECONDS))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while True:
+            event = notifier.event(self.user_id)
+            page = await self.get_changes(since=since, limit=limit)
+            remaining = deadline - loop.time()
+            if page["changes"] or remaining <= 0:
+                return page
+            await notifier.wait(event, min(remaining, self.RECHECK_SECONDS))
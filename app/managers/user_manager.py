@@ -1,9 +1,27 @@
+import os
+import uuid
+import hashlib
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
 from tortoise.exceptions import IntegrityError
 from pydantic import BaseModel
 
-from app.models import UserModel as User
+from app.models import RefreshTokenModel, UserModel as User
 from app.exceptions import UserAlreadyExistsException, InvalidCredentialsException
-from app.utils.security import create_access_token, verify_password, hash_password
+from app.utils.denylist import denylist
+from app.utils.security import EXPIRE_IN_MINUTE, create_access_token, verify_password, hash_password
+
+load_dotenv()
+
+REFRESH_TOKEN_EXP_DAYS = int(os.getenv("REFRESH_TOKEN_EXP_DAYS", 30))
+
+
+def _hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
 
 class UserManager():
     def __init__(self):
@@ -33,20 +51,110 @@ class UserManager():
             print(user)
             raise auth_error
         
+        # print("password is verified")
+        response = await self._issue_tokens(user)
+        return response
+
+
+    async def _issue_tokens(self, user: User, family: Optional[str] = None) -> dict:
+        """A short-lived access token and the refresh token to renew it without a password."""
         user_info = {
             "id":user.id,
             "email":user.email,
             "role":user.role
         }
-        
-        # print("password is verified")
-        access_token = create_access_token(data = user_info)
-        response = {
+        now = datetime.now(timezone.utc)
+        jti = uuid.uuid4().hex
+        access_expires_at = now + timedelta(minutes=EXPIRE_IN_MINUTE)
+        access_token = create_access_token(
+            data = {**user_info, "jti": jti}, expires_at=access_expires_at
+        )
+
+        refresh_token = secrets.token_urlsafe(48)
+        await RefreshTokenModel.create(
+            user_id=user.id,
+            token_hash=_hash_refresh_token(refresh_token),
+            family=family or uuid.uuid4().hex,
+            access_jti=jti,
+            access_expires_at=access_expires_at,
+            expires_at=now + timedelta(days=REFRESH_TOKEN_EXP_DAYS),
+        )
+        return {
             "token":access_token,
             "token_type":"bearer",
+            "expires_in": EXPIRE_IN_MINUTE * 60,
+            "refresh_token": refresh_token,
             "user":user_info
         }
+
+
+    async def refresh(self, refresh_token: str) -> dict:
+        """
+            Exchange a refresh token for a new pair. The presented token is spent; if it
+            is presented again, it was stolen or replayed, and every token of its family
+            (the thief's and the legitimate client's) is revoked.
+        """
+        auth_error = InvalidCredentialsException("Invalid or expired refresh token")
+        record = await RefreshTokenModel.filter(
+            token_hash=_hash_refresh_token(refresh_token)
+        ).first()
+        now = datetime.now(timezone.utc)
+        if record is None or record.expires_at <= now:
+            raise auth_error
+
+        # Conditional update, so two concurrent refreshes cannot both spend the token
+        spent = await RefreshTokenModel.filter(
+            id=record.id, revoked_at__isnull=True
+        ).update(revoked_at=now)
+        if not spent:
+            await self.revoke_family(record.family)
+            raise auth_error
+
+        user = await User.filter(id=record.user_id, is_active=True).first()
+        if user is None:
+            raise auth_error
+        response = await self._issue_tokens(user, family=record.family)
         return response
 
+
+    async def revoke_family(self, family: str):
+        """Revoke a refresh token family and the access tokens issued with it."""
+        now = datetime.now(timezone.utc)
+        tokens = await RefreshTokenModel.filter(
+            family=family, access_expires_at__gt=now
+        ).values_list("access_jti", "access_expires_at")
+        await RefreshTokenModel.filter(family=family, revoked_at__isnull=True).update(revoked_at=now)
+        await denylist.revoke(tokens)
+
+
+    async def logout(self, claims: dict, refresh_token: Optional[str] = None) -> dict:
+        """
+            Revoke the access token of the request and its session: the refresh token
+            family it was issued with, found by its `jti`, and the one of
+            `refresh_token` when the client sends it as well.
+        """
+        families = set()
+        if claims.get("jti"):
+            expires_at = datetime.fromtimestamp(claims["exp"], timezone.utc)
+            await denylist.revoke([(claims["jti"], expires_at)])
+            families.update(
+                await RefreshTokenModel.filter(
+                    access_jti=claims["jti"], user_id=claims.get("id")
+                ).values_list("family", flat=True)
+            )
+        if refresh_token:
+            families.update(
+                await RefreshTokenModel.filter(
+                    token_hash=_hash_refresh_token(refresh_token),
+                    user_id=claims.get("id"),
+                ).values_list("family", flat=True)
+            )
+        for family in families:
+            await self.revoke_family(family)
+        return {
+            "message":"You are succesfully logged out.",
+            "status": 200
+        }
+
 # I want to write a route handler where a user can upload 
 # single or multiple files. and as of now we have no 
\ No newline at end of file
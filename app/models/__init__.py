@@ -1,7 +1,23 @@
 from .files import FileModel
+from .access_log import AccessDailyStatModel, AccessEventModel
 from .user import UserModel
+from .change_log import ChangeLogModel
+from .folder import FolderModel
+from .document_text import DocumentTextModel
+from .media_hash import PerceptualHashModel
+from .integrity import IntegrityIssueModel
+from .token import RefreshTokenModel, RevokedTokenModel
 
 __all__ = [
+    "AccessDailyStatModel",
+    "AccessEventModel",
+    "ChangeLogModel",
+    "DocumentTextModel",
     "FileModel",
+    "FolderModel",
+    "IntegrityIssueModel",
+    "PerceptualHashModel",
+    "RefreshTokenModel",
+    "RevokedTokenModel",
     "UserModel"
-]
\ No newline at end of file
+]
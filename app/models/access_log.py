@@ -0,0 +1,42 @@
+from tortoise import fields
+from tortoise.models import Model
+from app.constants import AccessEventType
+
+class AccessEventModel(Model):
+    """
+        Who viewed or downloaded which file, when. Written in batches by the access log
+        pipeline (see `app.utils.access_log`), never from the request path. Plain id
+        columns instead of foreign keys keep the inserts cheap and the history intact
+        after files are purged.
+    """
+    id = fields.BigIntField(primary_key=True)
+    user_id = fields.IntField()
+    file_id = fields.BigIntField()
+    owner_id = fields.IntField()
+    action = fields.CharEnumField(enum_type=AccessEventType)
+    bytes = fields.BigIntField(null=True)
+    client_ip = fields.CharField(max_length=45, null=True)
+
+    # Time of the access, not of the (delayed) insert
+    created_at = fields.DatetimeField()
+
+    class Meta:
+        table = "access_events"
+        indexes = (("file_id", "id"), ("user_id", "id"))
+
+
+class AccessDailyStatModel(Model):
+    """Accesses of a file rolled up per day, for "recently viewed" and storage tiering."""
+    id = fields.BigIntField(primary_key=True)
+    day = fields.DateField()
+    file_id = fields.BigIntField()
+    owner_id = fields.IntField()
+    views = fields.IntField(default=0)
+    downloads = fields.IntField(default=0)
+    bytes = fields.BigIntField(default=0)
+    last_accessed_at = fields.DatetimeField()
+
+    class Meta:
+        table = "access_daily_stats"
+        unique_together = (("file_id", "day"),)
+        indexes = (("owner_id", "day"),)
@@ -0,0 +1,26 @@
+from tortoise import fields
+from tortoise.models import Model
+from app.constants import ChangeActionEnum
+
+class ChangeLogModel(Model):
+    """
+        Append-only journal of file mutations. The auto-incrementing primary key
+        is the sync cursor handed out to clients, so it only ever grows; entries of
+        one owner are inserted under a lock on the owner's row, so their ids also
+        follow commit order (see `SyncManager.record_changes`).
+    """
+    id = fields.BigIntField(primary_key=True)
+    owner = fields.ForeignKeyField(
+        "models.UserModel",
+        related_name="changes",
+        on_delete=fields.CASCADE,
+    )
+    file_id = fields.BigIntField(null=True)
+    action = fields.CharEnumField(enum_type=ChangeActionEnum)
+    payload = fields.JSONField(default=dict)  # Snapshot of the changed fields
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "change_log"
+        indexes = (("owner_id", "id"),)
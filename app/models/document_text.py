@@ -0,0 +1,26 @@
+from tortoise import fields
+from tortoise.models import Model
+from app.constants import DocumentTextStatus
+
+class DocumentTextModel(Model):
+    """
+        Text extracted from a document by the `text_index` pipeline stage. On Postgres
+        `SearchManager.setup` adds a generated `search_vector` (tsvector) column with a
+        GIN index to this table. Kept out of `FileModel` so indexing never writes to, or
+        locks, the files table. An empty `content` marks a file that has been processed
+        but holds no text (scanned PDF, ...); `status` tells the documents that could
+        not be indexed at all apart, so they are not mistaken for empty ones.
+    """
+    id = fields.BigIntField(primary_key=True)
+    file = fields.OneToOneField(
+        "models.FileModel",
+        related_name="document_text",
+        on_delete=fields.CASCADE,
+    )
+    content = fields.TextField()
+    status = fields.CharEnumField(enum_type=DocumentTextStatus, default=DocumentTextStatus.INDEXED)
+
+    extracted_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "document_texts"
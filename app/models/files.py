@@ -20,8 +20,22 @@ class FileModel(Model):
     )
     size = fields.FloatField()
 
+    folder = fields.ForeignKeyField(
+        "models.FolderModel",
+        related_name="files",
+        on_delete=fields.SET_NULL,
+        null=True,
+    )
+    # Copy of `folder.path` ("" for the root) so subtree queries never join folders
+    folder_path = fields.CharField(max_length=1020, default="", db_index=True)
+
     metadata = fields.JSONField(default=dict)  # Store additional file metadata
 
+    # SHA-256 (hex) of the original content, computed while the upload is copied
+    checksum = fields.CharField(max_length=64, null=True)
+    # Last time the integrity scrubber re-read the blob and found it intact
+    verified_at = fields.DatetimeField(null=True)
+
     access_type = fields.CharEnumField(
         enum_type=AccessType
     )
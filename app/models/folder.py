@@ -0,0 +1,31 @@
+from tortoise import fields
+from tortoise.models import Model
+
+class FolderModel(Model):
+    """
+        Folder/album in a user's vault, stored as a materialized path.
+
+        `path` is the concatenation of the zero-padded ids of every ancestor and the
+        folder itself, so a whole subtree is one contiguous btree range
+        (see `FolderManager.subtree_range`).
+    """
+    id = fields.BigIntField(primary_key=True)
+    name = fields.CharField(max_length=255)
+    owner = fields.ForeignKeyField(
+        "models.UserModel",
+        related_name="folders",
+        on_delete=fields.CASCADE,
+    )
+    parent = fields.ForeignKeyField(
+        "models.FolderModel",
+        related_name="children",
+        on_delete=fields.CASCADE,
+        null=True,
+    )
+    path = fields.CharField(max_length=1020, default="", db_index=True)
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "folders"
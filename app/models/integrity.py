@@ -0,0 +1,31 @@
+from tortoise import fields
+from tortoise.models import Model
+from app.constants import IntegrityIssueKind
+
+class IntegrityIssueModel(Model):
+    """
+        Problem found by the integrity scrubber. An issue stays open while the scrubber
+        keeps seeing it (`last_seen_at`) and is resolved once it is gone, e.g. the blob
+        was restored from a backup or the orphan removed.
+    """
+    id = fields.BigIntField(primary_key=True)
+    kind = fields.CharEnumField(enum_type=IntegrityIssueKind)
+    # Null for orphans, which by definition have no row
+    file = fields.ForeignKeyField(
+        "models.FileModel",
+        related_name="integrity_issues",
+        on_delete=fields.CASCADE,
+        null=True,
+    )
+    path = fields.CharField(max_length=1024)
+    expected_checksum = fields.CharField(max_length=64, null=True)
+    actual_checksum = fields.CharField(max_length=64, null=True)
+    detail = fields.TextField(null=True)
+
+    detected_at = fields.DatetimeField(auto_now_add=True)
+    last_seen_at = fields.DatetimeField()
+    resolved_at = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "integrity_issues"
+        indexes = (("resolved_at", "kind"), ("path", "kind"))
@@ -0,0 +1,32 @@
+from tortoise import fields
+from tortoise.models import Model
+from app.constants import PerceptualHashKind
+
+class PerceptualHashModel(Model):
+    """
+        64-bit perceptual hash (dHash) of an image, or of one keyframe of a video
+        (`position` is the keyframe's index). Kept out of `FileModel.metadata` so the
+        duplicate index can be loaded without reading every file's metadata. A single
+        `NONE` row marks a file that was processed but has no usable hash.
+    """
+    id = fields.BigIntField(primary_key=True)
+    file = fields.ForeignKeyField(
+        "models.FileModel",
+        related_name="perceptual_hashes",
+        on_delete=fields.CASCADE,
+    )
+    owner = fields.ForeignKeyField(
+        "models.UserModel",
+        related_name="perceptual_hashes",
+        on_delete=fields.CASCADE,
+    )
+    kind = fields.CharEnumField(enum_type=PerceptualHashKind)
+    # Stored signed to fit BIGINT, see `DuplicateManager.to_signed`
+    hash = fields.BigIntField()
+    position = fields.IntField(default=0)
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "perceptual_hashes"
+        indexes = (("owner_id", "id"),)
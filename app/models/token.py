@@ -0,0 +1,43 @@
+from tortoise import fields
+from tortoise.models import Model
+
+class RefreshTokenModel(Model):
+    """
+        Opaque refresh token, stored as its SHA-256. Every refresh revokes the token and
+        issues a successor in the same `family`; presenting a revoked token again means
+        it leaked, and the whole family is revoked.
+    """
+    id = fields.BigIntField(primary_key=True)
+    user = fields.ForeignKeyField(
+        "models.UserModel",
+        related_name="refresh_tokens",
+        on_delete=fields.CASCADE,
+    )
+    token_hash = fields.CharField(max_length=64, unique=True)
+    family = fields.CharField(max_length=32, db_index=True)
+    # Access token issued together with this refresh token, denied with the family;
+    # logging out with it revokes the family
+    access_jti = fields.CharField(max_length=32, db_index=True)
+    access_expires_at = fields.DatetimeField()
+    expires_at = fields.DatetimeField()
+    revoked_at = fields.DatetimeField(null=True)
+
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "refresh_tokens"
+
+
+class RevokedTokenModel(Model):
+    """
+        Access tokens revoked before their expiry, mirrored in memory by every worker
+        (see `TokenDenylist`). Rows are purged once the token has expired anyway.
+    """
+    id = fields.BigIntField(primary_key=True)
+    jti = fields.CharField(max_length=32, unique=True)
+    expires_at = fields.DatetimeField(db_index=True)
+
+    revoked_at = fields.DatetimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        table = "revoked_tokens"
@@ -13,6 +13,9 @@ class UserModel(Model):
         max_length=20
     )
     is_active = fields.BooleanField(default=True)
+    # Bumped with every journaled change of the user's files and folders, see
+    # `SyncManager.record_changes`; listings derive their ETag from it
+    library_version = fields.BigIntField(default=0)
 
     created_at = fields.DatetimeField(
         auto_now_add=True
@@ -1,8 +1,16 @@
 from .files import file as file_router
 from .users import user as user_router
+from .sync import sync as sync_router
+from .folders import folder as folder_router
+from .admin import admin as admin_router
+from .events import events as events_router
 
 
 __all__ = [
+    "admin_router",
+    "events_router",
     "file_router",
+    "folder_router",
+    "sync_router",
     "user_router",
-]
\ No newline at end of file
+]
@@ -0,0 +1,68 @@
+from typing import Optional
+
+from fastapi import (
+    APIRouter,
+    Request,
+    Depends,
+    Query
+)
+from app.utils.security import get_current_admin
+from app.models import UserModel
+from app.constants import IntegrityIssueKind
+
+from app.managers import IntegrityManager
+from app.utils.access_log import access_log
+from app.utils.blob_cache import blob_cache
+admin = APIRouter(
+    prefix="/admin"
+)
+
+
+@admin.get("/integrity")
+async def integrity_summary(request: Request, user: UserModel = Depends(get_current_admin)):
+    """Scrubber progress and the number of open issues of each kind."""
+    manager = IntegrityManager()
+
+    response = await manager.summary()
+    return response
+
+
+@admin.get("/integrity/issues")
+async def list_integrity_issues(
+    request: Request,
+    kind: Optional[IntegrityIssueKind] = None,
+    resolved: bool = False,
+    after: int = Query(0, ge=0),
+    limit: int = Query(IntegrityManager.DEFAULT_PAGE_SIZE, ge=1, le=IntegrityManager.MAX_PAGE_SIZE),
+    user: UserModel = Depends(get_current_admin)
+):
+    """Missing, corrupted and orphaned blobs; page with the returned `cursor`."""
+    manager = IntegrityManager()
+
+    response = await manager.list_issues(kind=kind, resolved=resolved, after=after, limit=limit)
+    return response
+
+
+@admin.post("/integrity/scrub")
+async def start_scrub(request: Request, user: UserModel = Depends(get_current_admin)):
+    """Start a scrub pass now rather than at the end of the idle period."""
+    manager = IntegrityManager()
+
+    response = await manager.start_scrub()
+    return response
+
+
+@admin.get("/access-log")
+async def access_log_status(request: Request, user: UserModel = Depends(get_current_admin)):
+    """Counters of the access log pipeline; `dropped` grows when the database falls behind."""
+    return {
+        "running": access_log.running,
+        "pending": access_log.pending,
+        **access_log.stats,
+    }
+
+
+@admin.get("/blob-cache")
+async def blob_cache_status(request: Request, user: UserModel = Depends(get_current_admin)):
+    """Hits, misses and size of this worker's in-memory cache of small files."""
+    return blob_cache.metrics()
@@ -0,0 +1,45 @@
+import json
+
+from fastapi import (
+    APIRouter,
+    Request,
+    Depends
+)
+from fastapi.responses import StreamingResponse
+
+from app.utils.security import get_current_user
+from app.utils.rate_limit import rate_limit
+from app.utils.events import events as event_bus
+from app.models import UserModel
+
+events = APIRouter(
+    prefix="/events"
+)
+
+# Comment line sent on idle SSE connections so proxies don't drop them
+SSE_KEEPALIVE = ": keep-alive\n\n"
+KEEPALIVE_SECONDS = 15
+
+
+@events.get("", dependencies=[Depends(rate_limit("sync"))])
+async def stream_events(request: Request, user: UserModel = Depends(get_current_user)):
+    """
+        Server-Sent Events feed of upload progress (`upload.progress`, `upload.stored`,
+        `upload.failed`) and background processing (`processing.stage`,
+        `processing.done`). Events are live only: nothing is replayed on reconnect,
+        use `/v1/sync` to catch up on changes.
+    """
+    async def event_stream():
+        async with event_bus.subscribe(user.id) as subscription:
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=KEEPALIVE_SECONDS)
+                if event is None:
+                    yield SSE_KEEPALIVE
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -1,19 +1,23 @@
-from typing import List
+from typing import List, Literal, Optional
 from fastapi import (
     APIRouter,
     Request,
     UploadFile, 
-    Depends
+    Depends,
+    Query
 )
 from app.utils.security import get_current_user
+from app.utils.rate_limit import rate_limit, shaper
+from app.utils.response_cache import cached_listing
 from app.models import UserModel
+from app.serializer import FileMovePayload, FileRenamePayload, FileSharePayload
 
-from app.managers import FileManager
+from app.managers import AccessLogManager, DuplicateManager, FileManager, ImageManager, SearchManager
 file = APIRouter(
     prefix="/files"
 )
 
-@file.get("/list/all")
+@file.get("/list/all", dependencies=[Depends(rate_limit("list"))])
 async def list_files(request: Request, user: UserModel = Depends(get_current_user)):
     print(user)
     user_id = user.id
@@ -21,22 +25,249 @@ async def list_files(request: Request, user: UserModel = Depends(get_current_use
         user_id=user_id
     )
 
-    response = await manager.list_files()
+    response = await cached_listing(
+        user, "files", request.headers.get("if-none-match"), manager.list_files
+    )
     return response
 
 
-@file.post("/upload")
+@file.post("/upload", dependencies=[Depends(rate_limit("upload"))])
 async def upload_files(
     request: Request,
     files: List[UploadFile],
+    folder_id: Optional[int] = None,
+    upload_id: Optional[str] = Query(None, max_length=64),
     user: UserModel = Depends(get_current_user)
 ):
-
+    """
+        Store the files. Pass a client generated `upload_id` to follow the progress
+        of this upload on the `/v1/events` stream: `upload.progress` while the body
+        is received, then `upload.stored` or `upload.failed` for each file.
+    """
     user_id = user.id
     manager = FileManager(
         user_id=user_id
     )
 
-    response = await manager.upload_file(files)
+    # The body is paced and its progress reported while it is received, see
+    # `UploadShapingMiddleware`
+    response = await manager.upload_file(files, folder_id=folder_id, upload_id=upload_id)
+    return response
+
+
+@file.get("/search", dependencies=[Depends(rate_limit("list"))])
+async def search_files(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=256),
+    limit: int = Query(SearchManager.DEFAULT_PAGE_SIZE, ge=1, le=SearchManager.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    user: UserModel = Depends(get_current_user)
+):
+    """Documents owned by or shared with the user whose contents match `q`, best match first."""
+    manager = SearchManager(
+        user_id=user.id
+    )
+
+    response = await manager.search(q, limit=limit, offset=offset)
+    return response
+
+
+@file.get("/recent", dependencies=[Depends(rate_limit("list"))])
+async def recently_viewed(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    user: UserModel = Depends(get_current_user)
+):
+    """Files the user viewed or downloaded last."""
+    manager = AccessLogManager(
+        user_id=user.id
+    )
+
+    response = await manager.recently_viewed(limit)
+    return response
+
+
+@file.get("/access/history", dependencies=[Depends(rate_limit("list"))])
+async def access_history(
+    request: Request,
+    before: Optional[int] = Query(None, ge=1),
+    limit: int = Query(AccessLogManager.DEFAULT_PAGE_SIZE, ge=1, le=AccessLogManager.MAX_PAGE_SIZE),
+    user: UserModel = Depends(get_current_user)
+):
+    """Everything the user viewed or downloaded, newest first."""
+    manager = AccessLogManager(
+        user_id=user.id
+    )
+
+    response = await manager.user_history(before=before, limit=limit)
+    return response
+
+
+@file.get("/duplicates/report", dependencies=[Depends(rate_limit())])
+async def duplicate_report(
+    request: Request,
+    distance: Optional[int] = Query(None, ge=0, le=32),
+    user: UserModel = Depends(get_current_user)
+):
+    """Groups of near-duplicate photos and videos in the whole library."""
+    manager = DuplicateManager(
+        user_id=user.id
+    )
+
+    response = await manager.duplicate_report(distance)
+    return response
+
+
+@file.get("/{file_id}/duplicates", dependencies=[Depends(rate_limit())])
+async def find_duplicates(
+    request: Request,
+    file_id: int,
+    distance: Optional[int] = Query(None, ge=0, le=32),
+    user: UserModel = Depends(get_current_user)
+):
+    """Near-duplicates of a photo or video, closest first."""
+    manager = DuplicateManager(
+        user_id=user.id
+    )
+
+    response = await manager.find_duplicates(file_id, distance)
+    return response
+
+
+@file.get("/{file_id}/access", dependencies=[Depends(rate_limit("list"))])
+async def file_access_history(
+    request: Request,
+    file_id: int,
+    before: Optional[int] = Query(None, ge=1),
+    limit: int = Query(AccessLogManager.DEFAULT_PAGE_SIZE, ge=1, le=AccessLogManager.MAX_PAGE_SIZE),
+    user: UserModel = Depends(get_current_user)
+):
+    """Who viewed or downloaded the file, newest first."""
+    manager = AccessLogManager(
+        user_id=user.id
+    )
+
+    response = await manager.file_history(file_id, before=before, limit=limit)
+    return response
+
+
+@file.get("/{file_id}/access/stats", dependencies=[Depends(rate_limit())])
+async def file_access_stats(
+    request: Request,
+    file_id: int,
+    days: int = Query(30, ge=1, le=366),
+    user: UserModel = Depends(get_current_user)
+):
+    """Views and downloads of the file per day."""
+    manager = AccessLogManager(
+        user_id=user.id
+    )
+
+    response = await manager.file_stats(file_id, days)
+    return response
+
+
+@file.get("/{file_id}/download", dependencies=[Depends(rate_limit("download"))])
+async def download_file(
+    request: Request,
+    file_id: int,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FileManager(
+        user_id=user.id
+    )
+
+    response = await manager.download_file(
+        file_id,
+        range_header=request.headers.get("range"),
+        accept_encoding=request.headers.get("accept-encoding"),
+        bandwidth=shaper.for_user(user),
+        client_ip=request.client.host if request.client else None,
+    )
+    return response
+
+
+@file.get("/{file_id}/image", dependencies=[Depends(rate_limit("image"))])
+async def get_image(
+    request: Request,
+    file_id: int,
+    w: Optional[int] = Query(None, ge=1),
+    h: Optional[int] = Query(None, ge=1),
+    fmt: Literal["webp", "avif", "jpeg", "png"] = "webp",
+    q: int = Query(ImageManager.DEFAULT_QUALITY, ge=1, le=100),
+    user: UserModel = Depends(get_current_user)
+):
+    """Image resized to fit w x h (aspect ratio kept) and transcoded to `fmt`."""
+    manager = ImageManager(
+        user_id=user.id
+    )
+
+    response = await manager.get_image(
+        file_id,
+        width=w,
+        height=h,
+        fmt=fmt,
+        quality=q,
+        if_none_match=request.headers.get("if-none-match"),
+        client_ip=request.client.host if request.client else None,
+    )
+    return response
+
+
+@file.patch("/{file_id}", dependencies=[Depends(rate_limit())])
+async def rename_file(
+    request: Request,
+    file_id: int,
+    payload: FileRenamePayload,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FileManager(
+        user_id=user.id
+    )
+
+    response = await manager.rename_file(file_id, payload.name)
+    return response
+
+
+@file.delete("/{file_id}", dependencies=[Depends(rate_limit())])
+async def delete_file(
+    request: Request,
+    file_id: int,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FileManager(
+        user_id=user.id
+    )
+
+    response = await manager.delete_file(file_id)
+    return response
+
+
+@file.post("/{file_id}/move", dependencies=[Depends(rate_limit())])
+async def move_file(
+    request: Request,
+    file_id: int,
+    payload: FileMovePayload,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FileManager(
+        user_id=user.id
+    )
+
+    response = await manager.move_file(file_id, payload.folder_id)
     return response
 
+
+@file.post("/{file_id}/share", dependencies=[Depends(rate_limit())])
+async def share_file(
+    request: Request,
+    file_id: int,
+    payload: FileSharePayload,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FileManager(
+        user_id=user.id
+    )
+
+    response = await manager.share_file(file_id, payload.user_ids)
+    return response
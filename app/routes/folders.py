@@ -0,0 +1,120 @@
+from fastapi import (
+    APIRouter,
+    Request,
+    Depends
+)
+from app.utils.security import get_current_user
+from app.utils.rate_limit import rate_limit
+from app.utils.response_cache import cached_listing
+from app.models import UserModel
+from app.serializer import FolderCreatePayload, FolderMovePayload, FolderRenamePayload
+
+from app.managers import FolderManager
+folder = APIRouter(
+    prefix="/folders"
+)
+
+
+@folder.post("", dependencies=[Depends(rate_limit())])
+async def create_folder(
+    request: Request,
+    payload: FolderCreatePayload,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FolderManager(
+        user_id=user.id
+    )
+
+    response = await manager.create_folder(payload.name, payload.parent_id)
+    return response
+
+
+@folder.get("", dependencies=[Depends(rate_limit("list"))])
+async def list_root(request: Request, user: UserModel = Depends(get_current_user)):
+    manager = FolderManager(
+        user_id=user.id
+    )
+
+    response = await cached_listing(
+        user, "folder-root", request.headers.get("if-none-match"),
+        lambda: manager.list_folder(None),
+    )
+    return response
+
+
+@folder.get("/{folder_id}", dependencies=[Depends(rate_limit())])
+async def list_folder(
+    request: Request,
+    folder_id: int,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FolderManager(
+        user_id=user.id
+    )
+
+    response = await cached_listing(
+        user, f"folder-{folder_id}", request.headers.get("if-none-match"),
+        lambda: manager.list_folder(folder_id),
+    )
+    return response
+
+
+@folder.get("/{folder_id}/size", dependencies=[Depends(rate_limit())])
+async def folder_size(
+    request: Request,
+    folder_id: int,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FolderManager(
+        user_id=user.id
+    )
+
+    response = await cached_listing(
+        user, f"folder-{folder_id}-size", request.headers.get("if-none-match"),
+        lambda: manager.folder_size(folder_id),
+    )
+    return response
+
+
+@folder.patch("/{folder_id}", dependencies=[Depends(rate_limit())])
+async def rename_folder(
+    request: Request,
+    folder_id: int,
+    payload: FolderRenamePayload,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FolderManager(
+        user_id=user.id
+    )
+
+    response = await manager.rename_folder(folder_id, payload.name)
+    return response
+
+
+@folder.post("/{folder_id}/move", dependencies=[Depends(rate_limit())])
+async def move_folder(
+    request: Request,
+    folder_id: int,
+    payload: FolderMovePayload,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FolderManager(
+        user_id=user.id
+    )
+
+    response = await manager.move_folder(folder_id, payload.parent_id)
+    return response
+
+
+@folder.delete("/{folder_id}", dependencies=[Depends(rate_limit())])
+async def delete_folder(
+    request: Request,
+    folder_id: int,
+    user: UserModel = Depends(get_current_user)
+):
+    manager = FolderManager(
+        user_id=user.id
+    )
+
+    response = await manager.delete_folder(folder_id)
+    return response
@@ -0,0 +1,81 @@
+import json
+
+from fastapi import (
+    APIRouter,
+    Request,
+    Depends,
+    Query
+)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from app.utils.security import get_current_user
+from app.utils.rate_limit import rate_limit
+from app.models import UserModel
+
+from app.managers import SyncManager
+sync = APIRouter(
+    prefix="/sync"
+)
+
+# Comment line sent on idle SSE connections so proxies don't drop them
+SSE_KEEPALIVE = ": keep-alive\n\n"
+
+
+@sync.get("", dependencies=[Depends(rate_limit("sync"))])
+async def get_changes(
+    request: Request,
+    since: int = Query(0, ge=0),
+    limit: int = Query(SyncManager.DEFAULT_PAGE_SIZE, ge=1, le=SyncManager.MAX_PAGE_SIZE),
+    wait: float = Query(0, ge=0, le=SyncManager.MAX_WAIT_SECONDS),
+    user: UserModel = Depends(get_current_user)
+):
+    """
+        Return the changes after the `since` cursor. Pass the returned `cursor` back
+        on the next call and keep paging while `has_more` is true. With `wait` > 0 the
+        request is held open (long-poll) until a change arrives or the wait expires.
+    """
+    manager = SyncManager(
+        user_id=user.id
+    )
+
+    if wait:
+        response = await manager.wait_for_changes(since=since, limit=limit, timeout=wait)
+    else:
+        response = await manager.get_changes(since=since, limit=limit)
+    return response
+
+
+@sync.get("/stream", dependencies=[Depends(rate_limit("sync"))])
+async def stream_changes(
+    request: Request,
+    since: int = Query(0, ge=0),
+    user: UserModel = Depends(get_current_user)
+):
+    """Server-Sent Events feed of changes; each event id is the cursor to resume from."""
+    manager = SyncManager(
+        user_id=user.id
+    )
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+
+    async def event_stream(cursor: int):
+        while not await request.is_disconnected():
+            page = await manager.wait_for_changes(
+                since=cursor,
+                limit=SyncManager.DEFAULT_PAGE_SIZE,
+                timeout=SyncManager.MAX_WAIT_SECONDS,
+            )
+            if not page["changes"]:
+                yield SSE_KEEPALIVE
+                continue
+            cursor = page["cursor"]
+            data = json.dumps(jsonable_encoder(page))
+            yield f"id: {cursor}\nevent: changes\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        event_stream(since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Request
+from typing import Optional
 
+from fastapi import APIRouter, Depends, Request
 
-from app.serializer import UserRegisterPayload, UserLoginPayload
+
+from app.serializer import LogoutPayload, RefreshTokenPayload, UserRegisterPayload, UserLoginPayload
+from app.utils.security import get_token_claims
 from app.models.response import UserResponse
 from app.exceptions import UserAlreadyExistsException
 from app.managers import UserManager
@@ -26,9 +29,21 @@ async def login(request: Request, payload: UserLoginPayload):
     return response
 
 
+@user.post("/refresh")
+async def refresh(request: Request, payload: RefreshTokenPayload):
+    """New access and refresh tokens; the presented refresh token can't be used again."""
+
+    response = await UserManager().refresh(payload.refresh_token)
+    return response
+
+
 @user.post("/logout")
-async def logout(request: Request):
-    return {
-        "message":"You are succesfully logged out.",
-        "status": 200
-    }
\ No newline at end of file
+async def logout(
+    request: Request,
+    payload: Optional[LogoutPayload] = None,
+    claims: dict = Depends(get_token_claims)
+):
+    response = await UserManager().logout(
+        claims, refresh_token=payload.refresh_token if payload else None
+    )
+    return response
\ No newline at end of file
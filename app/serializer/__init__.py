@@ -1,6 +1,25 @@
-from .input_serializer import UserLoginPayload, UserRegisterPayload
+from .input_serializer import (
+    LogoutPayload,
+    RefreshTokenPayload,
+    UserLoginPayload,
+    UserRegisterPayload,
+    FileMovePayload,
+    FileRenamePayload,
+    FileSharePayload,
+    FolderCreatePayload,
+    FolderMovePayload,
+    FolderRenamePayload,
+)
 
 __all__ = [
+    "FileMovePayload",
+    "FileRenamePayload",
+    "FileSharePayload",
+    "FolderCreatePayload",
+    "FolderMovePayload",
+    "FolderRenamePayload",
+    "LogoutPayload",
+    "RefreshTokenPayload",
     "UserLoginPayload",
     "UserRegisterPayload",
 ]
\ No newline at end of file
@@ -1,3 +1,4 @@
+from typing import List, Optional
 from typing_extensions import Self
 
 from pydantic import BaseModel, model_validator
@@ -7,6 +8,15 @@ class UserLoginPayload(BaseModel):
     email: str
     password: str
 
+class RefreshTokenPayload(BaseModel):
+    refresh_token: str
+
+
+class LogoutPayload(BaseModel):
+    # Also revoke this refresh token (and its rotations)
+    refresh_token: Optional[str] = None
+
+
 class UserRegisterPayload(BaseModel):
     fullname: str
     email: str
@@ -22,3 +32,28 @@ class UserRegisterPayload(BaseModel):
 
 class UploadFile(BaseModel):
     pass
+
+
+class FileRenamePayload(BaseModel):
+    name: str
+
+
+class FileSharePayload(BaseModel):
+    user_ids: List[int]
+
+
+class FileMovePayload(BaseModel):
+    folder_id: Optional[int] = None
+
+
+class FolderCreatePayload(BaseModel):
+    name: str
+    parent_id: Optional[int] = None
+
+
+class FolderRenamePayload(BaseModel):
+    name: str
+
+
+class FolderMovePayload(BaseModel):
+    parent_id: Optional[int] = None
@@ -21,6 +21,13 @@ TORTOISE_ORM = {
         "models": [
             "app.models.user",
             "app.models.files",
+            "app.models.change_log",
+            "app.models.folder",
+            "app.models.media_hash",
+            "app.models.integrity",
+            "app.models.token",
+            "app.models.access_log",
+            "app.models.document_text",
             # "aerich.models"  # For migrations support
         ],
         "default_connection": "default"
@@ -1,5 +1,8 @@
 from .utils import Util
+from .file_types import FileTypeSniffer, file_types
 
 __all__ = [
-    "Util"
-]
\ No newline at end of file
+    "FileTypeSniffer",
+    "Util",
+    "file_types",
+]
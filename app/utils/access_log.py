@@ -0,0 +1,223 @@
+"""
+Access log pipeline: who viewed or downloaded which file.
+
+Request handlers only `emit` an event into a bounded in-process queue, which never
+blocks and never touches the database. A background task drains the queue in batches
+(ACCESS_LOG_BATCH_SIZE events or ACCESS_LOG_FLUSH_SECONDS, whichever comes first),
+bulk-inserts them into `AccessEventModel` and adds them to the per-day counters of
+`AccessDailyStatModel`. When the database cannot keep up the queue fills and further
+events are dropped and counted rather than slowing down downloads; the counters are
+exposed on the admin endpoints.
+"""
+
+import os
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from app.constants import AccessEventType
+from app.models import AccessDailyStatModel, AccessEventModel
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ACCESS_LOG_QUEUE_SIZE = int(os.getenv("ACCESS_LOG_QUEUE_SIZE", 10000))
+ACCESS_LOG_BATCH_SIZE = int(os.getenv("ACCESS_LOG_BATCH_SIZE", 500))
+ACCESS_LOG_FLUSH_SECONDS = float(os.getenv("ACCESS_LOG_FLUSH_SECONDS", 1))
+
+# Queued by `stop` behind the pending events: the writer flushes them, then exits
+_STOP = object()
+
+
+@dataclass
+class AccessEvent:
+    user_id: int
+    file_id: int
+    owner_id: int
+    action: AccessEventType
+    bytes: Optional[int] = None
+    client_ip: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class AccessLog():
+
+    def __init__(
+            self,
+            queue_size: int = ACCESS_LOG_QUEUE_SIZE,
+            batch_size: int = ACCESS_LOG_BATCH_SIZE,
+            flush_seconds: float = ACCESS_LOG_FLUSH_SECONDS
+        ):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.stats = {"emitted": 0, "written": 0, "dropped": 0, "failed": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run(), name="access-log-writer")
+
+
+    async def stop(self):
+        """Let the writer flush what is queued (including the batch it holds) and exit."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Emitted while the writer was finishing
+        leftovers = []
+        while not self._queue.empty():
+            event = self._queue.get_nowait()
+            if event is not _STOP:
+                leftovers.append(event)
+        for start in range(0, len(leftovers), self.batch_size):
+            await self.write(leftovers[start:start + self.batch_size])
+
+
+    def emit(self, event: AccessEvent):
+        """Queue an event; drops it when the queue is full instead of waiting."""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            if self.stats["dropped"] % 1000 == 1:
+                logger.warning(f"Access log queue full, {self.stats['dropped']} events dropped so far")
+            return
+        self.stats["emitted"] += 1
+
+
+    async def _collect(self) -> Tuple[List[AccessEvent], bool]:
+        """
+            Wait for an event, then gather more until the batch is full or the flush
+            interval ends. Also tells whether `stop` was requested.
+        """
+        loop = asyncio.get_running_loop()
+        first = await self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = loop.time() + self.flush_seconds
+        while True:
+            while len(batch) < self.batch_size and not self._queue.empty():
+                event = self._queue.get_nowait()
+                if event is _STOP:
+                    return batch, True
+                batch.append(event)
+            remaining = deadline - loop.time()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                return batch, False
+            await asyncio.sleep(min(remaining, 0.1))
+
+
+    async def _run(self):
+        while True:
+            batch, stopping = await self._collect()
+            if batch:
+                await self.write(batch)
+            if stopping:
+                return
+
+
+    async def write(self, batch: List[AccessEvent]):
+        """Insert the events and add them to the counters, all or nothing."""
+        try:
+            async with in_transaction() as conn:
+                await self._insert(batch, conn)
+                await self._roll_up(batch, conn)
+        except Exception:
+            self.stats["failed"] += len(batch)
+            logger.exception(f"Could not write {len(batch)} access events")
+            return
+        self.stats["written"] += len(batch)
+
+
+    async def _insert(self, batch: List[AccessEvent], conn):
+        await AccessEventModel.bulk_create(
+                [
+                    AccessEventModel(
+                        user_id=event.user_id,
+                        file_id=event.file_id,
+                        owner_id=event.owner_id,
+                        action=event.action,
+                        bytes=event.bytes,
+                        client_ip=event.client_ip,
+                        created_at=event.created_at,
+                    )
+                    for event in batch
+                ],
+                batch_size=self.batch_size,
+                using_db=conn,
+            )
+
+
+    async def _roll_up(self, batch: List[AccessEvent], conn):
+        """Add the batch to the daily counters, one statement per (file, day) it touches."""
+        totals = defaultdict(lambda: {"views": 0, "downloads": 0, "bytes": 0, "last_accessed_at": None})
+        owners = {}
+        for event in batch:
+            total = totals[(event.file_id, event.created_at.date())]
+            total["views" if event.action == AccessEventType.VIEW else "downloads"] += 1
+            total["bytes"] += event.bytes or 0
+            total["last_accessed_at"] = max(total["last_accessed_at"] or event.created_at, event.created_at)
+            owners[event.file_id] = event.owner_id
+
+        for (file_id, day), total in totals.items():
+            counters = AccessDailyStatModel.filter(file_id=file_id, day=day).using_db(conn)
+            if await self._add(counters, total):
+                continue
+            try:
+                # Savepoint, so a conflict does not abort the whole batch's transaction
+                async with in_transaction() as savepoint:
+                    await AccessDailyStatModel.create(
+                        file_id=file_id, day=day, owner_id=owners[file_id], using_db=savepoint, **total
+                    )
+            except IntegrityError:
+                # Another worker created the row in between
+                await self._add(counters, total)
+
+
+    @staticmethod
+    async def _add(counters, total: dict) -> int:
+        """
+            Add a batch's totals to an existing counter row; returns 0 when there is
+            none. Batches of several workers, or drained on shutdown, are not written in
+            order, so `last_accessed_at` only ever moves forward.
+        """
+        updated = await counters.update(
+            views=F("views") + total["views"],
+            downloads=F("downloads") + total["downloads"],
+            bytes=F("bytes") + total["bytes"],
+        )
+        if updated:
+            await counters.filter(last_accessed_at__lt=total["last_accessed_at"]).update(
+                last_accessed_at=total["last_accessed_at"]
+            )
+        return updated
+
+
+access_log = AccessLog()
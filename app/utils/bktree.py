@@ -0,0 +1,76 @@
+from typing import Any, Dict, Iterator, List, Tuple
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree():
+    """
+        Burkhard-Keller tree over 64-bit hashes with the Hamming distance.
+
+        A radius search only descends into children whose edge distance d satisfies
+        |d - distance(query, node)| <= radius (triangle inequality), so for the small
+        radii used for near-duplicates only a fraction of the tree is visited instead
+        of comparing against every hash.
+    """
+
+    def __init__(self):
+        # node: [hash, items, {edge distance: child node}]
+        self._root: List = None
+        self.size = 0
+
+
+    def add(self, value: int, item: Any):
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, Any]]:
+        """All (distance, item) pairs whose hash is within `radius` of `value`."""
+        found = []
+        if self._root is None:
+            return found
+
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found.extend((distance, item) for item in node[1])
+            children: Dict[int, List] = node[2]
+            for edge in range(max(distance - radius, 1), distance + radius + 1):
+                child = children.get(edge)
+                if child is not None:
+                    stack.append(child)
+        return found
+
+
+    def __iter__(self) -> Iterator[Tuple[int, Any]]:
+        """Every (hash, item) pair in the tree."""
+        if self._root is None:
+            return
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            for item in node[1]:
+                yield node[0], item
+            stack.extend(node[2].values())
+
+
+    def __len__(self) -> int:
+        return self.size
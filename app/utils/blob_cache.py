@@ -0,0 +1,121 @@
+"""
+In-process cache of small, hot blobs (gallery JPEGs, resized thumbnails, ...).
+
+Entries are read-only memory maps of the stored files, so a hit costs no system call
+at all and responses are `memoryview` slices of the mapping that the server writes to
+the socket without copying. Only files up to BLOB_CACHE_MAX_ENTRY_KB are cached and
+the total is capped at BLOB_CACHE_MB, least recently used first; anything larger keeps
+streaming from disk. Keys must change with the content (checksum, or mtime and size),
+so entries never need to be invalidated.
+
+Mapping a file is only safe while nobody else can write to it: truncating a mapped file
+kills the process with SIGBUS on the next read. Files with more than one hard link (the
+import command's `--hardlink` shares blobs with the user's library) are therefore never
+mapped and keep streaming from disk.
+"""
+
+import os
+import mmap
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BLOB_CACHE_MAX_BYTES = int(float(os.getenv("BLOB_CACHE_MB", 256)) * 1024 * 1024)
+BLOB_CACHE_MAX_ENTRY_BYTES = int(float(os.getenv("BLOB_CACHE_MAX_ENTRY_KB", 1024)) * 1024)
+
+
+class BlobCache():
+
+    def __init__(self, max_bytes: int = BLOB_CACHE_MAX_BYTES, max_entry_bytes: int = BLOB_CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.max_entry_bytes > 0
+
+
+    def accepts(self, size: float) -> bool:
+        return self.enabled and 0 < size <= self.max_entry_bytes
+
+
+    def metrics(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": self.stats["hits"] / lookups if lookups else None,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_entry_bytes": self.max_entry_bytes,
+        }
+
+
+    @staticmethod
+    def _map(path: str, max_entry_bytes: int) -> Optional[mmap.mmap]:
+        """Runs on a thread: map the file and fault its pages in ahead of the first response."""
+        with open(path, "rb") as blob:
+            stat = os.fstat(blob.fileno())
+            if stat.st_size == 0 or stat.st_size > max_entry_bytes or stat.st_nlink > 1:
+                return None
+            mapped = mmap.mmap(blob.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_WILLNEED"):
+            mapped.madvise(mmap.MADV_WILLNEED)
+        return mapped
+
+
+    async def get(self, key: str, path: str) -> Optional[memoryview]:
+        """
+        View of the blob at `path` cached under `key`, mapping it on a miss.
+        Returns None when the file is too large, empty or hardlinked to be cached.
+        """
+        mapped = self._entries.get(key)
+        if mapped is not None:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return memoryview(mapped)
+
+        self.stats["misses"] += 1
+        loop = asyncio.get_running_loop()
+        mapped = await loop.run_in_executor(None, self._map, path, self.max_entry_bytes)
+        if mapped is None:
+            return None
+        if key in self._entries:
+            # Mapped concurrently by another request, keep a single copy
+            self._release(mapped)
+            return memoryview(self._entries[key])
+        self._entries[key] = mapped
+        self.total_bytes += len(mapped)
+        self._evict()
+        return memoryview(mapped)
+
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, mapped = self._entries.popitem(last=False)
+            self.total_bytes -= len(mapped)
+            self.stats["evictions"] += 1
+            self._release(mapped)
+
+
+    @staticmethod
+    def _release(mapped: mmap.mmap):
+        try:
+            mapped.close()
+        except BufferError:
+            # Still being sent by a response; unmapped once its views are released
+            pass
+
+
+blob_cache = BlobCache()
@@ -0,0 +1,153 @@
+"""
+Transparent, per-file zstd compression of compressible uploads.
+
+The stream is cut into independent zstd frames of `FRAME_SIZE` uncompressed bytes and
+the compressed offset of every frame is recorded in the file metadata. A byte range of
+the original content can then be served by seeking to the frame that contains it and
+decompressing only the frames the range spans.
+
+`zstandard` is an optional dependency (`pip install drivault[compression]`); without
+it, or with FILE_COMPRESSION=off, files are stored as they are.
+"""
+
+import os
+from typing import AsyncIterator, BinaryIO, List, Optional
+
+import aiofiles
+from dotenv import load_dotenv
+
+from app.utils.file_types import file_types
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+load_dotenv()
+
+CODEC = "zstd"
+FRAME_SIZE = 1024 * 1024
+COMPRESSION_LEVEL = int(os.getenv("FILE_COMPRESSION_LEVEL", 3))
+COMPRESSION_ENABLED = (
+    zstandard is not None
+    and os.getenv("FILE_COMPRESSION", "on").lower() not in ("0", "off", "false", "no")
+)
+
+
+class ZstdFrameEncoder():
+    """
+        `Util.copy_file` encoder. `start` is called with the first chunk and decides,
+        from the file name and the sniffed content, whether the file is compressed at
+        all; when it is not, chunks pass through untouched.
+    """
+
+    def __init__(self, filename: str, frame_size: int = FRAME_SIZE, level: int = COMPRESSION_LEVEL):
+        self.filename = filename
+        self.frame_size = frame_size
+        self.level = level
+        self.enabled = False
+        self.original_size = 0
+        self.stored_size = 0
+        self.frames: List[int] = []
+        self._buffer = bytearray()
+        self._compressor = None
+
+    def start(self, head: bytes):
+        info = file_types.detect(self.filename, head)
+        self.enabled = COMPRESSION_ENABLED and info is not None and info.compressible
+        if self.enabled:
+            self._compressor = zstandard.ZstdCompressor(level=self.level, write_content_size=True)
+
+    def _emit_frame(self, frame: bytes) -> bytes:
+        compressed = self._compressor.compress(frame)
+        self.frames.append(self.stored_size)
+        self.stored_size += len(compressed)
+        return compressed
+
+    def encode(self, chunk: bytes) -> bytes:
+        self.original_size += len(chunk)
+        if not self.enabled:
+            self.stored_size += len(chunk)
+            return chunk
+
+        self._buffer += chunk
+        output = bytearray()
+        while len(self._buffer) >= self.frame_size:
+            output += self._emit_frame(bytes(self._buffer[:self.frame_size]))
+            del self._buffer[:self.frame_size]
+        return bytes(output)
+
+    def finish(self) -> bytes:
+        if not self.enabled or not self._buffer:
+            return b""
+        output = self._emit_frame(bytes(self._buffer))
+        self._buffer.clear()
+        return output
+
+    def metadata(self) -> dict:
+        """Entries merged into `FileModel.metadata` for compressed files."""
+        if not self.enabled:
+            return {}
+        return {
+            "codec": CODEC,
+            "original_size": self.original_size,
+            "stored_size": self.stored_size,
+            "frame_size": self.frame_size,
+            "frames": self.frames,
+        }
+
+
+def is_compressed(metadata: Optional[dict]) -> bool:
+    return bool(metadata) and metadata.get("codec") == CODEC
+
+
+async def iter_decompressed(
+        path: str,
+        metadata: dict,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+    """
+    Yield the original bytes `start`..`end` (inclusive) of a frame-compressed file.
+
+    Args:
+        path: Path of the stored (compressed) blob
+        metadata: `FileModel.metadata` written by `ZstdFrameEncoder`
+        start: First byte of the original content to return
+        end: Last byte of the original content to return, defaults to the end
+    """
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to read compressed files")
+
+    original_size = metadata["original_size"]
+    frame_size = metadata["frame_size"]
+    frames = metadata["frames"]
+    end = original_size - 1 if end is None else min(end, original_size - 1)
+    if start > end:
+        return
+
+    decompressor = zstandard.ZstdDecompressor()
+    first_frame = start // frame_size
+    last_frame = end // frame_size
+
+    async with aiofiles.open(path, "rb") as blob:
+        await blob.seek(frames[first_frame])
+        for index in range(first_frame, last_frame + 1):
+            if index + 1 < len(frames):
+                compressed = await blob.read(frames[index + 1] - frames[index])
+            else:
+                compressed = await blob.read()
+            data = decompressor.decompress(compressed)
+
+            frame_start = index * frame_size
+            lower = max(start - frame_start, 0)
+            upper = min(end - frame_start + 1, len(data))
+            yield data[lower:upper]
+
+
+def open_decompressed(blob: BinaryIO) -> BinaryIO:
+    """Blocking reader of the original bytes of a frame-compressed blob opened in binary mode."""
+    if zstandard is None:
+        raise RuntimeError("zstandard is required to read compressed files")
+    return zstandard.ZstdDecompressor().stream_reader(blob, read_across_frames=True)
@@ -0,0 +1,109 @@
+"""
+In-memory denylist of revoked access tokens, keyed by their `jti` claim.
+
+`get_current_user` checks every request against it, so it has to stay off the
+database: each worker keeps the unexpired revocations in a TTL set, loaded at startup
+and then kept in sync by polling `RevokedTokenModel` for recent rows in the
+background. A revocation applies at once on the worker that made it and within
+TOKEN_DENYLIST_SYNC_SECONDS on the others. Access tokens are short-lived, so the set
+only ever holds the revocations of the last few minutes.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+from tortoise.exceptions import IntegrityError
+
+from app.models import RefreshTokenModel, RevokedTokenModel
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DENYLIST_SYNC_SECONDS = float(os.getenv("TOKEN_DENYLIST_SYNC_SECONDS", 2))
+# Rows are re-read for this long after their insertion, which covers transactions
+# committing out of order and clock skew between workers
+SYNC_OVERLAP = timedelta(seconds=60)
+PURGE_EVERY_SECONDS = 3600
+
+
+class TokenDenylist():
+
+    def __init__(self, sync_seconds: float = DENYLIST_SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        # jti -> expiry (epoch seconds)
+        self._revoked: Dict[str, float] = {}
+        self._synced_at: Optional[datetime] = None
+        self._purged_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if not jti:
+            return False
+        expires = self._revoked.get(jti)
+        return expires is not None and expires > time.time()
+
+
+    def add(self, jti: str, expires_at: datetime):
+        self._revoked[jti] = expires_at.timestamp()
+
+
+    async def revoke(self, tokens: Iterable[Tuple[str, datetime]]):
+        """Deny the (jti, expiry) access tokens here at once and, through the table, everywhere."""
+        for jti, expires_at in tokens:
+            if expires_at <= datetime.now(timezone.utc):
+                continue
+            try:
+                await RevokedTokenModel.create(jti=jti, expires_at=expires_at)
+            except IntegrityError:
+                # Already revoked
+                pass
+            self.add(jti, expires_at)
+
+
+    async def sync(self):
+        now = datetime.now(timezone.utc)
+        query = RevokedTokenModel.filter(expires_at__gt=now)
+        if self._synced_at is not None:
+            query = query.filter(revoked_at__gte=self._synced_at - SYNC_OVERLAP)
+        for jti, expires_at in await query.values_list("jti", "expires_at"):
+            self.add(jti, expires_at)
+        self._synced_at = now
+
+        current = time.time()
+        self._revoked = {jti: expires for jti, expires in self._revoked.items() if expires > current}
+        if current - self._purged_at > PURGE_EVERY_SECONDS:
+            self._purged_at = current
+            await RevokedTokenModel.filter(expires_at__lte=now).delete()
+            # Expired refresh tokens can no longer be presented either
+            await RefreshTokenModel.filter(expires_at__lte=now).delete()
+
+
+    async def start(self):
+        await self.sync()
+        self._task = asyncio.create_task(self._run(), name="token-denylist-sync")
+
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Token denylist sync failed")
+
+
+denylist = TokenDenylist()
@@ -0,0 +1,109 @@
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+class DerivativeCache():
+    """
+        Size-capped LRU of generated files (resized images, ...) on disk.
+
+        Entries are addressed by a key derived from the source content hash and the
+        generation parameters, so an entry never goes stale and the key doubles as a
+        strong ETag. The LRU order lives in memory and is rebuilt from the files'
+        access times by `load`; every worker keeps its own view, which is only an
+        approximation of the global LRU but never serves wrong content.
+
+        Eviction may unlink a file while a response is about to send it (in this
+        worker or another one): callers open the file before letting go of the
+        event loop, and render it again if it is already gone.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._loaded = False
+
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha256(":".join(str(part) for part in parts).encode()).hexdigest()
+
+
+    def path_for(self, key: str, suffix: str) -> Path:
+        return self.root / key[:2] / f"{key}.{suffix}"
+
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """Blocking walk of the cache directory, run on a thread."""
+        if not self.root.exists():
+            return []
+        found = []
+        with os.scandir(self.root) as directories:
+            for directory in directories:
+                if not directory.is_dir():
+                    continue
+                with os.scandir(directory.path) as entries:
+                    for entry in entries:
+                        if entry.is_file() and not entry.name.startswith("."):
+                            stat = entry.stat()
+                            found.append((stat.st_atime, entry.name, stat.st_size))
+        return found
+
+
+    async def load(self):
+        """Index what previous runs left behind, least recently used first. Call before `get`/`put`."""
+        if self._loaded:
+            return
+        found = await asyncio.to_thread(self._scan)
+        if self._loaded:
+            # Loaded by a concurrent caller meanwhile
+            return
+        self._loaded = True
+        for _, name, size in sorted(found):
+            if name not in self._entries:
+                self._entries[name] = size
+                self.total_bytes += size
+        self._evict()
+
+
+    def get(self, key: str, suffix: str) -> Optional[Path]:
+        name = f"{key}.{suffix}"
+        path = self.path_for(key, suffix)
+        if name not in self._entries:
+            # Possibly written by another worker
+            if not path.exists():
+                return None
+            self._entries[name] = path.stat().st_size
+            self.total_bytes += self._entries[name]
+        if not path.exists():
+            self.total_bytes -= self._entries.pop(name)
+            return None
+        self._entries.move_to_end(name)
+        return path
+
+
+    def put(self, key: str, suffix: str) -> Path:
+        """Register a file already written at `path_for(key, suffix)`."""
+        name = f"{key}.{suffix}"
+        path = self.path_for(key, suffix)
+        size = path.stat().st_size
+        self.total_bytes += size - self._entries.get(name, 0)
+        self._entries[name] = size
+        self._entries.move_to_end(name)
+        self._evict()
+        return path
+
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                (self.root / name[:2] / name).unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,206 @@
+"""
+Per-user live event channel: upload progress, stored files and background processing
+status, pushed to the client over Server-Sent Events (`GET /v1/events`).
+
+Events are ephemeral. `publish` hands them to the local subscribers of the user right
+away and never waits or touches the database; a subscriber that cannot keep up loses
+its oldest events. With EVENTS_REDIS_URL set (and the optional `redis` package
+installed) events are also relayed through Redis pub/sub, so a client connected to
+one worker sees the uploads and pipeline runs handled by the others.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Set
+
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - optional dependency
+    redis_asyncio = None
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 256
+REDIS_CHANNEL_PREFIX = "drivault:events:"
+
+
+class Subscription():
+    """One open event stream of a user."""
+
+    def __init__(self, max_pending: int = SUBSCRIBER_QUEUE_SIZE):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def put(self, event: dict):
+        if self._queue.full():
+            # Progress is only worth its latest value, make room by dropping the oldest
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus():
+
+    OUTBOX_SIZE = 10000
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        # Tells this worker's messages apart when they come back from Redis
+        self._origin = uuid.uuid4().hex
+        self._redis = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+
+    def publish(self, user_id: int, event_type: str, **data):
+        event = {"type": event_type, "at": time.time(), "data": jsonable_encoder(data)}
+        self._deliver(user_id, event)
+        if self._outbox is not None:
+            try:
+                self._outbox.put_nowait((user_id, event))
+            except asyncio.QueueFull:
+                logger.warning("Event relay backlog full, dropping event")
+
+
+    def _deliver(self, user_id: int, event: dict):
+        for subscription in self._subscribers.get(user_id, ()):
+            subscription.put(event)
+
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int):
+        subscription = Subscription()
+        self._subscribers[user_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._subscribers[user_id].discard(subscription)
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+
+
+    async def start(self):
+        url = os.getenv("EVENTS_REDIS_URL")
+        if not url:
+            return
+        if redis_asyncio is None:
+            logger.warning("EVENTS_REDIS_URL is set but redis is not installed, events stay local")
+            return
+        self._redis = redis_asyncio.from_url(url)
+        self._outbox = asyncio.Queue(maxsize=self.OUTBOX_SIZE)
+        self._tasks = [
+            asyncio.create_task(self._relay_out(), name="events-relay-out"),
+            asyncio.create_task(self._relay_in(), name="events-relay-in"),
+        ]
+
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._outbox = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+    async def _relay_out(self):
+        while True:
+            user_id, event = await self._outbox.get()
+            message = json.dumps({"origin": self._origin, "event": event})
+            try:
+                await self._redis.publish(f"{REDIS_CHANNEL_PREFIX}{user_id}", message)
+            except Exception:
+                logger.warning("Could not relay event through Redis", exc_info=True)
+
+
+    async def _relay_in(self):
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{REDIS_CHANNEL_PREFIX}*")
+                    async for message in pubsub.listen():
+                        if message["type"] != "pmessage":
+                            continue
+                        payload = json.loads(message["data"])
+                        if payload["origin"] == self._origin:
+                            continue
+                        channel = message["channel"]
+                        if isinstance(channel, bytes):
+                            channel = channel.decode()
+                        self._deliver(int(channel[len(REDIS_CHANNEL_PREFIX):]), payload["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Event relay subscription lost, reconnecting", exc_info=True)
+                await asyncio.sleep(1)
+
+
+events = EventBus()
+
+
+class UploadProgress():
+    """
+        Publishes `upload.progress` events for the body of an upload request as it is
+        received (fed by `UploadShapingMiddleware`), at most every `interval` seconds
+        or `step` bytes, so big uploads do not flood the channel. `received` and
+        `total` count the bytes of the whole request body, all of its files together.
+    """
+
+    def __init__(
+            self,
+            user_id: int,
+            upload_id: str,
+            total: Optional[int] = None,
+            interval: float = 0.25,
+            step: int = 8 * 1024 * 1024
+        ):
+        self.user_id = user_id
+        self.upload_id = upload_id
+        self.total = total
+        self.interval = interval
+        self.step = step
+        self.received = 0
+        self._reported = 0
+        self._reported_at = time.monotonic()
+
+    def update(self, chunk: bytes):
+        self.received += len(chunk)
+        now = time.monotonic()
+        if self.received - self._reported >= self.step or now - self._reported_at >= self.interval:
+            self.report()
+
+    def finish(self):
+        """Reports the final count unless the last update already did."""
+        if self.received != self._reported or not self.received:
+            self.report()
+
+    def report(self):
+        self._reported = self.received
+        self._reported_at = time.monotonic()
+        events.publish(
+            self.user_id,
+            "upload.progress",
+            upload_id=self.upload_id,
+            received=self.received,
+            total=self.total,
+        )
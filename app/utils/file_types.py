@@ -0,0 +1,275 @@
+"""
+Table-driven file type detection.
+
+Types are looked up by extension in a dict and by magic-byte signatures sniffed from
+the first bytes of the content, which `FileTypeSniffer` captures while the upload is
+streamed by `Util.copy_file`, so the file is never read twice.
+"""
+
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.constants import FileExtensionEnum, FileTypeEnum
+
+E = FileExtensionEnum
+
+# Enough for every signature below (ISO BMFF brands end at byte 12)
+SNIFF_SIZE = 64
+
+
+# Plain text formats: a weak signature is more likely a coincidence than a mislabelled file
+TEXT_EXTENSIONS = frozenset((E.TXT, E.CSV, E.MD, E.JSON, E.LOG))
+
+
+@dataclass(frozen=True)
+class FileTypeInfo:
+    extension: FileExtensionEnum
+    type: FileTypeEnum
+    mime_type: str
+    # Worth compressing on storage (text-like content)
+    compressible: bool = False
+
+
+@dataclass(frozen=True)
+class Signature:
+    """
+        Magic bytes at fixed offsets. When a container is shared by several formats
+        (ZIP, OLE, Matroska, ISO BMFF) `extensions` lists all of them, the first one
+        being the fallback when the file name does not tell which one it is.
+
+        Short magics that plain text can start with ("BM", "ID3", MPEG sync words) are
+        `weak`: they come with a `validate` check of the header that follows them, and
+        never override a text file extension.
+    """
+    parts: Tuple[Tuple[int, bytes], ...]
+    extensions: Tuple[FileExtensionEnum, ...]
+    validate: Optional[Callable[[bytes], bool]] = None
+    weak: bool = False
+
+    def matches(self, head: bytes) -> bool:
+        if not all(head[offset:offset + len(magic)] == magic for offset, magic in self.parts):
+            return False
+        return self.validate is None or self.validate(head)
+
+
+class FileTypeRegistry():
+
+    # Signatures are bucketed by their first two bytes at the first part's offset,
+    # so sniffing is one dict hit per distinct offset rather than a scan of the table.
+    KEY_SIZE = 2
+
+    def __init__(self):
+        self._by_extension: Dict[str, FileTypeInfo] = {}
+        self._signatures: Dict[Tuple[int, bytes], List[Signature]] = defaultdict(list)
+        self._offsets: List[int] = []
+
+
+    def register(
+            self,
+            extension: FileExtensionEnum,
+            file_type: FileTypeEnum,
+            mime_type: str,
+            compressible: bool = False
+        ):
+        self._by_extension[extension.value] = FileTypeInfo(extension, file_type, mime_type, compressible)
+
+
+    def register_signature(
+            self,
+            parts: Sequence[Tuple[int, bytes]],
+            extensions: Iterable[FileExtensionEnum],
+            validate: Optional[Callable[[bytes], bool]] = None,
+            weak: bool = False
+        ):
+        signature = Signature(tuple(parts), tuple(extensions), validate, weak)
+        offset, magic = signature.parts[0]
+        self._signatures[(offset, magic[:self.KEY_SIZE])].append(signature)
+        if offset not in self._offsets:
+            self._offsets.append(offset)
+
+
+    def from_extension(self, extension: Optional[str]) -> Optional[FileTypeInfo]:
+        if not extension:
+            return None
+        return self._by_extension.get(extension.lower())
+
+
+    def sniff(self, head: bytes) -> Optional[Signature]:
+        """Return the signature matching the first bytes of a file, if any."""
+        for offset in self._offsets:
+            key = head[offset:offset + self.KEY_SIZE]
+            for signature in self._signatures.get((offset, key), ()):
+                if signature.matches(head):
+                    return signature
+        return None
+
+
+    @staticmethod
+    def split_extension(filename: str) -> Tuple[str, str]:
+        """`("holiday.2019", "jpg")` for "holiday.2019.jpg", `("README", "")` without extension."""
+        name, extension = os.path.splitext(os.path.basename(filename or ""))
+        return name, extension[1:].lower()
+
+
+    def detect(self, filename: str, head: Optional[bytes] = None) -> Optional[FileTypeInfo]:
+        """
+            Identify a file from its content when the signature is known, otherwise
+            from its extension. A name whose extension belongs to the sniffed container
+            family (e.g. ".xlsx" for a ZIP) refines the result.
+        """
+        by_name = self.from_extension(self.split_extension(filename)[1])
+        signature = self.sniff(head) if head else None
+        if signature is None:
+            return by_name
+        if by_name is not None and by_name.extension in signature.extensions:
+            return by_name
+        if signature.weak and by_name is not None and by_name.extension in TEXT_EXTENSIONS:
+            return by_name
+        return self._by_extension[signature.extensions[0].value]
+
+
+def _is_bmp_header(head: bytes) -> bool:
+    """BITMAPFILEHEADER: file size, two reserved zero words, pixel offset, then a known DIB header size."""
+    if len(head) < 18:
+        return False
+    file_size = int.from_bytes(head[2:6], "little")
+    pixel_offset = int.from_bytes(head[10:14], "little")
+    dib_size = int.from_bytes(head[14:18], "little")
+    return (
+        head[6:10] == b"\x00\x00\x00\x00"
+        and dib_size in (12, 16, 40, 52, 56, 64, 108, 124)
+        and 14 + dib_size <= pixel_offset
+        and (file_size == 0 or pixel_offset <= file_size)
+    )
+
+
+def _is_id3_header(head: bytes) -> bool:
+    """ID3v2 tag: major version 2 to 4 and a four byte synchsafe size (7 bits per byte)."""
+    return len(head) >= 10 and head[3] in (2, 3, 4) and head[4] != 0xFF and all(b < 0x80 for b in head[6:10])
+
+
+def _is_mpeg_audio_header(head: bytes) -> bool:
+    """MPEG audio frame header: neither the free/bad bitrate index nor the reserved sample rate."""
+    if len(head) < 4:
+        return False
+    bitrate_index = head[2] >> 4
+    sample_rate_index = (head[2] >> 2) & 0x03
+    return bitrate_index not in (0x0, 0xF) and sample_rate_index != 0x03
+
+
+def _is_adts_header(head: bytes) -> bool:
+    """AAC ADTS header: valid sampling frequency index and a frame longer than its header."""
+    if len(head) < 7:
+        return False
+    sample_rate_index = (head[2] >> 2) & 0x0F
+    frame_length = ((head[3] & 0x03) << 11) | (head[4] << 3) | (head[5] >> 5)
+    return sample_rate_index < 13 and frame_length >= 7
+
+
+class FileTypeSniffer():
+    """Copy observer keeping the first `SNIFF_SIZE` bytes of the stream."""
+
+    def __init__(self, size: int = SNIFF_SIZE):
+        self.size = size
+        self.head = b""
+
+    def update(self, chunk: bytes):
+        if len(self.head) < self.size:
+            self.head += bytes(chunk[:self.size - len(self.head)])
+
+
+file_types = FileTypeRegistry()
+
+for extension, file_type, mime_type, compressible in (
+    (E.JPG, FileTypeEnum.IMAGE, "image/jpeg", False),
+    (E.JPEG, FileTypeEnum.IMAGE, "image/jpeg", False),
+    (E.PNG, FileTypeEnum.IMAGE, "image/png", False),
+    (E.WEBP, FileTypeEnum.IMAGE, "image/webp", False),
+    (E.HEIC, FileTypeEnum.IMAGE, "image/heic", False),
+    (E.HEIF, FileTypeEnum.IMAGE, "image/heif", False),
+    (E.AVIF, FileTypeEnum.IMAGE, "image/avif", False),
+    (E.BMP, FileTypeEnum.IMAGE, "image/bmp", True),
+    (E.TIFF, FileTypeEnum.IMAGE, "image/tiff", False),
+    (E.TIF, FileTypeEnum.IMAGE, "image/tiff", False),
+    (E.GIF, FileTypeEnum.GIF, "image/gif", False),
+    (E.MKV, FileTypeEnum.VIDEO, "video/x-matroska", False),
+    (E.MP4, FileTypeEnum.VIDEO, "video/mp4", False),
+    (E.MOV, FileTypeEnum.VIDEO, "video/quicktime", False),
+    (E.M4V, FileTypeEnum.VIDEO, "video/x-m4v", False),
+    (E.AVI, FileTypeEnum.VIDEO, "video/x-msvideo", False),
+    (E.WEBM, FileTypeEnum.VIDEO, "video/webm", False),
+    (E.THREE_GP, FileTypeEnum.VIDEO, "video/3gpp", False),
+    (E.MP3, FileTypeEnum.AUDIO, "audio/mpeg", False),
+    (E.M4A, FileTypeEnum.AUDIO, "audio/mp4", False),
+    (E.AAC, FileTypeEnum.AUDIO, "audio/aac", False),
+    (E.WAV, FileTypeEnum.AUDIO, "audio/wav", True),
+    (E.FLAC, FileTypeEnum.AUDIO, "audio/flac", False),
+    (E.OGG, FileTypeEnum.AUDIO, "audio/ogg", False),
+    (E.PDF, FileTypeEnum.DOCUMENT, "application/pdf", True),
+    (E.DOC, FileTypeEnum.DOCUMENT, "application/msword", True),
+    (E.DOCX, FileTypeEnum.DOCUMENT, "application/vnd.openxmlformats-officedocument.wordprocessingml.document", False),
+    (E.PPT, FileTypeEnum.DOCUMENT, "application/vnd.ms-powerpoint", True),
+    (E.PPTX, FileTypeEnum.DOCUMENT, "application/vnd.openxmlformats-officedocument.presentationml.presentation", False),
+    (E.XLS, FileTypeEnum.DOCUMENT, "application/vnd.ms-excel", True),
+    (E.XLSX, FileTypeEnum.DOCUMENT, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", False),
+    (E.ODT, FileTypeEnum.DOCUMENT, "application/vnd.oasis.opendocument.text", False),
+    (E.RTF, FileTypeEnum.DOCUMENT, "application/rtf", True),
+    (E.TXT, FileTypeEnum.OTHERS, "text/plain", True),
+    (E.CSV, FileTypeEnum.OTHERS, "text/csv", True),
+    (E.MD, FileTypeEnum.OTHERS, "text/markdown", True),
+    (E.JSON, FileTypeEnum.OTHERS, "application/json", True),
+    (E.LOG, FileTypeEnum.OTHERS, "text/plain", True),
+    (E.ZIP, FileTypeEnum.OTHERS, "application/zip", False),
+):
+    file_types.register(extension, file_type, mime_type, compressible)
+
+for parts, extensions in (
+    (((0, b"\xff\xd8\xff"),), (E.JPG, E.JPEG)),
+    (((0, b"\x89PNG\r\n\x1a\n"),), (E.PNG,)),
+    (((0, b"GIF87a"),), (E.GIF,)),
+    (((0, b"GIF89a"),), (E.GIF,)),
+    (((0, b"RIFF"), (8, b"WEBP")), (E.WEBP,)),
+    (((0, b"RIFF"), (8, b"WAVE")), (E.WAV,)),
+    (((0, b"RIFF"), (8, b"AVI ")), (E.AVI,)),
+    (((0, b"II*\x00"),), (E.TIFF, E.TIF)),
+    (((0, b"MM\x00*"),), (E.TIFF, E.TIF)),
+    # ISO base media file format: the major brand follows the "ftyp" box type
+    (((4, b"ftypheic"),), (E.HEIC, E.HEIF)),
+    (((4, b"ftypheix"),), (E.HEIC, E.HEIF)),
+    (((4, b"ftyphevc"),), (E.HEIC, E.HEIF)),
+    (((4, b"ftypmif1"),), (E.HEIF, E.HEIC, E.AVIF)),
+    (((4, b"ftypmsf1"),), (E.HEIF, E.HEIC)),
+    (((4, b"ftypavif"),), (E.AVIF,)),
+    (((4, b"ftypavis"),), (E.AVIF,)),
+    (((4, b"ftypqt  "),), (E.MOV,)),
+    (((4, b"ftypM4A "),), (E.M4A,)),
+    (((4, b"ftypM4V "),), (E.M4V, E.MP4)),
+    (((4, b"ftyp3gp"),), (E.THREE_GP,)),
+    (((4, b"ftypisom"),), (E.MP4, E.M4V, E.M4A, E.MOV)),
+    (((4, b"ftypiso2"),), (E.MP4, E.M4V, E.M4A, E.MOV)),
+    (((4, b"ftypmp41"),), (E.MP4, E.M4V, E.M4A, E.MOV)),
+    (((4, b"ftypmp42"),), (E.MP4, E.M4V, E.M4A, E.MOV)),
+    (((4, b"ftypavc1"),), (E.MP4, E.M4V, E.MOV)),
+    (((0, b"\x1a\x45\xdf\xa3"),), (E.MKV, E.WEBM)),
+    (((0, b"fLaC"),), (E.FLAC,)),
+    (((0, b"OggS"),), (E.OGG,)),
+    (((0, b"%PDF-"),), (E.PDF,)),
+    (((0, b"{\\rtf"),), (E.RTF,)),
+    # Legacy MS Office (OLE compound file) and ZIP based formats
+    (((0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),), (E.DOC, E.XLS, E.PPT)),
+    (((0, b"PK\x03\x04"),), (E.ZIP, E.DOCX, E.PPTX, E.XLSX, E.ODT)),
+):
+    file_types.register_signature(parts, extensions)
+
+for parts, extensions, validate in (
+    (((0, b"BM"),), (E.BMP,), _is_bmp_header),
+    (((0, b"ID3"),), (E.MP3,), _is_id3_header),
+    (((0, b"\xff\xfb"),), (E.MP3,), _is_mpeg_audio_header),
+    (((0, b"\xff\xf3"),), (E.MP3,), _is_mpeg_audio_header),
+    (((0, b"\xff\xf2"),), (E.MP3,), _is_mpeg_audio_header),
+    (((0, b"\xff\xf1"),), (E.AAC,), _is_adts_header),
+    (((0, b"\xff\xf9"),), (E.AAC,), _is_adts_header),
+):
+    file_types.register_signature(parts, extensions, validate=validate, weak=True)
@@ -0,0 +1,123 @@
+"""
+Image processing helpers. They run in worker processes (see `app.utils.workers`),
+so they only take and return plain, picklable values.
+
+Pillow is an optional dependency (`pip install drivault[media]`); HEIC/HEIF sources
+additionally need `pillow-heif`.
+"""
+
+import io
+import os
+from typing import Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:  # pragma: no cover - optional dependency
+    pass
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+PILLOW_AVAILABLE = Image is not None
+
+# Output format -> (Pillow format name, file suffix, mime type)
+IMAGE_FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp"),
+    "avif": ("AVIF", "avif", "image/avif"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "png": ("PNG", "png", "image/png"),
+}
+
+
+def _supported_formats() -> frozenset:
+    """Output formats this Pillow build can both read and write (AVIF needs Pillow >= 11.2 with libavif)."""
+    if Image is None:
+        return frozenset()
+    Image.init()
+    return frozenset(
+        fmt for fmt, (pillow_format, _, _) in IMAGE_FORMATS.items()
+        if pillow_format in Image.SAVE and pillow_format in Image.OPEN
+    )
+
+
+SUPPORTED_FORMATS = _supported_formats()
+
+
+def _read_source(path: str, metadata: Optional[dict]):
+    """File object with the original bytes, inflating zstd-compressed blobs."""
+    if metadata and metadata.get("codec") == "zstd":
+        with open(path, "rb") as blob:
+            reader = zstandard.ZstdDecompressor().stream_reader(blob, read_across_frames=True)
+            return io.BytesIO(reader.read())
+    return open(path, "rb")
+
+
+def open_image(path: str, metadata: Optional[dict] = None):
+    with _read_source(path, metadata) as source:
+        image = Image.open(source)
+        image.load()
+    # Phones store the orientation in EXIF instead of rotating the pixels
+    return ImageOps.exif_transpose(image)
+
+
+def resize_image(
+        source_path: str,
+        metadata: Optional[dict],
+        destination: str,
+        width: Optional[int],
+        height: Optional[int],
+        fmt: str,
+        quality: int
+    ) -> int:
+    """
+    Fit the image in width x height (keeping its aspect ratio, never upscaling) and
+    encode it as `fmt`. The result is written atomically.
+
+    Returns:
+        int: Size in bytes of the written file
+    """
+    image = open_image(source_path, metadata)
+    if width or height:
+        image.thumbnail((width or image.width, height or image.height), Image.LANCZOS)
+
+    pillow_format = IMAGE_FORMATS[fmt][0]
+    if pillow_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    # Dot-prefixed so a crash never leaves a half-written file the cache would index
+    directory, name = os.path.split(destination)
+    temporary = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    image.save(temporary, format=pillow_format, quality=quality)
+    os.replace(temporary, destination)
+    return os.path.getsize(destination)
+
+
+def dhash_pixels(pixels: bytes, width: int = 9, height: int = 8) -> int:
+    """
+    Difference hash of a `width` x `height` grayscale bitmap: one bit per pair of
+    horizontally adjacent pixels, set when the left one is brighter. 9 x 8 pixels
+    give a 64-bit hash that survives resizing and re-compression.
+    """
+    value = 0
+    for row in range(height):
+        offset = row * width
+        for column in range(width - 1):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def dhash_image(path: str, metadata: Optional[dict] = None) -> int:
+    image = open_image(path, metadata).convert("L").resize((9, 8), Image.LANCZOS)
+    return dhash_pixels(image.tobytes())
@@ -0,0 +1,139 @@
+"""
+Blocking building blocks of the integrity scrubber. They run on the scrubber's own
+low-priority thread, never on the event loop.
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from app.constants import IntegrityIssueKind
+from app.utils.compression import is_compressed, open_decompressed
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def lower_thread_priority():
+    """
+        Thread initializer giving the calling thread the lowest CPU priority. On Linux
+        `setpriority` applies to a single thread when given its id, and the I/O
+        scheduler derives the thread's best-effort I/O priority from its nice value,
+        so the scrubber yields to request handling on both.
+    """
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        logger.debug("Could not lower the scrubber thread priority")
+
+
+class IOBudget():
+    """Token bucket pacing blocking reads to `rate` bytes per second (0 for unlimited)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # At most one second worth of burst
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= size
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class _BudgetedReader():
+    """Raw file wrapper charging every read against the budget, before decompression."""
+
+    def __init__(self, raw: BinaryIO, budget: IOBudget):
+        self.raw = raw
+        self.budget = budget
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.budget.consume(len(data))
+        return data
+
+
+def verify_blob(
+        path: str,
+        metadata: Optional[dict],
+        budget: IOBudget
+    ) -> Tuple[Optional[IntegrityIssueKind], Optional[str], Optional[str]]:
+    """
+    Re-read a stored blob and hash its original content.
+
+    Returns:
+        tuple: (issue, checksum, detail). `issue` is None when the blob could be read
+        entirely; comparing `checksum` with the expected one is up to the caller.
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as raw:
+            source = _BudgetedReader(raw, budget)
+            if is_compressed(metadata):
+                source = open_decompressed(source)
+            while chunk := source.read(CHUNK_SIZE):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return IntegrityIssueKind.MISSING, None, None
+    except Exception as e:
+        # Unreadable sectors, truncated or mangled zstd frames, ...
+        return IntegrityIssueKind.CORRUPTED, None, f"{type(e).__name__}: {e}"
+    return None, digest.hexdigest(), None
+
+
+def storage_root_spellings(root: str) -> List[str]:
+    """
+        The ways stored `file_path`s may spell the storage root: the canonical path
+        first, then as uploads (`Path.absolute`) and the import command (`abspath`)
+        build it from FILE_STORAGE_PATH.
+    """
+    spellings = [os.path.realpath(root), str(Path(root).absolute()), os.path.abspath(root)]
+    return list(dict.fromkeys(spellings))
+
+
+def iter_stored_files(root: str, older_than: float, batch_size: int = 1000) -> Iterator[List[str]]:
+    """
+        Paths of the blobs under `root`, relative to it, in batches, walking one
+        directory entry at a time so memory stays flat however many files there are.
+        Hidden entries (derivative cache, import checkpoints, ...) are skipped, as are
+        files modified after `older_than`, which may belong to an upload still in flight.
+    """
+    root = os.path.realpath(root)
+    batch = []
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < older_than:
+                        batch.append(os.path.relpath(entry.path, root))
+                except OSError:
+                    continue
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
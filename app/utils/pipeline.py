@@ -0,0 +1,111 @@
+"""
+In-process background pipeline for work that follows an upload (hashing, thumbnails,
+text extraction, ...). Uploads only enqueue the file id; stages run on worker tasks
+started with the application, so requests never wait for them.
+"""
+
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from app.models import FileModel
+from app.utils.events import events
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", 2))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 10000))
+
+
+@dataclass
+class PipelineStage:
+    name: str
+    # Whether the stage applies to the file (usually a check on its type)
+    accepts: Callable[[FileModel], bool]
+    handler: Callable[[FileModel], Awaitable[None]]
+
+
+class ProcessingPipeline():
+
+    def __init__(self, workers: int = PIPELINE_WORKERS, queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.stages: List[PipelineStage] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+
+    def register(self, name: str, accepts: Callable[[FileModel], bool]):
+        """Decorator registering an async `handler(file)` as a stage; stages run in order."""
+        def decorator(handler):
+            self.stages.append(PipelineStage(name, accepts, handler))
+            return handler
+        return decorator
+
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"pipeline-worker-{index}")
+            for index in range(self.workers)
+        ]
+
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+    async def submit(self, file_ids: Iterable[int]):
+        """Queue files for processing; waits when the queue is full (backpressure)."""
+        if not self.running:
+            return
+        for file_id in file_ids:
+            await self._queue.put(file_id)
+
+
+    async def _worker(self):
+        while True:
+            file_id = await self._queue.get()
+            try:
+                await self.process(file_id)
+            except Exception:
+                logger.exception(f"Pipeline failed for file {file_id}")
+            finally:
+                self._queue.task_done()
+
+
+    async def process(self, file_id: int):
+        file = await FileModel.filter(id=file_id, is_deleted=False).first()
+        if file is None:
+            return
+        for stage in self.stages:
+            if not stage.accepts(file):
+                continue
+            try:
+                await stage.handler(file)
+                status = "done"
+            except Exception:
+                # One failing stage must not prevent the next ones
+                logger.exception(f"Pipeline stage {stage.name} failed for file {file_id}")
+                status = "failed"
+            events.publish(
+                file.owner_id, "processing.stage", file_id=file_id, stage=stage.name, status=status
+            )
+        events.publish(file.owner_id, "processing.done", file_id=file_id)
+
+
+pipeline = ProcessingPipeline()
@@ -0,0 +1,377 @@
+"""
+Token-bucket rate limiting of requests and bandwidth shaping of transfers.
+
+Request limits are keyed by user and route and configured per `UserRoleType`.
+Byte rates are shaped per user on the upload request body (`UploadShapingMiddleware`,
+as it is received from the socket; it also reports the upload's progress) and the
+download stream: every user gets their role's rate, capped by a fair share of the
+server link (BANDWIDTH_TOTAL_MBPS / users currently transferring), so one user's
+backup storm cannot starve everyone else and small interactive requests keep a free
+path.
+
+Buckets live in process memory, or in Redis (RATE_LIMIT_REDIS_URL, needs the optional
+`redis` package) when several workers must share them.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+from fastapi import Depends
+from fastapi.exceptions import HTTPException
+
+from app.constants import UserRoleType
+from app.exceptions import RateLimitExceededException
+from app.models import UserModel
+from app.utils.events import UploadProgress
+from app.utils.security import decode_token, get_current_user, get_user_by_email
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - optional dependency
+    redis_asyncio = None
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def _env_rate(name: str, default: Tuple[float, float]) -> Tuple[float, float]:
+    """Read a "rate/burst" pair (requests per second / bucket size) from the environment."""
+    value = os.getenv(name)
+    if not value:
+        return default
+    rate, _, burst = value.partition("/")
+    return float(rate), float(burst or rate)
+
+
+@dataclass
+class RoleLimits:
+    # route -> (requests per second, burst)
+    requests: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    # bytes per second for uploads and downloads, 0 for unlimited
+    bandwidth: float = 0
+
+    def for_route(self, route: str) -> Tuple[float, float]:
+        return self.requests.get(route, self.requests["default"])
+
+
+def _role_limits(role: UserRoleType, defaults: Dict[str, Tuple[float, float]], bandwidth_mbps: float) -> RoleLimits:
+    prefix = f"RATE_LIMIT_{role.name}"
+    return RoleLimits(
+        requests={
+            route: _env_rate(f"{prefix}_{route.upper()}", default)
+            for route, default in defaults.items()
+        },
+        bandwidth=float(os.getenv(f"BANDWIDTH_{role.name}_MBPS", bandwidth_mbps)) * MB,
+    )
+
+
+ROLE_LIMITS: Dict[UserRoleType, RoleLimits] = {
+    UserRoleType.STANDARD: _role_limits(
+        UserRoleType.STANDARD,
+        {
+            "default": (20, 60),
+            "list": (10, 30),
+            "upload": (2, 20),
+            "download": (10, 40),
+            "image": (30, 120),
+            "sync": (5, 20),
+        },
+        bandwidth_mbps=20,
+    ),
+    UserRoleType.ADMIN: _role_limits(
+        UserRoleType.ADMIN,
+        {
+            "default": (50, 150),
+            "list": (20, 60),
+            "upload": (5, 50),
+            "download": (20, 80),
+            "image": (60, 240),
+            "sync": (10, 40),
+        },
+        bandwidth_mbps=0,
+    ),
+}
+
+BANDWIDTH_TOTAL = float(os.getenv("BANDWIDTH_TOTAL_MBPS", 0)) * MB
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT", "on").lower() not in ("0", "off", "false", "no")
+
+
+class MemoryRateLimitStore():
+    """
+        Token buckets in process memory: exact for a single worker. A bucket that
+        has refilled completely is no different from a missing one, so buckets are
+        dropped once full, in a sweep every PRUNE_EVERY_SECONDS; memory follows the
+        users and clients active recently instead of every key ever seen.
+    """
+
+    PRUNE_EVERY_SECONDS = 60
+
+    def __init__(self):
+        # key -> [tokens, last refill time, time the bucket is full again]
+        self._buckets: Dict[str, list] = {}
+        self._pruned_at = time.monotonic()
+
+    def _prune(self, now: float):
+        self._pruned_at = now
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+
+    async def acquire(self, key: str, rate: float, capacity: float, amount: float, reserve: bool) -> float:
+        """
+        Take `amount` tokens. Returns 0 when granted, otherwise the seconds until they
+        would be. With `reserve` the tokens are taken anyway (the bucket goes into
+        debt) and the caller is expected to wait the returned time.
+        """
+        now = time.monotonic()
+        if now - self._pruned_at >= self.PRUNE_EVERY_SECONDS:
+            self._prune(now)
+        tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+
+        wait = 0.0
+        if tokens >= amount:
+            tokens -= amount
+        else:
+            wait = (amount - tokens) / rate
+            if reserve:
+                tokens -= amount
+        self._buckets[key] = [tokens, now, now + (capacity - tokens) / rate]
+        return wait
+
+
+class RedisRateLimitStore():
+    """Token buckets shared by every worker, updated atomically by a Lua script."""
+
+    SCRIPT = """
+        local rate = tonumber(ARGV[1])
+        local capacity = tonumber(ARGV[2])
+        local amount = tonumber(ARGV[3])
+        local reserve = tonumber(ARGV[4])
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or capacity
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + (now - updated) * rate)
+
+        local wait = 0
+        if tokens >= amount then
+            tokens = tokens - amount
+        else
+            wait = (amount - tokens) / rate
+            if reserve == 1 then
+                tokens = tokens - amount
+            end
+        end
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+        redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 60000)
+        return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        self._redis = redis_asyncio.from_url(url)
+        self._script = self._redis.register_script(self.SCRIPT)
+
+    async def acquire(self, key: str, rate: float, capacity: float, amount: float, reserve: bool) -> float:
+        wait = await self._script(
+            keys=[f"drivault:rate:{key}"],
+            args=[rate, capacity, amount, int(reserve)],
+        )
+        return float(wait)
+
+
+def _create_store():
+    url = os.getenv("RATE_LIMIT_REDIS_URL")
+    if url:
+        if redis_asyncio is None:
+            logger.warning("RATE_LIMIT_REDIS_URL is set but redis is not installed, using memory store")
+        else:
+            return RedisRateLimitStore(url)
+    return MemoryRateLimitStore()
+
+
+store = _create_store()
+
+
+def limits_for(user: UserModel) -> RoleLimits:
+    return ROLE_LIMITS.get(UserRoleType(user.role), ROLE_LIMITS[UserRoleType.STANDARD])
+
+
+def rate_limit(route: str = "default"):
+    """
+        Dependency limiting the requests per second of the current user on `route`:
+
+            @file.get("/list/all", dependencies=[Depends(rate_limit("list"))])
+    """
+    async def dependency(user: UserModel = Depends(get_current_user)):
+        if not RATE_LIMIT_ENABLED:
+            return
+        rate, burst = limits_for(user).for_route(route)
+        wait = await store.acquire(f"{user.id}:{route}", rate, burst, 1, reserve=False)
+        if wait > 0:
+            raise RateLimitExceededException(retry_after=wait)
+    return dependency
+
+
+class BandwidthShaper():
+    """Paces the bytes of all running transfers of every user."""
+
+    # Bytes are taken in slices so a large chunk does not hold the bucket for long
+    SLICE = 256 * 1024
+
+    def __init__(self, total: float = BANDWIDTH_TOTAL):
+        self.total = total
+        self._active: Dict[int, int] = defaultdict(int)
+
+    def rate_for(self, user: UserModel) -> float:
+        """Role rate, capped by the user's fair share of the link; 0 means unlimited."""
+        rate = limits_for(user).bandwidth
+        if self.total and self._active:
+            share = self.total / len(self._active)
+            rate = min(rate, share) if rate else share
+        return rate
+
+    def for_user(self, user: UserModel) -> "UserBandwidth":
+        return UserBandwidth(self, user)
+
+    @asynccontextmanager
+    async def transfer(self, user: UserModel):
+        """Marks the user as transferring for the fair share computation."""
+        self._active[user.id] += 1
+        try:
+            yield UserBandwidth(self, user)
+        finally:
+            self._active[user.id] -= 1
+            if not self._active[user.id]:
+                del self._active[user.id]
+
+    async def throttle(self, user: UserModel, size: int):
+        if not RATE_LIMIT_ENABLED:
+            return
+        rate = self.rate_for(user)
+        if not rate:
+            return
+        # One second worth of burst, never less than a slice
+        capacity = max(rate, self.SLICE)
+        while size > 0:
+            amount = min(size, self.SLICE)
+            wait = await store.acquire(f"{user.id}:bytes", rate, capacity, amount, reserve=True)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            size -= amount
+
+
+class UserBandwidth():
+    """Handle passed to the copy and download loops for one transfer."""
+
+    def __init__(self, shaper: BandwidthShaper, user: UserModel):
+        self.shaper = shaper
+        self.user = user
+
+    async def throttle(self, size: int):
+        await self.shaper.throttle(self.user, size)
+
+    async def wrap(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Pace an async stream of chunks; the transfer stays active until it ends."""
+        async with self.shaper.transfer(self.user):
+            async for chunk in chunks:
+                await self.throttle(len(chunk))
+                yield chunk
+
+
+shaper = BandwidthShaper()
+
+
+class UploadShapingMiddleware():
+    """
+        ASGI middleware watching the request body of uploads while it is received.
+        FastAPI reads and spools the whole multipart body before the route runs, so
+        anything done in the route only sees the copy to storage, after the client
+        has already sent everything. Here, chunk by chunk:
+
+        - the body is paced: the next chunk is not read from the socket until the
+          user's bucket allows it, and TCP flow control slows the client down;
+        - with an `upload_id` in the query string, `upload.progress` events report
+          the bytes received so far against the request's Content-Length.
+
+        The user comes from the bearer token, requests without a valid one pass
+        through and are refused by the route.
+    """
+
+    def __init__(self, app, paths: Tuple[str, ...] = ("/v1/files/upload",)):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        upload_id = self._upload_id(scope)
+        if not RATE_LIMIT_ENABLED and upload_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        user = await self._user(scope)
+        if user is None:
+            await self.app(scope, receive, send)
+            return
+
+        progress = None
+        if upload_id is not None:
+            progress = UploadProgress(user.id, upload_id, self._content_length(scope))
+
+        async with shaper.transfer(user) as bandwidth:
+            async def shaped_receive():
+                message = await receive()
+                if message["type"] != "http.request":
+                    return message
+                body = message.get("body", b"")
+                if body:
+                    await bandwidth.throttle(len(body))
+                if progress is not None:
+                    progress.update(body)
+                    if not message.get("more_body", False):
+                        progress.finish()
+                return message
+
+            await self.app(scope, shaped_receive, send)
+
+    @staticmethod
+    def _upload_id(scope) -> Optional[str]:
+        values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("upload_id")
+        # Longer ids are refused by the route, do not report progress for them either
+        if not values or len(values[0]) > 64:
+            return None
+        return values[0]
+
+    @staticmethod
+    def _content_length(scope) -> Optional[int]:
+        value = dict(scope["headers"]).get(b"content-length")
+        if value is None or not value.isdigit():
+            return None
+        return int(value)
+
+    @staticmethod
+    async def _user(scope) -> Optional[UserModel]:
+        authorization = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+        scheme, _, credentials = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not credentials:
+            return None
+        try:
+            payload = decode_token(credentials)
+        except HTTPException:
+            return None
+        return await get_user_by_email(payload["email"])
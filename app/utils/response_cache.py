@@ -0,0 +1,164 @@
+"""
+Conditional requests and response caching for the metadata listings.
+
+Every mutation of a user's library bumps `UserModel.library_version` in the same
+transaction as its journal entry (see `SyncManager.record_changes`). Listings derive a
+weak ETag from it, and since the user row is already loaded to authenticate the
+request, an `If-None-Match` revalidation is answered with 304 without any query.
+
+Rendered listings are also kept in a small cache keyed by the version, so a changed
+version simply stops hitting the old entries and nothing has to be invalidated. For
+that to hold, a listing may only show what a library mutation changes: internal
+bookkeeping that background jobs update on their own (the blob's path on disk, the
+last integrity verification) is left out of the listed files. The
+cache lives in process memory (RESPONSE_CACHE_MB), or in Redis when
+RESPONSE_CACHE_REDIS_URL is set and the optional `redis` package is installed.
+"""
+
+import os
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.models import FileModel, UserModel
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - optional dependency
+    redis_asyncio = None
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_MAX_BYTES = int(float(os.getenv("RESPONSE_CACHE_MB", 64)) * 1024 * 1024)
+# Entries of old versions are never read again, Redis only needs to expire them
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 3600))
+
+# Listings may be stored by the client but must be revalidated on every use
+LISTING_CACHE_CONTROL = "private, no-cache"
+# `FileModel` fields left out of listings, they change without a new library version
+UNLISTED_FILE_FIELDS = ("file_path", "verified_at")
+
+
+def _listed_file(file: FileModel) -> dict:
+    listed = jsonable_encoder(file)
+    for field in UNLISTED_FILE_FIELDS:
+        listed.pop(field, None)
+    return listed
+
+
+def library_etag(user: UserModel, resource: str) -> str:
+    return f'W/"{user.id}.{user.library_version}.{resource}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as required for `If-None-Match`."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+class MemoryResponseCache():
+    """Byte-capped LRU of rendered bodies, private to the worker."""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    async def set(self, key: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.total_bytes -= len(previous)
+        self._entries[key] = body
+        self.total_bytes += len(body)
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+
+class RedisResponseCache():
+    """Rendered bodies shared by every worker."""
+
+    def __init__(self, url: str, ttl: int = RESPONSE_CACHE_TTL_SECONDS):
+        self._redis = redis_asyncio.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            return await self._redis.get(f"drivault:response:{key}")
+        except Exception:
+            # The cache is an optimization, an unreachable Redis must not fail requests
+            logger.warning("Response cache unavailable", exc_info=True)
+            return None
+
+    async def set(self, key: str, body: bytes):
+        try:
+            await self._redis.set(f"drivault:response:{key}", body, ex=self.ttl)
+        except Exception:
+            logger.warning("Response cache unavailable", exc_info=True)
+
+
+def _create_cache():
+    url = os.getenv("RESPONSE_CACHE_REDIS_URL")
+    if url:
+        if redis_asyncio is None:
+            logger.warning("RESPONSE_CACHE_REDIS_URL is set but redis is not installed, using memory cache")
+        else:
+            return RedisResponseCache(url)
+    if not RESPONSE_CACHE_MAX_BYTES:
+        return None
+    return MemoryResponseCache()
+
+
+response_cache = _create_cache()
+
+
+async def cached_listing(
+        user: UserModel,
+        resource: str,
+        if_none_match: Optional[str],
+        producer: Callable[[], Awaitable[Any]]
+    ) -> Response:
+    """
+    Answer a listing request for the current version of the user's library.
+
+    Args:
+        user: The authenticated user, whose `library_version` identifies the content
+        resource: Name of the listing, unique per URL (e.g. "files", "folder-12")
+        if_none_match: Value of the request's `If-None-Match` header
+        producer: Coroutine function computing the listing when it is not cached
+    """
+    etag = library_etag(user, resource)
+    headers = {"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    key = f"{user.id}:{user.library_version}:{resource}"
+    body = await response_cache.get(key) if response_cache is not None else None
+    if body is None:
+        # Rendered like FastAPI renders a returned object
+        body = JSONResponse(
+            jsonable_encoder(await producer(), custom_encoder={FileModel: _listed_file})
+        ).body
+        if response_cache is not None:
+            await response_cache.set(key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
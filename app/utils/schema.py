@@ -0,0 +1,86 @@
+"""
+Additive upgrades of existing databases.
+
+`Tortoise.generate_schemas` creates the tables that are missing but never alters one
+that already exists, so a column added to a model after its table was created would
+be missing on every existing deployment. `upgrade_schema` runs at startup right after
+it and adds those columns (and their indexes). It only ever adds, and a column that is
+already there is left alone, so it is safe to run on every start and on fresh
+databases.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import List, Type
+
+from tortoise import Tortoise
+from tortoise.models import Model
+
+from app.models import FileModel, RefreshTokenModel, UserModel
+
+logger = logging.getLogger(__name__)
+
+# Column types that differ between the supported databases
+TYPES = {
+    "postgres": {"timestamp": "TIMESTAMPTZ"},
+    "sqlite": {"timestamp": "TIMESTAMP"},
+}
+
+
+@dataclass(frozen=True)
+class AddedColumn:
+    model: Type[Model]
+    column: str
+    # SQL after the column name; `{timestamp}` stands for the dialect's type
+    definition: str
+    index: bool = False
+
+
+ADDED_COLUMNS: List[AddedColumn] = [
+    AddedColumn(FileModel, "folder_id", 'BIGINT REFERENCES "folders" ("id") ON DELETE SET NULL'),
+    AddedColumn(FileModel, "folder_path", "VARCHAR(1020) NOT NULL DEFAULT ''", index=True),
+    # Files stored before checksums existed are hashed by the first scrub pass
+    AddedColumn(FileModel, "checksum", "VARCHAR(64)"),
+    AddedColumn(FileModel, "verified_at", "{timestamp}"),
+    AddedColumn(UserModel, "library_version", "BIGINT NOT NULL DEFAULT 0"),
+    # Only the index is new: logout looks the session up by its access token
+    AddedColumn(RefreshTokenModel, "access_jti", "VARCHAR(32) NOT NULL", index=True),
+]
+
+
+async def _existing_columns(connection, dialect: str, table: str) -> set:
+    if dialect == "postgres":
+        rows = await connection.execute_query_dict(
+            "SELECT column_name AS name FROM information_schema.columns"
+            " WHERE table_schema = current_schema() AND table_name = $1",
+            [table],
+        )
+    else:
+        rows = await connection.execute_query_dict(f'PRAGMA table_info("{table}")')
+    return {row["name"] for row in rows}
+
+
+async def upgrade_schema():
+    connection = Tortoise.get_connection("default")
+    dialect = connection.capabilities.dialect
+    if dialect not in TYPES:
+        logger.warning(f"Schema upgrades are not supported on {dialect}, new columns must be added by hand")
+        return
+    generator = connection.schema_generator(connection)
+
+    columns = {}
+    for added in ADDED_COLUMNS:
+        table = added.model._meta.db_table
+        if table not in columns:
+            columns[table] = await _existing_columns(connection, dialect, table)
+        if added.column not in columns[table]:
+            definition = added.definition.format(**TYPES[dialect])
+            await connection.execute_script(f'ALTER TABLE "{table}" ADD COLUMN "{added.column}" {definition}')
+            columns[table].add(added.column)
+            logger.info(f"Added column {table}.{added.column}")
+        if added.index:
+            # Named like the index `generate_schemas` creates, so fresh databases do not get two
+            name = generator._get_index_name("idx", added.model, [added.column])
+            await connection.execute_script(
+                f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ("{added.column}")'
+            )
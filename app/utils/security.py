@@ -1,4 +1,5 @@
 import os
+import uuid
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from jose import jwt, JWTError
@@ -7,7 +8,10 @@ from fastapi import Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.exceptions import HTTPException
 
+from app.constants import UserRoleType
+from app.exceptions import PermissionDeniedException
 from app.models import UserModel
+from app.utils.denylist import denylist
 
 load_dotenv()
 
@@ -26,38 +30,61 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password) 
 
 
-def create_access_token(data: dict, expires_delta: timedelta = EXPIRE_IN_MINUTE*60):
-    print(type(EXPIRE_IN_MINUTE))
+def create_access_token(
+        data: dict,
+        expires_delta: int = EXPIRE_IN_MINUTE,
+        expires_at: datetime = None
+    ):
     to_encode = data.copy()
 
-    expire = (
+    expire = expires_at or (
         datetime.now(timezone.utc) + timedelta(minutes=expires_delta)
     )
 
+    # Unique id of the token, so it can be revoked before it expires
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     to_encode.update({"exp":expire})
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-async def get_current_user(
-        creds: HTTPAuthorizationCredentials = Depends(oauth_scheme)
-    ):
-    credential_exp = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Please provide correct credentials.",
         headers={"WWW-Authenticate":"Bearer"},
     )
+
+
+def decode_token(credentials: str) -> dict:
+    """Verified claims of bearer credentials; revoked tokens are refused from memory."""
+    credential_exp = _credentials_exception()
     try:
-        token = creds.credentials.split(" ")[1]
+        token = credentials.split(" ")[1]
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
-        print(payload)
         email = payload.get("email")
         if email is None:
             raise credential_exp
-    except JWTError:
+    except (JWTError, IndexError):
         raise credential_exp
-    
-    user = await get_user_by_email(email)
+
+    if denylist.is_revoked(payload.get("jti")):
+        raise credential_exp
+    return payload
+
+
+async def get_token_claims(
+        creds: HTTPAuthorizationCredentials = Depends(oauth_scheme)
+    ):
+    """Verified claims of the bearer token."""
+    payload = decode_token(creds.credentials)
+    print(payload)
+    return payload
+
+
+async def get_current_user(payload: dict = Depends(get_token_claims)):
+    credential_exp = _credentials_exception()
+    user = await get_user_by_email(payload["email"])
     print(user)
     if user is None:
         raise credential_exp
@@ -65,4 +92,10 @@ async def get_current_user(
 
 async def get_user_by_email(email):
     user = await UserModel.filter(email=email).first()
-    return user
\ No newline at end of file
+    return user
+
+
+async def get_current_admin(user: UserModel = Depends(get_current_user)):
+    if user.role != UserRoleType.ADMIN:
+        raise PermissionDeniedException("Only administrators can access this resource")
+    return user
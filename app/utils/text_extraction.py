@@ -0,0 +1,246 @@
+"""
+Plain-text extraction from documents, for the full-text search index. It runs in
+worker processes (see `app.utils.workers`), so it only takes and returns plain,
+picklable values.
+
+Office Open XML (docx, pptx, xlsx) and OpenDocument files are zip archives of XML and
+are read with the standard library. PDFs need the optional `pypdf` package
+(`pip install drivault[documents]`). Legacy binary Office formats are converted by
+external tools when they are installed: `antiword` (or `catdoc`) for doc, `catppt` for
+ppt and `xls2csv` for xls, all from the usual distribution packages. Without them these
+formats are not extractable, and the search stage records such files as unsupported.
+"""
+
+import io
+import re
+import shutil
+import subprocess
+import tempfile
+import zipfile
+from typing import Callable, Dict, Iterator, List, Optional
+from xml.etree import ElementTree
+
+from app.utils.compression import is_compressed, open_decompressed
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - optional dependency
+    PdfReader = None
+
+
+PYPDF_AVAILABLE = PdfReader is not None
+
+ANTIWORD = shutil.which("antiword")
+CATDOC = shutil.which("catdoc")
+CATPPT = shutil.which("catppt")
+XLS2CSV = shutil.which("xls2csv")
+
+# A converter that hangs on a malformed file must not hold a worker forever
+EXTERNAL_TIMEOUT_SECONDS = 60
+
+# Archive members larger than this are skipped, so a zip bomb cannot exhaust memory
+MAX_XML_MEMBER_BYTES = 64 * 1024 * 1024
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _xml_text(data: bytes, text_tags=("t",), break_tags=("p", "h")) -> Iterator[str]:
+    """
+        Text of the `text_tags` elements of an XML document, with a line break after
+        every `break_tags` element. With `text_tags=None` all text nodes are kept.
+    """
+    for _, element in ElementTree.iterparse(io.BytesIO(data), events=("end",)):
+        name = _local_name(element.tag)
+        if text_tags is None:
+            if name in break_tags:
+                yield "".join(element.itertext())
+                yield "\n"
+                element.clear()
+        elif name in text_tags and element.text:
+            yield element.text
+        elif name in break_tags:
+            yield "\n"
+            element.clear()
+
+
+def _zip_members(archive: zipfile.ZipFile, pattern: str) -> Iterator[bytes]:
+    def order(info):
+        # slide2.xml before slide10.xml
+        number = re.search(r"(\d+)\.xml$", info.filename)
+        return (int(number.group(1)) if number else 0, info.filename)
+
+    members = [info for info in archive.infolist() if re.fullmatch(pattern, info.filename)]
+    for info in sorted(members, key=order):
+        if info.file_size <= MAX_XML_MEMBER_BYTES:
+            yield archive.read(info)
+
+
+def _ooxml(pattern: str) -> Callable[[io.BytesIO], Iterator[str]]:
+    def extract(source: io.BytesIO) -> Iterator[str]:
+        with zipfile.ZipFile(source) as archive:
+            for member in _zip_members(archive, pattern):
+                yield from _xml_text(member)
+    return extract
+
+
+def _odf(source: io.BytesIO) -> Iterator[str]:
+    with zipfile.ZipFile(source) as archive:
+        for member in _zip_members(archive, r"content\.xml"):
+            yield from _xml_text(member, text_tags=None)
+
+
+def _pdf(source: io.BytesIO) -> Iterator[str]:
+    reader = PdfReader(source)
+    if reader.is_encrypted and not reader.decrypt(""):
+        return
+    for page in reader.pages:
+        yield page.extract_text() or ""
+        yield "\n"
+
+
+_RTF_TOKEN = re.compile(
+    r"\\'([0-9a-fA-F]{2})|\\([a-zA-Z]+)(-?\d+)? ?|\\([^a-zA-Z])|([{}])|([^\\{}\r\n]+)"
+)
+# Groups holding metadata rather than text
+_RTF_DESTINATIONS = {"fonttbl", "colortbl", "stylesheet", "info", "pict", "object", "themedata"}
+
+
+def _rtf(source: io.BytesIO) -> Iterator[str]:
+    """Rough RTF reader: drops control words and metadata groups, keeps the text runs."""
+    depth = 0
+    # Depth of the group being skipped, if any
+    skipped = None
+    # Characters left of the plain fallback that follows a \uN character
+    fallback = 0
+    for hex_char, word, argument, symbol, brace, text in _RTF_TOKEN.findall(source.read().decode("latin-1")):
+        if brace == "{":
+            depth += 1
+            continue
+        if brace == "}":
+            if skipped == depth:
+                skipped = None
+            depth -= 1
+            continue
+        if skipped is not None:
+            continue
+        if word in _RTF_DESTINATIONS or symbol == "*":
+            skipped = depth
+        elif word == "u" and argument:
+            yield chr(int(argument) % 65536)
+            fallback = 1
+        elif hex_char:
+            if fallback:
+                fallback -= 1
+                continue
+            yield bytes([int(hex_char, 16)]).decode("cp1252", errors="replace")
+        elif text:
+            if fallback:
+                text, fallback = text[fallback:], 0
+            yield text
+        elif word in ("par", "line", "row", "sect", "page"):
+            yield "\n"
+        elif word in ("tab", "cell"):
+            yield "\t"
+        elif symbol in ("\\", "{", "}"):
+            yield symbol
+        elif symbol == "~":
+            yield " "
+
+
+def _external(command: List[str], extension: str) -> Callable[[io.BytesIO], Iterator[str]]:
+    """Extractor running `command` with the path of a temporary copy of the document appended."""
+    def extract(source: io.BytesIO) -> Iterator[str]:
+        # Blobs may be compressed, the tools get the original bytes from a scratch file
+        with tempfile.NamedTemporaryFile(suffix=f".{extension}") as scratch:
+            scratch.write(source.getbuffer())
+            scratch.flush()
+            result = subprocess.run(
+                [*command, scratch.name],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=EXTERNAL_TIMEOUT_SECONDS,
+                check=True,
+            )
+        yield result.stdout.decode("utf-8", errors="replace")
+    return extract
+
+
+def _plain(source: io.BytesIO) -> Iterator[str]:
+    yield source.read().decode("utf-8-sig", errors="replace")
+
+
+EXTRACTORS: Dict[str, Callable[[io.BytesIO], Iterator[str]]] = {
+    "docx": _ooxml(r"word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml"),
+    "pptx": _ooxml(r"ppt/(slides/slide|notesSlides/notesSlide)\d+\.xml"),
+    "xlsx": _ooxml(r"xl/sharedStrings\.xml"),
+    "odt": _odf,
+    "rtf": _rtf,
+    "txt": _plain,
+    "md": _plain,
+    "csv": _plain,
+    "log": _plain,
+    "json": _plain,
+}
+if PYPDF_AVAILABLE:
+    EXTRACTORS["pdf"] = _pdf
+if ANTIWORD:
+    EXTRACTORS["doc"] = _external([ANTIWORD, "-m", "UTF-8.txt"], "doc")
+elif CATDOC:
+    EXTRACTORS["doc"] = _external([CATDOC, "-d", "utf-8", "-w"], "doc")
+if CATPPT:
+    EXTRACTORS["ppt"] = _external([CATPPT, "-d", "utf-8"], "ppt")
+if XLS2CSV:
+    EXTRACTORS["xls"] = _external([XLS2CSV, "-d", "utf-8"], "xls")
+
+# Plain text is still worth indexing when only its beginning fits in memory
+TRUNCATABLE = {"txt", "md", "csv", "log", "json"}
+
+
+def can_extract(extension: Optional[str]) -> bool:
+    return extension in EXTRACTORS
+
+
+def _read_source(path: str, metadata: Optional[dict], max_bytes: int) -> bytes:
+    """Up to `max_bytes` + 1 of the original bytes, inflating zstd-compressed blobs."""
+    with open(path, "rb") as blob:
+        reader = open_decompressed(blob) if is_compressed(metadata) else blob
+        data = bytearray()
+        while len(data) <= max_bytes:
+            chunk = reader.read(max_bytes + 1 - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return bytes(data)
+
+
+def extract_text(
+        path: str,
+        metadata: Optional[dict],
+        extension: str,
+        max_bytes: int,
+        max_chars: int
+    ) -> str:
+    """
+    Text of the document at `path`, cut at `max_chars`. Files larger than `max_bytes`
+    are not read past that size: plain text keeps its beginning, other formats give "".
+    """
+    data = _read_source(path, metadata, max_bytes)
+    if len(data) > max_bytes:
+        if extension not in TRUNCATABLE:
+            return ""
+        data = data[:max_bytes]
+
+    parts = []
+    length = 0
+    for part in EXTRACTORS[extension](io.BytesIO(data)):
+        parts.append(part)
+        length += len(part)
+        if length >= max_chars:
+            break
+    text = "".join(parts)[:max_chars]
+    # Postgres text cannot hold NUL characters
+    text = text.replace("\x00", "")
+    return re.sub(r"[ \t\f\v]+", " ", re.sub(r"\n\s*\n+", "\n\n", text)).strip()
@@ -5,9 +5,10 @@ import aiofiles
 
 
 from pathlib import Path
-from typing import BinaryIO, Union
+from typing import AsyncIterator, BinaryIO, Iterable, Optional, Union
 
 from app.constants import FileExtensionEnum, FileTypeEnum
+from app.utils.file_types import file_types
 
 class Util:
 
@@ -19,7 +20,9 @@ class Util:
     async def copy_file(
         file_object: BinaryIO,
         destination: Union[str, Path],
-        chunk_size: int = 65536
+        chunk_size: int = 65536,
+        observers: Iterable = (),
+        encoder = None
     )-> str:
         """
         Asynchronously copy a file object to the specified location.
@@ -28,6 +31,10 @@ class Util:
             file_object: A file-like object (e.g., UploadFile.file, open file handle)
             destination: Destination path where the file should be copied
             chunk_size: Size of chunks to read/write at a time (default: 64KB)
+            observers: Objects with an `update(chunk)` method (e.g. a type sniffer or a
+                hashlib hash) fed with every chunk, so they need no second read
+            encoder: Optional transform of the stored bytes (see `ZstdFrameEncoder`);
+                `start` gets the first chunk, observers still see the original bytes
         
         Returns:
             str: The absolute path of the destination file
@@ -38,50 +45,45 @@ class Util:
         destination_path.parent.mkdir(parents=True, exist_ok=True)
         
         async with aiofiles.open(destination_path, 'wb') as dest_file:
+            first_chunk = True
             while chunk := file_object.read(chunk_size):
-                await dest_file.write(chunk)
+                for observer in observers:
+                    observer.update(chunk)
+                if encoder is not None:
+                    if first_chunk:
+                        encoder.start(chunk)
+                    chunk = encoder.encode(chunk)
+                first_chunk = False
+                if chunk:
+                    await dest_file.write(chunk)
+            if encoder is not None:
+                if first_chunk:
+                    encoder.start(b"")
+                if tail := encoder.finish():
+                    await dest_file.write(tail)
         return str(destination_path.absolute())
     
 
     @staticmethod
-    def get_file_type_and_extension(filename: str):
-        """Determine file type based on extension."""
-        extension = Util.get_file_extension(filename)
-        
-        if not extension:
+    def get_file_type_and_extension(filename: str, head: Optional[bytes] = None):
+        """
+        Determine file type based on content and extension.
+
+        Args:
+            filename: Name of the file as uploaded
+            head: First bytes of the content (see `FileTypeSniffer`), when available
+        """
+        info = file_types.detect(filename, head)
+        if info is None:
             return FileTypeEnum.OTHERS, None
-        
-        # Image types
-        if extension in [FileExtensionEnum.JPG, FileExtensionEnum.JPEG]:
-            return FileTypeEnum.IMAGE, extension
-        
-        # Video types
-        if extension in [FileExtensionEnum.MKV, FileExtensionEnum.MP4]:
-            return FileTypeEnum.VIDEO, extension
-        
-        # Audio types
-        if extension == FileExtensionEnum.MP3:
-            return FileTypeEnum.AUDIO, extension
-        
-        # Document types
-        if extension in [FileExtensionEnum.PDF, FileExtensionEnum.DOC, FileExtensionEnum.PPT]:
-            return FileTypeEnum.DOCUMENT, extension
-        
-        return FileTypeEnum.OTHERS, extension
+        return info.type, info.extension
     
     
     @staticmethod
-    def get_file_extension(filename: str) -> FileExtensionEnum:
+    def get_file_extension(filename: str) -> Optional[FileExtensionEnum]:
         """Extract and validate file extension."""
-        parts = filename.rsplit('.', 1)
-        if len(parts) < 2:
-            return None
-        
-        ext = parts[1].lower()
-        try:
-            return FileExtensionEnum(ext)
-        except ValueError:
-            return None
+        info = file_types.from_extension(file_types.split_extension(filename)[1])
+        return info.extension if info else None
 
 
     @staticmethod
@@ -284,3 +286,65 @@ class Util:
             return True
         except Exception:
             return False
+
+
+    @staticmethod
+    async def iter_file_range(
+        path: Union[str, Path],
+        start: int = 0,
+        end: Optional[int] = None,
+        chunk_size: int = 65536
+    ) -> AsyncIterator[bytes]:
+        """Yield bytes `start`..`end` (inclusive, default: to the end) of a file."""
+        async with aiofiles.open(path, 'rb') as source:
+            await source.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = await source.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+
+    @staticmethod
+    def parse_range_header(range_header: Optional[str], size: int):
+        """
+        Parse a single-range HTTP `Range` header.
+
+        Args:
+            range_header: Value of the header, e.g. "bytes=0-1023", "bytes=500-", "bytes=-500"
+            size: Total size of the representation
+
+        Returns:
+            tuple: (start, end) inclusive, or None when there is no usable header
+
+        Raises:
+            ValueError: If the range cannot be satisfied
+        """
+        if not range_header or not range_header.startswith("bytes="):
+            return None
+        spec = range_header[len("bytes="):].strip()
+        if "," in spec:
+            # Multipart ranges are not supported, fall back to the full content
+            return None
+
+        first, _, last = spec.partition("-")
+        try:
+            if first == "":
+                length = int(last)
+                if length <= 0:
+                    raise ValueError
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+        except ValueError:
+            raise ValueError(f"Invalid range: {range_header}")
+
+        end = min(end, size - 1)
+        if start > end or start >= size:
+            raise ValueError(f"Range not satisfiable: {range_header}")
+        return start, end
@@ -0,0 +1,58 @@
+"""
+Video helpers built on the `ffmpeg` binary. Everything degrades to a no-op when ffmpeg
+is not installed.
+"""
+
+import shutil
+import asyncio
+from typing import List
+
+from app.utils.images import dhash_pixels
+
+
+FFMPEG = shutil.which("ffmpeg")
+FFMPEG_AVAILABLE = FFMPEG is not None
+
+# Frames whose brightest and darkest pixels are closer than this are blank (fades,
+# black or white screens): their dHash is 0 and would match every other video
+UNIFORM_FRAME_RANGE = 16
+
+
+def is_uniform(pixels: bytes, threshold: int = UNIFORM_FRAME_RANGE) -> bool:
+    return max(pixels) - min(pixels) < threshold
+
+
+async def keyframe_hashes(path: str, interval: float = 5.0, max_frames: int = 64) -> List[int]:
+    """
+    dHash of one frame every `interval` seconds (at most `max_frames` of them).
+
+    ffmpeg decodes and scales the frames down to 9x8 grayscale itself, so only 72 bytes
+    per frame come back through the pipe. Blank frames are skipped and consecutive
+    identical hashes (static scenes) are collapsed.
+    """
+    if not FFMPEG_AVAILABLE:
+        return []
+
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG, "-v", "error", "-nostdin",
+        "-i", path,
+        "-vf", f"fps=1/{interval},scale=9:8,format=gray",
+        "-frames:v", str(max_frames),
+        "-f", "rawvideo", "-",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    output, _ = await process.communicate()
+    if process.returncode != 0:
+        return []
+
+    frame_size = 9 * 8
+    hashes = []
+    for offset in range(0, len(output) - frame_size + 1, frame_size):
+        pixels = output[offset:offset + frame_size]
+        if is_uniform(pixels):
+            continue
+        value = dhash_pixels(pixels)
+        if not hashes or hashes[-1] != value:
+            hashes.append(value)
+    return hashes
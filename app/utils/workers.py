@@ -0,0 +1,37 @@
+"""
+Process pool shared by the CPU bound work (image resizing, hashing, ...) that must not
+run on the event loop. Created lazily and shut down with the application.
+"""
+
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", os.cpu_count() or 2))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS)
+    return _pool
+
+
+async def run_in_process(func: Callable, *args):
+    """Run a picklable, module-level function in the shared pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+
+def shutdown_process_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
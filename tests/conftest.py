@@ -0,0 +1,33 @@
+import os
+import asyncio
+import tempfile
+
+import pytest
+
+# The app reads its configuration at import time
+os.environ.setdefault("POSTGRES_URL", "sqlite://:memory:")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("JWT_EXP_MIN", "30")
+os.environ.setdefault("FILE_STORAGE_PATH", tempfile.mkdtemp(prefix="drivault-test-"))
+
+from tortoise import Tortoise
+
+from app.settings import TORTOISE_ORM
+
+
+@pytest.fixture
+def with_db():
+    """Runs an async test body against a fresh in-memory database."""
+    def run(test):
+        async def main():
+            await Tortoise.init(
+                db_url="sqlite://:memory:",
+                modules={"models": TORTOISE_ORM["apps"]["models"]},
+            )
+            await Tortoise.generate_schemas()
+            try:
+                return await test()
+            finally:
+                await Tortoise.close_connections()
+        return asyncio.run(main())
+    return run
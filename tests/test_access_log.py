@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.constants import AccessEventType
+from app.models import AccessDailyStatModel, AccessEventModel
+from app.utils.access_log import AccessEvent, AccessLog
+
+NOON = datetime(2026, 5, 4, 12, 0, tzinfo=timezone.utc)
+
+
+def event(file_id: int, action=AccessEventType.VIEW, at=NOON, size=None) -> AccessEvent:
+    return AccessEvent(user_id=1, file_id=file_id, owner_id=1, action=action, bytes=size, created_at=at)
+
+
+async def stats(file_id: int) -> list:
+    return await (
+        AccessDailyStatModel
+        .filter(file_id=file_id)
+        .order_by("day")
+        .values("day", "views", "downloads", "bytes", "last_accessed_at")
+    )
+
+
+def test_batches_roll_up_per_file_and_day(with_db):
+    async def test():
+        log = AccessLog()
+        await log.write([
+            event(1),
+            event(1, at=NOON + timedelta(minutes=5)),
+            event(1, AccessEventType.DOWNLOAD, size=100),
+            event(2),
+            event(1, at=NOON + timedelta(days=1)),
+        ])
+        await log.write([event(1, AccessEventType.DOWNLOAD, at=NOON + timedelta(minutes=1), size=50)])
+
+        first_day, second_day = await stats(1)
+        assert (first_day["views"], first_day["downloads"], first_day["bytes"]) == (2, 2, 150)
+        assert first_day["last_accessed_at"] == NOON + timedelta(minutes=5)
+        assert (second_day["views"], second_day["downloads"]) == (1, 0)
+        assert [row["views"] for row in await stats(2)] == [1]
+        assert await AccessEventModel.all().count() == 6
+        assert log.stats["written"] == 6
+    with_db(test)
+
+
+def test_last_access_never_moves_backwards(with_db):
+    async def test():
+        log = AccessLog()
+        await log.write([event(1, at=NOON + timedelta(hours=2))])
+        # A batch held by another worker, or drained on shutdown, arrives late
+        await log.write([event(1, at=NOON)])
+        [row] = await stats(1)
+        assert row["views"] == 2
+        assert row["last_accessed_at"] == NOON + timedelta(hours=2)
+
+        await log.write([event(1, at=NOON + timedelta(hours=3))])
+        [row] = await stats(1)
+        assert row["last_accessed_at"] == NOON + timedelta(hours=3)
+    with_db(test)
+
+
+def test_failed_roll_up_writes_nothing(with_db, monkeypatch):
+    async def test():
+        log = AccessLog()
+
+        async def fail(*args):
+            raise RuntimeError("counters unavailable")
+
+        monkeypatch.setattr(log, "_roll_up", fail)
+        await log.write([event(1), event(2)])
+        assert await AccessEventModel.all().count() == 0
+        assert log.stats["failed"] == 2
+    with_db(test)
+
+
+def test_stop_writes_what_is_queued(with_db):
+    async def test():
+        log = AccessLog(batch_size=2, flush_seconds=60)
+        log.start()
+        for _ in range(5):
+            log.emit(event(1))
+        await asyncio.sleep(0)
+        await log.stop()
+        assert not log.running
+        assert await AccessEventModel.all().count() == 5
+        [row] = await stats(1)
+        assert row["views"] == 5
+    with_db(test)
+
+
+def test_full_queue_drops_events():
+    log = AccessLog(queue_size=2)
+
+    async def test():
+        log.start()
+        for _ in range(5):
+            log.emit(event(1))
+        assert log.stats == {"emitted": 2, "written": 0, "dropped": 3, "failed": 0}
+        log._task.cancel()
+    asyncio.run(test())
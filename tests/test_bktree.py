@@ -0,0 +1,40 @@
+import random
+
+from app.utils.bktree import BKTree, hamming
+
+
+def test_empty_tree():
+    tree = BKTree()
+    assert tree.search(0, 10) == []
+    assert list(tree) == []
+
+
+def test_search_matches_linear_scan():
+    rng = random.Random(42)
+    base = rng.getrandbits(64)
+    # Clustered hashes, so small radii have matches
+    values = [base ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for _ in range(300)]
+    values += [rng.getrandbits(64) for _ in range(300)]
+    tree = BKTree()
+    for item, value in enumerate(values):
+        tree.add(value, item)
+    assert tree.size == len(values)
+
+    for query in [base, values[7], rng.getrandbits(64)]:
+        for radius in (0, 2, 5, 12):
+            expected = sorted(
+                (hamming(query, value), item)
+                for item, value in enumerate(values)
+                if hamming(query, value) <= radius
+            )
+            assert sorted(tree.search(query, radius)) == expected
+
+
+def test_equal_hashes_share_a_node():
+    tree = BKTree()
+    tree.add(0b1010, "a")
+    tree.add(0b1010, "b")
+    tree.add(0b1011, "c")
+    assert sorted(tree.search(0b1010, 0)) == [(0, "a"), (0, "b")]
+    assert sorted(tree.search(0b1010, 1)) == [(0, "a"), (0, "b"), (1, "c")]
+    assert sorted(tree) == [(0b1010, "a"), (0b1010, "b"), (0b1011, "c")]
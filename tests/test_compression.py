@@ -0,0 +1,90 @@
+import random
+import asyncio
+
+import pytest
+
+pytest.importorskip("zstandard")
+
+from app.utils import compression
+from app.utils.compression import ZstdFrameEncoder, iter_decompressed, open_decompressed
+
+FRAME_SIZE = 1000
+
+
+@pytest.fixture
+def stored(tmp_path, monkeypatch):
+    """A ~5.5 frame text file written through the encoder in uneven chunks."""
+    monkeypatch.setattr(compression, "COMPRESSION_ENABLED", True)
+    rng = random.Random(7)
+    words = ["vault", "family", "photo", "album", "holiday", "letter"]
+    original = " ".join(rng.choice(words) for _ in range(1000)).encode()[:5500]
+
+    encoder = ZstdFrameEncoder("notes.txt", frame_size=FRAME_SIZE)
+    path = tmp_path / "blob"
+    with open(path, "wb") as blob:
+        offset = 0
+        for size in [1, 999, 1500, 7, 3000, 10000]:
+            chunk = original[offset:offset + size]
+            if offset == 0:
+                encoder.start(chunk)
+            offset += size
+            blob.write(encoder.encode(chunk))
+        blob.write(encoder.finish())
+    return str(path), encoder.metadata(), original
+
+
+def read_range(path, metadata, start=0, end=None):
+    async def collect():
+        return b"".join([chunk async for chunk in iter_decompressed(path, metadata, start, end)])
+    return asyncio.run(collect())
+
+
+def test_encoder_records_frames(stored):
+    path, metadata, original = stored
+    assert metadata["codec"] == "zstd"
+    assert metadata["original_size"] == len(original)
+    assert len(metadata["frames"]) == 6
+    assert metadata["frames"][0] == 0
+    assert metadata["stored_size"] < len(original)
+    with open(path, "rb") as blob:
+        assert open_decompressed(blob).read() == original
+
+
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        (0, None),
+        (0, 0),
+        # Inside one frame
+        (10, 20),
+        # Last byte of a frame and first of the next
+        (999, 1000),
+        # Exactly one frame
+        (1000, 1999),
+        # Across several frames
+        (950, 3050),
+        # Into the short last frame, and past the end
+        (4990, 5499),
+        (5200, 99999),
+    ],
+)
+def test_ranges_across_frames(stored, start, end):
+    path, metadata, original = stored
+    expected = original[start:] if end is None else original[start:end + 1]
+    assert read_range(path, metadata, start, end) == expected
+
+
+def test_range_past_the_end_is_empty(stored):
+    path, metadata, original = stored
+    assert read_range(path, metadata, len(original), None) == b""
+
+
+def test_incompressible_files_pass_through(monkeypatch):
+    monkeypatch.setattr(compression, "COMPRESSION_ENABLED", True)
+    head = b"\xff\xd8\xff\xe0" + bytes(100)
+    encoder = ZstdFrameEncoder("photo.jpg", frame_size=FRAME_SIZE)
+    encoder.start(head)
+    assert not encoder.enabled
+    assert encoder.encode(head) == head
+    assert encoder.finish() == b""
+    assert encoder.metadata() == {}
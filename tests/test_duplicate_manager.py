@@ -0,0 +1,132 @@
+from tortoise.queryset import QuerySet
+
+from app.constants import AccessType, FileExtensionEnum, FileTypeEnum, PerceptualHashKind
+from app.managers import DuplicateManager, FileManager
+from app.managers import duplicate_manager
+from app.managers.duplicate_manager import to_signed
+from app.managers.sync_manager import SyncManager
+from app.models import FileModel, PerceptualHashModel, UserModel
+
+
+async def create_image(owner_id: int, name: str, value: int) -> FileModel:
+    file = await FileModel.create(
+        name=name,
+        original_filename=name,
+        type=FileTypeEnum.IMAGE,
+        extension=FileExtensionEnum.JPG,
+        file_path=f"/nonexistent/{name}",
+        owner_id=owner_id,
+        size=1,
+        access_type=AccessType.PRIVATE,
+    )
+    await PerceptualHashModel.create(
+        file_id=file.id, owner_id=owner_id, kind=PerceptualHashKind.IMAGE, hash=to_signed(value)
+    )
+    await SyncManager.bump_library_version(owner_id)
+    return file
+
+
+def bits(count: int) -> int:
+    """A hash at Hamming distance `count` from 0."""
+    return (1 << count) - 1
+
+
+async def setup_user():
+    duplicate_manager._indexes.clear()
+    return await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+
+
+def test_groups_do_not_chain(with_db):
+    async def test():
+        user = await setup_user()
+        # a~b and b~c at distance 5, but a and c are 10 apart
+        a = await create_image(user.id, "a.jpg", 0)
+        b = await create_image(user.id, "b.jpg", bits(5))
+        c = await create_image(user.id, "c.jpg", bits(10))
+        d = await create_image(user.id, "d.jpg", bits(10) | (1 << 40))
+        far = await create_image(user.id, "far.jpg", bits(40) << 20)
+        # Another user's copy is never reported
+        other = await UserModel.create(fullname="Dad", email="dad@family.home", password="x")
+        await create_image(other.id, "a.jpg", 0)
+
+        report = await DuplicateManager(user_id=user.id).duplicate_report(distance=5)
+        assert [[file.id for file in group] for group in report] == [[a.id, b.id], [c.id, d.id]]
+        assert far.id not in {file.id for group in report for file in group}
+
+        matches = await DuplicateManager(user_id=user.id).find_duplicates(b.id, distance=5)
+        assert [(match["file"].id, match["distance"]) for match in matches] == [(a.id, 5), (c.id, 5)]
+    with_db(test)
+
+
+def test_deleted_files_leave_the_index(with_db):
+    async def test():
+        user = await setup_user()
+        a = await create_image(user.id, "a.jpg", 0)
+        b = await create_image(user.id, "b.jpg", bits(3))
+        c = await create_image(user.id, "c.jpg", bits(6))
+        manager = DuplicateManager(user_id=user.id)
+        assert len(await manager.duplicate_report(distance=3)) == 1
+
+        await FileManager(user_id=user.id).delete_file(a.id)
+        index = await manager._index()
+        assert sorted(file_id for _, file_id in index.images) == [b.id, c.id]
+        # Without a, b becomes the representative of b and c
+        report = await manager.duplicate_report(distance=3)
+        assert [[file.id for file in group] for group in report] == [[b.id, c.id]]
+    with_db(test)
+
+
+def test_reprocessed_hashes_replace_the_old_ones(with_db):
+    async def test():
+        user = await setup_user()
+        a = await create_image(user.id, "a.jpg", 0)
+        b = await create_image(user.id, "b.jpg", bits(2))
+        manager = DuplicateManager(user_id=user.id)
+        assert [m["file"].id for m in await manager.find_duplicates(a.id)] == [b.id]
+
+        # What compute_perceptual_hashes does when b is processed again
+        assert await PerceptualHashModel.filter(file_id=b.id).delete()
+        await SyncManager.bump_library_version(user.id)
+        await PerceptualHashModel.create(
+            file_id=b.id, owner_id=user.id, kind=PerceptualHashKind.IMAGE, hash=to_signed(bits(30))
+        )
+        assert await manager.find_duplicates(a.id) == []
+    with_db(test)
+
+
+def test_unchanged_library_does_not_rebuild(with_db, monkeypatch):
+    async def test():
+        user = await setup_user()
+        await create_image(user.id, "a.jpg", 0)
+        manager = DuplicateManager(user_id=user.id)
+        index = await manager._index()
+        images = index.images
+
+        def no_count(*args, **kwargs):
+            raise AssertionError("refresh must not count the hashes")
+
+        monkeypatch.setattr(QuerySet, "count", no_count)
+        # A hash inserted without a version bump (the pipeline) is loaded incrementally
+        await PerceptualHashModel.create(
+            file_id=(await create_file_only(user.id)).id,
+            owner_id=user.id,
+            kind=PerceptualHashKind.IMAGE,
+            hash=1,
+        )
+        index = await manager._index()
+        assert index.images is images
+        assert len(index.images) == 2
+    with_db(test)
+
+
+async def create_file_only(owner_id: int) -> FileModel:
+    return await FileModel.create(
+        name="new.jpg",
+        original_filename="new.jpg",
+        type=FileTypeEnum.IMAGE,
+        extension=FileExtensionEnum.JPG,
+        file_path="/nonexistent/new.jpg",
+        owner_id=owner_id,
+        size=1,
+        access_type=AccessType.PRIVATE,
+    )
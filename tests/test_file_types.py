@@ -0,0 +1,93 @@
+import pytest
+
+from app.constants import FileExtensionEnum as E, FileTypeEnum
+from app.utils.file_types import FileTypeRegistry, FileTypeSniffer, SNIFF_SIZE, file_types
+from app.utils.utils import Util
+
+
+def ftyp(brand: bytes) -> bytes:
+    return b"\x00\x00\x00\x18ftyp" + brand + b"\x00\x00\x00\x00" + brand + b"mif1"
+
+
+BMP_HEAD = (
+    b"BM" + (70).to_bytes(4, "little") + b"\x00\x00\x00\x00"
+    + (54).to_bytes(4, "little") + (40).to_bytes(4, "little") + bytes(40)
+)
+
+
+@pytest.mark.parametrize(
+    "filename, head, extension",
+    [
+        # The content wins over a wrong or missing extension
+        ("IMG_0001.HEIC", ftyp(b"heic"), E.HEIC),
+        ("IMG_0001.jpg", ftyp(b"heic"), E.HEIC),
+        ("IMG_0001", ftyp(b"heic"), E.HEIC),
+        ("IMG_0002.MOV", ftyp(b"qt  "), E.MOV),
+        ("IMG_0002.mp4", ftyp(b"qt  "), E.MOV),
+        ("scan", b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n", E.PDF),
+        ("scan.bin", b"%PDF-1.4\n", E.PDF),
+        ("photo.png", b"\xff\xd8\xff\xe0\x00\x10JFIF", E.JPG),
+        # Within a container family the name picks the member
+        ("clip.mov", ftyp(b"isom"), E.MOV),
+        ("clip", ftyp(b"isom"), E.MP4),
+        ("song.m4a", ftyp(b"isom"), E.M4A),
+        ("sheet.xlsx", b"PK\x03\x04" + bytes(26), E.XLSX),
+        ("archive", b"PK\x03\x04" + bytes(26), E.ZIP),
+        ("budget.xls", b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + bytes(8), E.XLS),
+        ("film.webm", b"\x1a\x45\xdf\xa3" + bytes(8), E.WEBM),
+        # Weak signatures need a valid header behind the magic
+        ("image.dat", BMP_HEAD, E.BMP),
+        ("BMW service.txt", b"BMW service on Monday, bring the papers", E.TXT),
+        ("ID3 tags.txt", b"ID3 tags are wrong on half the albums", E.TXT),
+        ("track.mp3", b"ID3\x04\x00\x00\x00\x00\x01\x00", E.MP3),
+        # Nothing recognisable in the content: the extension decides
+        ("notes.MD", b"# Shopping list", E.MD),
+        ("holiday.2019.JPEG", None, E.JPEG),
+    ],
+)
+def test_detect(filename, head, extension):
+    info = file_types.detect(filename, head)
+    assert info is not None
+    assert info.extension == extension
+
+
+@pytest.mark.parametrize(
+    "filename, head",
+    [
+        ("README", b"Plain text without an extension"),
+        # "BM" followed by text is not a bitmap
+        ("BMW", b"BMW service on Monday, bring the papers"),
+        ("setup.exe", b"MZ\x90\x00"),
+        ("", None),
+    ],
+)
+def test_unknown_files(filename, head):
+    assert file_types.detect(filename, head) is None
+    assert Util.get_file_type_and_extension(filename, head) == (FileTypeEnum.OTHERS, None)
+
+
+def test_type_and_mime_of_sniffed_files():
+    assert Util.get_file_type_and_extension("IMG_0002", ftyp(b"qt  ")) == (FileTypeEnum.VIDEO, E.MOV)
+    assert Util.get_file_type_and_extension("scan", b"%PDF-1.7") == (FileTypeEnum.DOCUMENT, E.PDF)
+    assert file_types.detect("IMG_0001", ftyp(b"heic")).mime_type == "image/heic"
+    assert file_types.detect("notes.txt").compressible
+    assert not file_types.detect("photo.jpg").compressible
+
+
+def test_sniffer_keeps_the_head_across_chunks():
+    sniffer = FileTypeSniffer()
+    content = ftyp(b"heic") + bytes(200)
+    for start in range(0, len(content), 5):
+        sniffer.update(memoryview(content)[start:start + 5])
+    assert sniffer.head == content[:SNIFF_SIZE]
+    assert file_types.detect("upload", sniffer.head).extension == E.HEIC
+
+
+def test_registry_is_extensible():
+    registry = FileTypeRegistry()
+    registry.register(E.PNG, FileTypeEnum.IMAGE, "image/png")
+    registry.register(E.TXT, FileTypeEnum.OTHERS, "text/plain", compressible=True)
+    registry.register_signature([(0, b"\x89PNG")], [E.PNG])
+    assert registry.detect("picture.txt", b"\x89PNG\r\n\x1a\n").extension == E.PNG
+    assert registry.detect("notes.txt", b"hello").extension == E.TXT
+    assert registry.detect("picture.gif", b"GIF89a") is None
@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+from tortoise import Tortoise
+
+from app.constants import AccessType, FileExtensionEnum, FileTypeEnum
+from app.exceptions import InvalidFolderMoveException
+from app.managers import FolderManager
+from app.models import FileModel, FolderModel, UserModel
+
+
+async def concat_on_old_sqlite():
+    """SQLite only has CONCAT (used by the subtree move) since 3.44; Postgres always has it."""
+    if sqlite3.sqlite_version_info < (3, 44):
+        connection = Tortoise.get_connection("default")._connection
+        await connection.create_function("CONCAT", -1, lambda *parts: "".join(p or "" for p in parts))
+
+
+async def create_file(owner_id: int, folder: FolderModel, name: str) -> FileModel:
+    return await FileModel.create(
+        name=name,
+        original_filename=name,
+        type=FileTypeEnum.OTHERS,
+        extension=FileExtensionEnum.TXT,
+        file_path=f"/nonexistent/{name}",
+        owner_id=owner_id,
+        size=1,
+        folder=folder,
+        folder_path=folder.path,
+        access_type=AccessType.PRIVATE,
+    )
+
+
+def test_move_rewrites_the_subtree(with_db):
+    async def test():
+        await concat_on_old_sqlite()
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        other = await UserModel.create(fullname="Dad", email="dad@family.home", password="x")
+        manager = FolderManager(user.id)
+        photos = await manager.create_folder("photos")
+        trips = await manager.create_folder("trips", parent_id=photos.id)
+        paris = await manager.create_folder("paris", parent_id=trips.id)
+        archive = await manager.create_folder("archive")
+        # A sibling whose path shares the moved folder's digits must not follow it
+        sibling = await manager.create_folder("sibling", parent_id=photos.id)
+        trip_file = await create_file(user.id, trips, "plan.txt")
+        paris_file = await create_file(user.id, paris, "louvre.txt")
+        sibling_file = await create_file(user.id, sibling, "other.txt")
+
+        moved = await manager.move_folder(trips.id, archive.id)
+
+        segment = FolderManager.path_segment
+        assert moved.path == segment(archive.id) + segment(trips.id)
+        assert (await FolderModel.get(id=trips.id)).parent_id == archive.id
+        assert (await FolderModel.get(id=paris.id)).path == moved.path + segment(paris.id)
+        assert (await FileModel.get(id=trip_file.id)).folder_path == moved.path
+        assert (await FileModel.get(id=paris_file.id)).folder_path == moved.path + segment(paris.id)
+        assert (await FolderModel.get(id=sibling.id)).path == segment(photos.id) + segment(sibling.id)
+        assert (await FileModel.get(id=sibling_file.id)).folder_path == sibling.path
+
+        size = await manager.folder_size(archive.id)
+        assert size["file_count"] == 2
+        assert (await manager.folder_size(photos.id))["file_count"] == 1
+
+        # Back to the root
+        moved = await manager.move_folder(trips.id, None)
+        assert moved.path == segment(trips.id)
+        assert (await FileModel.get(id=paris_file.id)).folder_path == segment(trips.id) + segment(paris.id)
+
+        # Another user's folders are not touched by the range updates
+        assert await FolderModel.filter(owner_id=other.id).count() == 0
+    with_db(test)
+
+
+def test_move_into_own_subtree_is_rejected(with_db):
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        manager = FolderManager(user.id)
+        photos = await manager.create_folder("photos")
+        trips = await manager.create_folder("trips", parent_id=photos.id)
+        with pytest.raises(InvalidFolderMoveException):
+            await manager.move_folder(photos.id, trips.id)
+        with pytest.raises(InvalidFolderMoveException):
+            await manager.move_folder(photos.id, photos.id)
+        assert (await FolderModel.get(id=trips.id)).path == photos.path + FolderManager.path_segment(trips.id)
+    with_db(test)
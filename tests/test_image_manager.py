@@ -0,0 +1,67 @@
+import io
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from app.constants import AccessType, FileExtensionEnum, FileTypeEnum
+from app.managers import ImageManager
+from app.models import FileModel, UserModel
+from app.utils.blob_cache import blob_cache
+from app.utils.workers import shutdown_process_pool
+
+
+@pytest.fixture(autouse=True)
+def process_pool():
+    yield
+    shutdown_process_pool()
+
+
+async def create_image(owner_id: int, path) -> FileModel:
+    Image.new("RGB", (64, 48), (200, 30, 30)).save(path, "PNG")
+    return await FileModel.create(
+        name="red.png",
+        original_filename="red.png",
+        type=FileTypeEnum.IMAGE,
+        extension=FileExtensionEnum.PNG,
+        file_path=str(path),
+        owner_id=owner_id,
+        size=os.path.getsize(path),
+        access_type=AccessType.PRIVATE,
+        checksum="f" * 64,
+    )
+
+
+async def body(response) -> bytes:
+    if hasattr(response, "body_iterator"):
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return response.body
+
+
+@pytest.mark.parametrize("memory_cache", [True, False])
+def test_derivative_evicted_before_it_is_opened(with_db, tmp_path, monkeypatch, memory_cache):
+    if not memory_cache:
+        monkeypatch.setattr(blob_cache, "max_bytes", 0)
+
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        file = await create_image(user.id, tmp_path / "red.png")
+        manager = ImageManager(user_id=user.id)
+        get_or_render = ImageManager._get_or_render
+        calls = []
+
+        async def evicted_meanwhile(self, *args):
+            path = await get_or_render(self, *args)
+            calls.append(path)
+            if len(calls) == 1:
+                # Another worker's cache evicts the derivative right after the lookup
+                os.unlink(path)
+            return path
+
+        monkeypatch.setattr(ImageManager, "_get_or_render", evicted_meanwhile)
+        response = await manager.get_image(file.id, width=16, fmt="png")
+        assert response.status_code == 200
+        assert len(calls) == 2
+        assert Image.open(io.BytesIO(await body(response))).size == (16, 12)
+    with_db(test)
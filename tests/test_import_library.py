@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+from app.commands.import_library import LibraryImporter
+from app.models import ChangeLogModel, FileModel, FolderModel, UserModel
+
+LIBRARY = {
+    "2019/paris/louvre.jpg": b"\xff\xd8\xff\xe0" + b"jpeg" * 100,
+    "2019/paris/notes.txt": b"croissants",
+    "2019/plan.txt": b"book the train",
+    "readme.txt": b"family photos",
+    ".thumbnails/skip.jpg": b"\xff\xd8\xff\xe0",
+}
+
+
+@pytest.fixture
+def library(tmp_path):
+    source = tmp_path / "library"
+    for relative_path, content in LIBRARY.items():
+        path = source / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+    storage = tmp_path / "storage"
+    storage.mkdir()
+    return str(source), str(storage), str(tmp_path / "checkpoint")
+
+
+async def run_import(user, source, storage, checkpoint):
+    importer = LibraryImporter(user, source, storage, checkpoint, batch_size=2, workers=1)
+    await importer.run()
+    return importer
+
+
+def test_import_mirrors_the_tree(with_db, library):
+    source, storage, checkpoint = library
+
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        await run_import(user, source, storage, checkpoint)
+
+        files = {file.metadata["source_path"]: file for file in await FileModel.filter(owner_id=user.id)}
+        assert set(files) == {path for path in LIBRARY if not path.startswith(".")}
+        for relative_path, file in files.items():
+            with open(file.file_path, "rb") as blob:
+                assert blob.read() == LIBRARY[relative_path]
+            assert file.file_path.startswith(storage)
+            assert file.checksum is not None
+
+        paris = await FolderModel.get(owner_id=user.id, name="paris")
+        assert (await paris.parent).name == "2019"
+        assert files["2019/paris/louvre.jpg"].folder_id == paris.id
+        assert files["2019/paris/louvre.jpg"].folder_path == paris.path
+        assert files["2019/paris/louvre.jpg"].extension.value == "jpg"
+        assert files["readme.txt"].folder_path == ""
+        assert await ChangeLogModel.filter(owner_id=user.id, file_id__not_isnull=True).count() == 4
+        with open(checkpoint) as lines:
+            assert sorted(line.strip() for line in lines) == sorted(files)
+    with_db(test)
+
+
+def test_rerun_does_not_import_twice(with_db, library):
+    source, storage, checkpoint = library
+
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        await run_import(user, source, storage, checkpoint)
+        importer = await run_import(user, source, storage, checkpoint)
+        assert importer.progress.files == 0
+        assert importer.progress.skipped == 4
+
+        # Committed, but the run died before writing its checkpoint
+        os.unlink(checkpoint)
+        importer = await run_import(user, source, storage, checkpoint)
+        assert importer.progress.files == 0
+        assert await FileModel.filter(owner_id=user.id).count() == 4
+        assert await FolderModel.filter(owner_id=user.id).count() == 2
+        assert len(os.listdir(os.path.join(storage, user.email))) == 4
+    with_db(test)
+
+
+def test_failed_batch_leaves_no_blobs(with_db, library, monkeypatch):
+    source, storage, checkpoint = library
+
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+
+        async def fail(*args, **kwargs):
+            raise RuntimeError("database went away")
+
+        monkeypatch.setattr(FileModel, "bulk_create", fail)
+        with pytest.raises(RuntimeError):
+            await run_import(user, source, storage, checkpoint)
+        assert os.listdir(os.path.join(storage, user.email)) == []
+        assert not os.path.exists(checkpoint)
+    with_db(test)
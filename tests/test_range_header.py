@@ -0,0 +1,49 @@
+import pytest
+
+from app.utils.utils import Util
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-199", (100, 199)),
+        # Open-ended
+        ("bytes=900-", (900, 999)),
+        # Suffix: the last N bytes
+        ("bytes=-100", (900, 999)),
+        # A suffix longer than the file is the whole file
+        ("bytes=-5000", (0, 999)),
+        # The end is clamped to the last byte
+        ("bytes=500-5000", (500, 999)),
+        ("bytes=999-999", (999, 999)),
+    ],
+)
+def test_satisfiable_ranges(header, expected):
+    assert Util.parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [None, "", "items=0-10", "bytes=0-10,20-30", "bytes=-10, 50-"])
+def test_headers_served_as_full_content(header):
+    assert Util.parse_range_header(header, 1000) is None
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        "bytes=1000-",
+        "bytes=1000-1100",
+        "bytes=200-100",
+        "bytes=-0",
+        "bytes=abc-",
+        "bytes=-",
+    ],
+)
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(ValueError):
+        Util.parse_range_header(header, 1000)
+
+
+def test_empty_file_has_no_satisfiable_range():
+    with pytest.raises(ValueError):
+        Util.parse_range_header("bytes=-10", 0)
@@ -0,0 +1,51 @@
+import asyncio
+
+from app.utils import rate_limit
+from app.utils.rate_limit import MemoryRateLimitStore
+
+
+class Clock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    store = MemoryRateLimitStore()
+
+    async def test():
+        # Burst of 3, then one token every half second
+        assert [await store.acquire("u", 2, 3, 1, reserve=False) for _ in range(3)] == [0, 0, 0]
+        assert await store.acquire("u", 2, 3, 1, reserve=False) == 0.5
+        clock.now += 0.5
+        assert await store.acquire("u", 2, 3, 1, reserve=False) == 0
+        # Reserving goes into debt
+        assert await store.acquire("u", 2, 3, 2, reserve=True) == 1.0
+        assert await store.acquire("u", 2, 3, 1, reserve=False) == 1.5
+        assert await store.acquire("other", 2, 3, 1, reserve=False) == 0
+    asyncio.run(test())
+
+
+def test_full_buckets_are_pruned(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    store = MemoryRateLimitStore()
+
+    async def test():
+        for user_id in range(1000):
+            await store.acquire(f"{user_id}:list", 10, 30, 1, reserve=False)
+        # Deep in debt: still limited after the others refilled
+        await store.acquire("greedy:bytes", 1, 1, 120, reserve=True)
+        assert len(store._buckets) == 1001
+
+        clock.now += MemoryRateLimitStore.PRUNE_EVERY_SECONDS
+        assert await store.acquire("new:list", 10, 30, 1, reserve=False) == 0
+        assert set(store._buckets) == {"greedy:bytes", "new:list"}
+        assert await store.acquire("greedy:bytes", 1, 1, 1, reserve=False) > 0
+        # A pruned key starts again from a full bucket
+        assert await store.acquire("7:list", 10, 30, 30, reserve=False) == 0
+    asyncio.run(test())
@@ -0,0 +1,95 @@
+from tortoise import Tortoise
+
+from app.models import FileModel, FolderModel, UserModel
+from app.utils.schema import upgrade_schema
+
+# The files table as created before folders, checksums and the scrubber existed
+LEGACY_FILES_TABLE = """
+    CREATE TABLE "filemodel" (
+        "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+        "name" VARCHAR(255) NOT NULL,
+        "original_filename" VARCHAR(255) NOT NULL,
+        "mime_type" VARCHAR(127),
+        "type" VARCHAR(8) NOT NULL,
+        "extension" VARCHAR(5),
+        "file_path" VARCHAR(250) NOT NULL,
+        "size" REAL NOT NULL,
+        "metadata" JSON NOT NULL,
+        "access_type" VARCHAR(7) NOT NULL,
+        "shared_with" JSON NOT NULL,
+        "is_deleted" INT NOT NULL DEFAULT 0,
+        "deleted_at" TIMESTAMP,
+        "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        "owner_id" INT NOT NULL REFERENCES "users" ("id") ON DELETE CASCADE
+    );
+    INSERT INTO "filemodel" (
+        "name", "original_filename", "type", "file_path", "size", "metadata",
+        "access_type", "shared_with", "owner_id"
+    ) VALUES ('old.txt', 'old.txt', 'others', '/old.txt', 1, '{}', 'private', '[]', 1);
+"""
+
+
+# The users table before listings had a version
+LEGACY_USERS_TABLE = """
+    CREATE TABLE "users" (
+        "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+        "fullname" VARCHAR(50) NOT NULL,
+        "email" VARCHAR(50) NOT NULL UNIQUE,
+        "password" VARCHAR(100) NOT NULL,
+        "role" VARCHAR(20) NOT NULL DEFAULT 'standard',
+        "is_active" INT NOT NULL DEFAULT 1,
+        "created_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        "updated_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO "users" ("fullname", "email", "password") VALUES ('Mom', 'mom@family.home', 'x');
+"""
+
+
+async def columns(table: str) -> set:
+    rows = await Tortoise.get_connection("default").execute_query_dict(f'PRAGMA table_info("{table}")')
+    return {row["name"] for row in rows}
+
+
+async def indexes(table: str) -> set:
+    rows = await Tortoise.get_connection("default").execute_query_dict(f'PRAGMA index_list("{table}")')
+    return {row["name"] for row in rows}
+
+
+def test_existing_tables_get_the_new_columns(with_db):
+    async def test():
+        connection = Tortoise.get_connection("default")
+        fresh_indexes = await indexes("filemodel")
+        # Swap in the old tables; the other tables' foreign keys refer to them by name
+        await connection.execute_script('PRAGMA foreign_keys = OFF; DROP TABLE "filemodel"; DROP TABLE "users"')
+        await connection.execute_script(LEGACY_USERS_TABLE)
+        await connection.execute_script(LEGACY_FILES_TABLE)
+        await connection.execute_script("PRAGMA foreign_keys = ON")
+
+        await upgrade_schema()
+
+        assert {"folder_id", "folder_path", "checksum", "verified_at"} <= await columns("filemodel")
+        assert await indexes("filemodel") == fresh_indexes
+        old = await FileModel.get(name="old.txt")
+        assert old.folder_id is None
+        assert old.folder_path == ""
+        assert old.checksum is None and old.verified_at is None
+        assert "library_version" in await columns("users")
+        assert (await UserModel.get(id=old.owner_id)).library_version == 0
+        folder = await FolderModel.create(name="photos", owner_id=old.owner_id, path="000000000001")
+        await FileModel.filter(id=old.id).update(folder_id=folder.id, folder_path=folder.path)
+        assert await FileModel.filter(folder_path=folder.path).count() == 1
+
+        # Running it again is a no-op
+        await upgrade_schema()
+        assert await indexes("filemodel") == fresh_indexes
+    with_db(test)
+
+
+def test_fresh_database_is_left_alone(with_db):
+    async def test():
+        before = {table: (await columns(table), await indexes(table)) for table in ("filemodel", "users")}
+        await upgrade_schema()
+        after = {table: (await columns(table), await indexes(table)) for table in ("filemodel", "users")}
+        assert before == after
+    with_db(test)
@@ -0,0 +1,67 @@
+from app.constants import ChangeActionEnum
+from app.managers import SyncManager
+from app.models import ChangeLogModel, UserModel
+
+
+async def record(owner_id: int, count: int):
+    await SyncManager.record_changes(
+        owner_id,
+        [{"file_id": index, "action": ChangeActionEnum.CREATE} for index in range(count)],
+    )
+
+
+def test_pages_cover_every_change_once(with_db):
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        other = await UserModel.create(fullname="Dad", email="dad@family.home", password="x")
+        await record(user.id, 5)
+        await record(other.id, 3)
+        await record(user.id, 2)
+
+        manager = SyncManager(user.id)
+        cursor, seen, pages = 0, [], []
+        while True:
+            page = await manager.get_changes(since=cursor, limit=3)
+            pages.append(page)
+            seen += [change["seq"] for change in page["changes"]]
+            assert page["cursor"] >= cursor
+            cursor = page["cursor"]
+            if not page["has_more"]:
+                break
+
+        assert [len(page["changes"]) for page in pages] == [3, 3, 1]
+        assert seen == sorted(seen)
+        assert len(set(seen)) == 7
+        assert seen == list(
+            await ChangeLogModel.filter(owner_id=user.id).order_by("id").values_list("id", flat=True)
+        )
+
+        # Caught up: an empty page keeps the cursor
+        page = await manager.get_changes(since=cursor)
+        assert page == {"changes": [], "cursor": cursor, "has_more": False}
+
+        await record(user.id, 1)
+        page = await manager.get_changes(since=cursor)
+        assert len(page["changes"]) == 1
+        assert page["cursor"] > cursor
+    with_db(test)
+
+
+def test_owner_row_is_locked_before_the_entries_get_ids(with_db, monkeypatch):
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        versions = []
+        bulk_create = ChangeLogModel.bulk_create
+
+        async def spy(entries, using_db=None, **kwargs):
+            versions.append(
+                await UserModel.filter(id=user.id).using_db(using_db).values_list("library_version", flat=True)
+            )
+            return await bulk_create(entries, using_db=using_db, **kwargs)
+
+        monkeypatch.setattr(ChangeLogModel, "bulk_create", spy)
+        await record(user.id, 2)
+        await record(user.id, 1)
+        # The version was already bumped, i.e. the row lock held, when the ids were taken
+        assert versions == [[1], [2]]
+    with_db(test)
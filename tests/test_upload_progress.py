@@ -0,0 +1,74 @@
+import asyncio
+from functools import partial
+from types import SimpleNamespace
+
+from app.utils import rate_limit
+from app.utils.events import UploadProgress, events
+from app.utils.rate_limit import UploadShapingMiddleware
+
+
+def upload_scope(query_string: bytes, length: int):
+    return {
+        "type": "http",
+        "method": "POST",
+        "path": "/v1/files/upload",
+        "query_string": query_string,
+        "headers": [(b"content-length", str(length).encode())],
+    }
+
+
+def test_progress_is_reported_while_the_body_is_received(monkeypatch):
+    async def user(scope):
+        return SimpleNamespace(id=7)
+    monkeypatch.setattr(UploadShapingMiddleware, "_user", staticmethod(user))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+    # Report every chunk instead of every quarter second
+    monkeypatch.setattr(rate_limit, "UploadProgress", partial(UploadProgress, interval=0))
+    chunks = [b"a" * 100, b"b" * 100, b"c" * 50]
+
+    async def test():
+        messages = [
+            {"type": "http.request", "body": chunk, "more_body": index < len(chunks) - 1}
+            for index, chunk in enumerate(chunks)
+        ]
+
+        async def receive():
+            return messages.pop(0)
+
+        async with events.subscribe(7) as subscription:
+            seen = []
+
+            async def app(scope, receive, send):
+                # Like the route, nothing happens until the whole body is read
+                for _ in chunks:
+                    await receive()
+                    event = await subscription.get(timeout=1)
+                    seen.append(event["data"]["received"] if event else None)
+
+            middleware = UploadShapingMiddleware(app)
+            await middleware(upload_scope(b"upload_id=abc&folder_id=3", 250), receive, None)
+            assert await subscription.get(timeout=0.1) is None
+
+        assert seen == [100, 200, 250]
+    asyncio.run(test())
+
+
+def test_no_progress_without_upload_id(monkeypatch):
+    async def user(scope):
+        raise AssertionError("the user is only needed to shape or report")
+    monkeypatch.setattr(UploadShapingMiddleware, "_user", staticmethod(user))
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", False)
+
+    async def test():
+        called = []
+
+        async def app(scope, receive, send):
+            called.append(await receive())
+
+        async def receive():
+            return {"type": "http.request", "body": b"x", "more_body": False}
+
+        await UploadShapingMiddleware(app)(upload_scope(b"", 1), receive, None)
+        assert called
+    asyncio.run(test())
+
@@ -0,0 +1,100 @@
+import pytest
+from jose import jwt
+
+from app.exceptions import InvalidCredentialsException
+from app.managers import UserManager
+from app.models import RefreshTokenModel, UserModel
+from app.utils.denylist import denylist
+
+
+def jti(access_token: str) -> str:
+    return jwt.get_unverified_claims(access_token)["jti"]
+
+
+def test_refresh_rotates_the_token(with_db):
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        manager = UserManager()
+        first = await manager._issue_tokens(user)
+        second = await manager.refresh(first["refresh_token"])
+
+        assert second["refresh_token"] != first["refresh_token"]
+        assert second["token"] != first["token"]
+        records = await RefreshTokenModel.filter(user_id=user.id).order_by("id")
+        assert len(records) == 2
+        assert records[0].family == records[1].family
+        assert records[0].revoked_at is not None
+        assert records[1].revoked_at is None
+
+        # The new token keeps rotating
+        third = await manager.refresh(second["refresh_token"])
+        assert third["user"]["id"] == user.id
+    with_db(test)
+
+
+def test_reused_refresh_token_revokes_the_family(with_db):
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        manager = UserManager()
+        stolen = await manager._issue_tokens(user)
+        legitimate = await manager.refresh(stolen["refresh_token"])
+        other_session = await manager._issue_tokens(user)
+
+        with pytest.raises(InvalidCredentialsException):
+            await manager.refresh(stolen["refresh_token"])
+
+        # The token issued by the rotation is dead too, and so is its access token
+        with pytest.raises(InvalidCredentialsException):
+            await manager.refresh(legitimate["refresh_token"])
+        assert denylist.is_revoked(jti(legitimate["token"]))
+
+        # Other sessions of the user are not affected
+        assert not denylist.is_revoked(jti(other_session["token"]))
+        assert (await manager.refresh(other_session["refresh_token"]))["user"]["id"] == user.id
+    with_db(test)
+
+
+def test_unknown_refresh_token_is_rejected(with_db):
+    async def test():
+        with pytest.raises(InvalidCredentialsException):
+            await UserManager().refresh("not-a-token")
+    with_db(test)
+
+
+def claims(access_token: str) -> dict:
+    return jwt.get_unverified_claims(access_token)
+
+
+def test_logout_without_refresh_token_ends_the_session(with_db):
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        manager = UserManager()
+        first = await manager._issue_tokens(user)
+        # The session's current access token comes from a rotation
+        session = await manager.refresh(first["refresh_token"])
+        other_session = await manager._issue_tokens(user)
+
+        await manager.logout(claims(session["token"]))
+
+        assert denylist.is_revoked(jti(session["token"]))
+        with pytest.raises(InvalidCredentialsException):
+            await manager.refresh(session["refresh_token"])
+        assert not denylist.is_revoked(jti(other_session["token"]))
+        assert (await manager.refresh(other_session["refresh_token"]))["user"]["id"] == user.id
+    with_db(test)
+
+
+def test_logout_with_refresh_token_of_another_session(with_db):
+    async def test():
+        user = await UserModel.create(fullname="Mom", email="mom@family.home", password="x")
+        manager = UserManager()
+        phone = await manager._issue_tokens(user)
+        laptop = await manager._issue_tokens(user)
+
+        await manager.logout(claims(phone["token"]), refresh_token=laptop["refresh_token"])
+
+        for session in (phone, laptop):
+            assert denylist.is_revoked(jti(session["token"]))
+            with pytest.raises(InvalidCredentialsException):
+                await manager.refresh(session["refresh_token"])
+    with_db(test)